@@ -0,0 +1,96 @@
+"""
+JWT authentication without a database query on every request.
+
+``CachedJWTAuthentication`` trusts the signed ``user_id`` and ``is_active``
+claims and keeps recently seen users in a small per-process cache, so a
+user row is read at most once per ``JWT_USER_CACHE_TTL`` seconds and
+process. Saving or deleting a user drops its entry; other processes pick
+up the change when their entry expires.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+User = get_user_model()
+
+MAX_CACHED_USERS = 10000
+
+
+class UserCache:
+    """Thread-safe LRU of user field values with a per-entry TTL."""
+
+    def __init__(self, max_size=MAX_CACHED_USERS):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, field_names, values = entry
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        # A fresh instance per request, so one request cannot mutate another's user.
+        return User.from_db(None, field_names, values)
+
+    def set(self, user, ttl):
+        field_names = [field.attname for field in User._meta.concrete_fields]
+        values = tuple(getattr(user, name) for name in field_names)
+        with self._lock:
+            self._entries[user.pk] = (time.monotonic() + ttl, field_names, values)
+            self._entries.move_to_end(user.pk)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` backed by the per-process user cache.
+
+    Tokens issued before the ``is_active`` claim existed still work; their
+    users are simply loaded and cached like any other.
+    """
+
+    def get_user(self, validated_token):
+        ttl = getattr(settings, 'JWT_USER_CACHE_TTL', 0)
+        if ttl <= 0 or api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        if validated_token.get('is_active') is False:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user, ttl)
+        elif api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
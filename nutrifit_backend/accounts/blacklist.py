@@ -0,0 +1,154 @@
+"""
+Refresh-token blacklist maintenance.
+
+``OutstandingToken`` gets a row for every issued refresh token and
+``BlacklistedToken`` one for every rotated one, so both tables only grow.
+``prune_expired_tokens`` deletes expired rows in small batches (blacklist
+rows go with them through the cascade).
+
+``blacklist_filter`` is a per-process Bloom filter over blacklisted JTIs.
+When ``TOKEN_BLACKLIST_BLOOM_SYNC_SECONDS`` is positive, a refresh token
+whose JTI is not in the filter skips the blacklist query. The filter
+picks up new rows by id every sync interval, so a token blacklisted by
+another process may be accepted for up to that many seconds; tokens
+blacklisted by this process are added immediately.
+"""
+
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+BLOOM_ERROR_RATE = 0.01
+MIN_BLOOM_CAPACITY = 10000
+# Rows committed out of id order (concurrent writers) are re-read this far back.
+SYNC_OVERLAP = 100
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings."""
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class BlacklistFilter:
+    """Bloom filter of blacklisted JTIs kept in sync by id high-water mark."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._high_water = 0
+        self._synced_at = 0.0
+
+    @property
+    def sync_seconds(self):
+        return getattr(settings, 'TOKEN_BLACKLIST_BLOOM_SYNC_SECONDS', 0)
+
+    @property
+    def enabled(self):
+        return self.sync_seconds > 0
+
+    def might_contain(self, jti):
+        """``False`` means ``jti`` is certainly not blacklisted (as of the last sync)."""
+        with self._lock:
+            if self._bloom is None or time.monotonic() - self._synced_at >= self.sync_seconds:
+                self._sync()
+            return jti in self._bloom
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+    def reset(self):
+        with self._lock:
+            self._bloom = None
+            self._high_water = 0
+
+    def _sync(self):
+        if self._bloom is None or self._bloom.count > self._bloom.capacity:
+            # (Re)build sized for twice the current blacklist.
+            self._bloom = BloomFilter(max(MIN_BLOOM_CAPACITY, BlacklistedToken.objects.count() * 2))
+            self._high_water = 0
+        rows = (
+            BlacklistedToken.objects.filter(id__gt=self._high_water - SYNC_OVERLAP)
+            .order_by('id')
+            .values_list('id', 'token__jti')
+        )
+        for row_id, jti in rows.iterator(chunk_size=2000):
+            self._bloom.add(jti)
+            self._high_water = max(self._high_water, row_id)
+        self._synced_at = time.monotonic()
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def table_sizes():
+    """Row counts of the token tables, plus how many outstanding rows are expired."""
+    now = timezone.now()
+    return {
+        'outstanding': OutstandingToken.objects.count(),
+        'expired': OutstandingToken.objects.filter(expires_at__lt=now).count(),
+        'blacklisted': BlacklistedToken.objects.count(),
+    }
+
+
+def prune_expired_tokens(batch_size=1000, pause=0.0, dry_run=False, on_batch=None):
+    """
+    Delete expired ``OutstandingToken`` rows (and their blacklist entries).
+
+    Each batch is its own short transaction. Returns the number of
+    outstanding tokens removed (or that would be, with ``dry_run``).
+    """
+    expired = OutstandingToken.objects.filter(expires_at__lt=timezone.now())
+    if dry_run:
+        return expired.count()
+
+    removed = 0
+    while True:
+        ids = list(expired.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        removed += len(ids)
+        if on_batch:
+            on_batch(removed)
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    if removed and connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA optimize')
+    # Deleted JTIs only cause false positives, but rebuild to keep the filter small.
+    blacklist_filter.reset()
+    return removed
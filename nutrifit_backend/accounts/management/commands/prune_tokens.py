@@ -0,0 +1,70 @@
+"""
+Management command to prune expired JWT refresh tokens.
+"""
+
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.blacklist import prune_expired_tokens, table_sizes
+from accounts.serializers import NutriFitTokenRefreshSerializer
+from accounts.tokens import NutriFitRefreshToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding/blacklisted refresh tokens in batches and report token table sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tokens deleted per transaction (default: 1000)')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many tokens would be deleted')
+        parser.add_argument(
+            '--benchmark', type=int, default=0, metavar='N',
+            help='Also time N refresh rotations (rolled back afterwards) and report latency'
+        )
+
+    def handle(self, *args, **options):
+        self._report_sizes('Before')
+        removed = prune_expired_tokens(
+            batch_size=max(1, options['batch_size']),
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+            on_batch=lambda count: self.stdout.write(f'  {count} deleted so far') if options['verbosity'] >= 2 else None,
+        )
+        if options['dry_run']:
+            self.stdout.write(f'[dry run] Would delete {removed} expired tokens')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Deleted {removed} expired tokens'))
+            self._report_sizes('After')
+
+        if options['benchmark'] > 0:
+            self._benchmark(options['benchmark'])
+
+    def _report_sizes(self, label):
+        sizes = table_sizes()
+        self.stdout.write(
+            f"{label}: {sizes['outstanding']} outstanding ({sizes['expired']} expired), "
+            f"{sizes['blacklisted']} blacklisted"
+        )
+
+    def _benchmark(self, rounds):
+        timings = []
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(email='token-benchmark@nutrifit.invalid', password=None)
+            refresh = str(NutriFitRefreshToken.for_user(user))
+            for _ in range(rounds):
+                serializer = NutriFitTokenRefreshSerializer(data={'refresh': refresh})
+                start = time.perf_counter()
+                serializer.is_valid(raise_exception=True)
+                timings.append((time.perf_counter() - start) * 1000)
+                refresh = serializer.validated_data['refresh']
+            transaction.set_rollback(True)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'Refresh rotation over {rounds} rounds: median {statistics.median(timings):.2f} ms, '
+            f'p95 {p95:.2f} ms, max {timings[-1]:.2f} ms'
+        )
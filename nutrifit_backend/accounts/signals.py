@@ -0,0 +1,16 @@
+"""
+Signal handlers keeping cached account data in sync with the models.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import user_cache
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    """Forget the cached copy of a user as soon as it changes."""
+    user_cache.discard(instance.pk)
@@ -1,3 +1,285 @@
-from django.test import TestCase
+import io
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.authentication import UserCache, user_cache
+from accounts.blacklist import (
+    BLOOM_ERROR_RATE, BloomFilter, blacklist_filter, prune_expired_tokens, table_sizes,
+)
+
+from accounts import urls
+from accounts.tokens import NutriFitRefreshToken
+from nutrifit.testing import PASSWORD, QueryBudgetMixin, build_fixture
+
+
+class AccountsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Registration, login and token refresh within a fixed number of queries."""
+
+    budgets = {
+        'register': 3,
+        'login': 2,
+        'token_refresh': 8,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = build_fixture()['user']
+
+    def test_every_url_has_a_budget(self):
+        self.assertEveryURLHasBudget(urls.urlpatterns)
+
+    def test_register(self):
+        account = {'email': 'new@example.com', 'password': 'New-pass-123', 'password2': 'New-pass-123'}
+        self.assertQueryBudget('register', 'post', data=account, format='json', status=201)
+
+    def test_login(self):
+        credentials = {'email': self.user.email, 'password': PASSWORD}
+        self.assertQueryBudget('login', 'post', data=credentials, format='json', status=200)
+
+    def test_token_refresh(self):
+        refresh = str(NutriFitRefreshToken.for_user(self.user))
+        self.assertQueryBudget('token_refresh', 'post', data={'refresh': refresh}, format='json', status=200)
+
+    @override_settings(COMPRESSION_MIN_SIZE=0)
+    def test_token_responses_are_not_compressed(self):
+        credentials = {'email': self.user.email, 'password': PASSWORD}
+        response = self.client.post('/api/auth/login/', credentials, format='json', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        self.authenticate(self.user)
+        response = self.client.get('/api/ingredients/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+@override_settings(JWT_USER_CACHE_TTL=60)
+class CachedJWTAuthenticationTests(TestCase):
+    """Users are cached between requests but deactivation still takes effect."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='cached@example.com', password=PASSWORD)
+
+    def setUp(self):
+        user_cache.clear()
+        self.token = NutriFitRefreshToken.for_user(self.user).access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def get(self):
+        return self.client.get('/api/ingredients/')
+
+    def test_claims_carry_no_personal_data(self):
+        self.assertEqual(self.token['is_active'], True)
+        self.assertNotIn('email', self.token.payload)
+
+    def test_user_is_read_once_per_ttl(self):
+        self.assertEqual(self.get().status_code, 200)
+        with self.assertNumQueries(1):  # the ingredient count only
+            self.client.get('/api/ingredients/?search=nothing-matches')
+
+    def test_deactivation_in_this_process_is_immediate(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_deactivation_elsewhere_applies_after_ttl(self):
+        self.assertEqual(self.get().status_code, 200)
+        # An update that bypasses signals, as one in another process would.
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.get().status_code, 200)
+        later = time.monotonic() + 61
+        with mock.patch('accounts.authentication.time.monotonic', return_value=later):
+            self.assertEqual(self.get().status_code, 401)
+
+    def test_inactive_claim_is_rejected_without_a_query(self):
+        self.token['is_active'] = False
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get().status_code, 401)
+
+
+class TokenRefreshTests(TestCase):
+    """Refreshing rotates the refresh token and re-signs the claims from the current user row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='refresh@example.com', password=PASSWORD)
+
+    def setUp(self):
+        user_cache.clear()
+        self.client = APIClient()
+        self.refresh = str(NutriFitRefreshToken.for_user(self.user))
+
+    def post(self, refresh):
+        return self.client.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+
+    def test_rotation(self):
+        response = self.post(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        access = AccessToken(response.json()['access'])
+        self.assertEqual((access['user_id'], access['is_active']), (str(self.user.pk), True))
+        self.assertNotIn('email', access.payload)
+        rotated = response.json()['refresh']
+        self.assertNotEqual(rotated, self.refresh)
+        # The old token is blacklisted, the rotated one works once.
+        self.assertEqual(self.post(self.refresh).status_code, 401)
+        self.assertEqual(self.post(rotated).status_code, 200)
+        self.assertEqual(self.post(rotated).status_code, 401)
+
+    def test_inactive_user(self):
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.post(self.refresh)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'no_active_account')
+
+    def test_deleted_user(self):
+        token = NutriFitRefreshToken.for_user(self.user).access_token
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with override_settings(JWT_USER_CACHE_TTL=60):
+            self.assertEqual(client.get('/api/ingredients/').status_code, 200)
+            self.user.delete()
+            self.assertEqual(client.get('/api/ingredients/').status_code, 401)
+
+
+class UserCacheTests(TestCase):
+    """The user cache is bounded and hands out a fresh instance on every hit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            get_user_model().objects.create_user(email=f'lru{index}@example.com', password=PASSWORD)
+            for index in range(3)
+        ]
+
+    def test_least_recently_used_is_evicted(self):
+        cache = UserCache(max_size=2)
+        first, second, third = self.users
+        cache.set(first, 60)
+        cache.set(second, 60)
+        self.assertEqual(cache.get(first.pk).email, first.email)
+        cache.set(third, 60)
+        self.assertIsNone(cache.get(second.pk))
+        self.assertEqual([cache.get(user.pk).pk for user in (first, third)], [first.pk, third.pk])
+
+    def test_fresh_instances(self):
+        cache = UserCache()
+        cache.set(self.users[0], 60)
+        cached = cache.get(self.users[0].pk)
+        cached.first_name = 'Changed'
+        self.assertNotEqual(cache.get(self.users[0].pk).first_name, 'Changed')
+        self.assertIsNot(cache.get(self.users[0].pk), cached)
+
+
+class BloomFilterTests(SimpleTestCase):
+    """No false negatives and a false-positive rate near the configured one."""
+
+    def test_membership(self):
+        bloom = BloomFilter(1000)
+        members = [f'member-{index}' for index in range(1000)]
+        for member in members:
+            bloom.add(member)
+        self.assertTrue(all(member in bloom for member in members))
+        false_positives = sum(f'other-{index}' in bloom for index in range(10000))
+        self.assertLess(false_positives, 10000 * BLOOM_ERROR_RATE * 2)
+
+
+@override_settings(TOKEN_BLACKLIST_BLOOM_SYNC_SECONDS=30)
+class BlacklistFilterTests(TestCase):
+    """The Bloom filter skips blacklist queries and picks up other processes' rows on sync."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='bloom@example.com', password=PASSWORD)
+
+    def setUp(self):
+        blacklist_filter.reset()
+        self.addCleanup(blacklist_filter.reset)
+
+    def test_unlisted_token_skips_query(self):
+        token = NutriFitRefreshToken.for_user(self.user)
+        blacklist_filter.might_contain('warm-up')
+        with self.assertNumQueries(0):
+            token.check_blacklist()
+
+    def test_blacklisted_here_is_rejected_immediately(self):
+        token = NutriFitRefreshToken.for_user(self.user)
+        blacklist_filter.might_contain('warm-up')
+        token.blacklist()
+        with self.assertRaises(TokenError):
+            token.check_blacklist()
+
+    def test_blacklisted_elsewhere_is_picked_up_on_sync(self):
+        token = NutriFitRefreshToken.for_user(self.user)
+        blacklist_filter.might_contain('warm-up')
+        # Written by another process: this filter has not seen it.
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        token.check_blacklist()
+        later = time.monotonic() + 31
+        with mock.patch('accounts.blacklist.time.monotonic', return_value=later):
+            with self.assertRaises(TokenError):
+                token.check_blacklist()
+
+
+class PruneTokensTests(TestCase):
+    """Expired tokens and their blacklist rows are deleted in batches; live ones are kept."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(email='prune@example.com', password=PASSWORD)
+        now = timezone.now()
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(user=user, jti=f'jti-{index}', token='', created_at=now - timedelta(days=8),
+                             expires_at=now + timedelta(days=-1 if index < 5 else 1))
+            for index in range(8)
+        ])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=tokens[index]) for index in (0, 1, 6)])
+
+    def setUp(self):
+        blacklist_filter.reset()
+        self.addCleanup(blacklist_filter.reset)
+
+    def test_prune(self):
+        self.assertEqual(prune_expired_tokens(dry_run=True), 5)
+        self.assertEqual(OutstandingToken.objects.count(), 8)
+
+        batches = []
+        self.assertEqual(prune_expired_tokens(batch_size=2, on_batch=batches.append), 5)
+        self.assertEqual(batches, [2, 4, 5])
+        self.assertEqual(sorted(OutstandingToken.objects.values_list('jti', flat=True)), ['jti-5', 'jti-6', 'jti-7'])
+        self.assertEqual(list(BlacklistedToken.objects.values_list('token__jti', flat=True)), ['jti-6'])
+        self.assertEqual(table_sizes(), {'outstanding': 3, 'expired': 0, 'blacklisted': 1})
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('prune_tokens', stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            'Before: 8 outstanding (5 expired), 3 blacklisted',
+            'Deleted 5 expired tokens',
+            'After: 3 outstanding (0 expired), 1 blacklisted',
+        ])
+
+
+class AccountsAdminQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Admin pages of the accounts models."""
+
+    @classmethod
+    def setUpTestData(cls):
+        build_fixture()
+        cls.admin = get_user_model().objects.create_superuser(email='admin@example.com', password='admin-pass-123')
+
+    def test_admin_pages(self):
+        self.client.force_login(self.admin)
+        self.assertAdminBudgets('accounts', changelist_budget=5, change_budget=10)
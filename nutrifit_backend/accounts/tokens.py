@@ -0,0 +1,61 @@
+"""
+JWT token classes carrying the user claims used by ``CachedJWTAuthentication``.
+"""
+
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .blacklist import blacklist_filter
+
+
+# Only what authentication needs: tokens are readable by anyone holding them,
+# so no personal data goes in.
+USER_CLAIMS = ('is_active',)
+
+
+class NutriFitRefreshToken(RefreshToken):
+    """Refresh token that also signs the user's active flag.
+
+    The claims are copied to every access token derived from it. Blacklist
+    checks consult the in-process Bloom filter first.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_user_claims(user)
+        return token
+
+    def set_user_claims(self, user):
+        for claim in USER_CLAIMS:
+            self[claim] = getattr(user, claim)
+
+    def check_blacklist(self):
+        if blacklist_filter.enabled and not blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            return
+        super().check_blacklist()
+
+    def blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        # Tokens we issue are always outstanding, so skip the user lookup and
+        # get_or_create that the stock implementation does.
+        token = OutstandingToken.objects.filter(jti=jti).only('id').first()
+        if token is None:
+            blacklisted = super().blacklist()
+        else:
+            blacklisted, _ = BlacklistedToken.objects.get_or_create(token=token)
+        blacklist_filter.add(jti)
+        return blacklisted
+
+    def outstand(self, user=None):
+        if user is None:
+            return super().outstand()
+        # A rotated token has a fresh jti and the caller already holds the
+        # user, so insert directly instead of the stock lookup + get_or_create.
+        token = OutstandingToken.objects.create(
+            user=user, jti=self.payload[api_settings.JTI_CLAIM], token=str(self),
+            created_at=self.current_time, expires_at=datetime_from_epoch(self.payload['exp']),
+        )
+        return token, True
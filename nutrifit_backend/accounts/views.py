@@ -1,9 +1,9 @@
 from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate, get_user_model
 from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
+from .tokens import NutriFitRefreshToken
 
 User = get_user_model()
 
@@ -29,7 +29,7 @@ class RegisterView(generics.CreateAPIView):
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = NutriFitRefreshToken.for_user(user)
 
         return Response({
             'user': UserSerializer(user).data,
@@ -70,7 +70,7 @@ class LoginView(generics.GenericAPIView):
             }, status=status.HTTP_401_UNAUTHORIZED)
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = NutriFitRefreshToken.for_user(user)
         
         return Response({
             'user': UserSerializer(user).data,
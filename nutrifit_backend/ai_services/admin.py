@@ -1,3 +1,38 @@
 from django.contrib import admin
+from django.db.models import F, Sum
+from .models import IdempotencyKey, LLMUsage
 
-# Register your models here.
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'user', 'endpoint', 'status_code', 'created_at', 'expires_at')
+    list_filter = ('endpoint', 'status_code')
+    search_fields = ('key', 'user__email')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('request_hash', 'response_body', 'created_at')
+
+
+@admin.register(LLMUsage)
+class LLMUsageAdmin(admin.ModelAdmin):
+    list_display = ('day', 'user', 'requests', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'rejected')
+    list_filter = ('day',)
+    date_hierarchy = 'day'
+    search_fields = ('user__email',)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('user', 'day', 'requests', 'prompt_tokens', 'completion_tokens', 'rejected')
+    
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is not None:
+            totals = changelist.queryset.aggregate(
+                requests=Sum('requests'), tokens=Sum(F('prompt_tokens') + F('completion_tokens')),
+                rejected=Sum('rejected'),
+            )
+            response.context_data['title'] = (
+                f"LLM usage: {totals['requests'] or 0} requests, {totals['tokens'] or 0} tokens, "
+                f"{totals['rejected'] or 0} rejected"
+            )
+        return response
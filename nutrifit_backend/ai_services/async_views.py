@@ -0,0 +1,110 @@
+"""
+Helpers for plain async Django views serving the AI endpoints.
+
+DRF views are synchronous, so a request waiting on the LLM would hold a
+worker thread for the whole call. These views are native coroutines
+instead: authentication, throttling and ORM work run through
+``sync_to_async`` and the LLM call is awaited, which lets an ASGI process
+keep many generations in flight (bounded by ``AI_MAX_CONCURRENCY``).
+Errors are returned in the same shape as DRF's exception handler.
+"""
+
+import json
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+
+from .gemini_service import AIBusyError
+
+
+def _authenticate(request):
+    """Run the configured DRF authenticators against a plain Django request."""
+    for authenticator_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authenticator_class().authenticate(request)
+        if result is not None:
+            return result[0]
+    return None
+
+
+def _authenticate_header(request):
+    """``WWW-Authenticate`` value DRF sends with a 401."""
+    for authenticator_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        return authenticator_class().authenticate_header(request)
+    return None
+
+
+def _throttle_wait(request, view):
+    """``None`` if the ``DEFAULT_THROTTLE_CLASSES`` allow the request, else seconds to wait (0 if unknown)."""
+    waits = []
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, view):
+            waits.append(throttle.wait() or 0)
+    return max(waits) if waits else None
+
+
+def _error_response(exc, headers=None):
+    """``JsonResponse`` for an ``APIException``, shaped like DRF's exception handler output."""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = JsonResponse(data, status=exc.status_code, safe=False)
+    for name, value in (headers or {}).items():
+        if value:
+            response[name] = value
+    return response
+
+
+def async_api_view(methods):
+    """
+    Wrap an async view with method checks, JWT authentication, throttling
+    and JSON parsing.
+
+    The view receives ``request.user`` and ``request.data`` (always a dict)
+    like a DRF view and returns a ``JsonResponse``. ``AIBusyError`` becomes
+    a 503 (429 for ``LLMBudgetExceeded``) with a ``Retry-After`` header.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapped_view(request, *args, **kwargs):
+            if request.method not in methods:
+                return _error_response(
+                    exceptions.MethodNotAllowed(request.method), {'Allow': ', '.join(methods)},
+                )
+
+            try:
+                user = await sync_to_async(_authenticate)(request)
+                if user is None:
+                    raise exceptions.NotAuthenticated()
+            except (exceptions.AuthenticationFailed, exceptions.NotAuthenticated) as e:
+                return _error_response(e, {'WWW-Authenticate': _authenticate_header(request)})
+            request.user = user
+
+            wait = await sync_to_async(_throttle_wait)(request, wrapped_view)
+            if wait is not None:
+                return _error_response(
+                    exceptions.Throttled(wait or None), {'Retry-After': str(math.ceil(wait)) if wait else None},
+                )
+
+            try:
+                request.data = json.loads(request.body) if request.body else {}
+            except ValueError as e:
+                return _error_response(exceptions.ParseError(f'JSON parse error - {e}'))
+            if not isinstance(request.data, dict):
+                return _error_response(exceptions.ParseError('JSON body must be an object.'))
+
+            try:
+                return await view(request, *args, **kwargs)
+            except AIBusyError as e:
+                response = JsonResponse({'error': str(e), 'retry_after': e.retry_after}, status=e.status_code)
+                response['Retry-After'] = str(e.retry_after)
+                return response
+
+        # Token authentication only, like DRF's APIView; django.views.decorators.csrf.csrf_exempt
+        # does not support coroutine views before Django 5.0.
+        wrapped_view.csrf_exempt = True
+        return wrapped_view
+    return decorator
+
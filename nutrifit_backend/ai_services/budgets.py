@@ -0,0 +1,342 @@
+"""
+Per-user and global LLM budgets.
+
+Each budget (requests or estimated tokens per ``LLM_BUDGET_WINDOW_SECONDS``,
+per user and for the whole deployment) is a sliding-window counter: the
+count of the current fixed window plus the previous window's count weighted
+by how much of it still overlaps the sliding window. Counters are cache
+integers updated with ``incr``, which is atomic in Redis, so checking a
+budget costs one ``get_many`` and one ``incr`` per limit.
+
+The counters must be seen by every worker and must not be evicted, so they
+are only kept in the cache when it is shared (``CACHE_SHARED``). Otherwise
+the budgets are counted per calendar day in the ``LLMUsage`` (per user) and
+``LLMGlobalUsage`` (whole deployment) tables, each checked and counted with
+one conditional ``UPDATE``, and ``LLM_BUDGET_WINDOW_SECONDS`` does not apply.
+
+A call is counted before it is made (its prompt tokens estimated from the
+text) and refused if that pushes any budget over its limit; the counts are
+then taken back. Once the call returns, the token counts are corrected
+with the real usage. ``LLMUsage`` keeps per-user daily totals for the admin.
+
+``areserve``, ``arelease`` and ``asettle`` are the versions for async
+views; they do not block the event loop.
+"""
+
+import math
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.lookups import LessThan, LessThanOrEqual
+from django.utils import timezone
+
+from nutrifit.db import serialized_write
+from .models import LLMGlobalUsage, LLMUsage
+
+
+def estimate_tokens(text):
+    """Rough token count of ``text`` (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def _limits(user_id):
+    """``(scope, metric, limit)`` of every enabled budget that applies to ``user_id``."""
+    limits = [
+        ('global', 'requests', settings.LLM_GLOBAL_REQUEST_BUDGET),
+        ('global', 'tokens', settings.LLM_GLOBAL_TOKEN_BUDGET),
+    ]
+    if user_id is not None:
+        limits += [
+            (f'user:{user_id}', 'requests', settings.LLM_USER_REQUEST_BUDGET),
+            (f'user:{user_id}', 'tokens', settings.LLM_USER_TOKEN_BUDGET),
+        ]
+    return [limit for limit in limits if limit[2] > 0]
+
+
+def _key(scope, metric, bucket):
+    return f'llm-budget:{scope}:{metric}:{bucket}'
+
+
+def _window():
+    """``(window, bucket, elapsed)``: window length, current fixed window and the share of it that has passed."""
+    window = settings.LLM_BUDGET_WINDOW_SECONDS
+    now = time.time()
+    return window, int(now // window), (now % window) / window
+
+
+def _counters(limits, tokens, bucket):
+    """``(key, previous key, amount, metric, limit)`` of every budget."""
+    return [
+        (_key(scope, metric, bucket), _key(scope, metric, bucket - 1), 1 if metric == 'requests' else tokens,
+         metric, limit)
+        for scope, metric, limit in limits
+    ]
+
+
+def _add(key, amount, window):
+    try:
+        return cache.incr(key, amount)
+    except ValueError:
+        # First use of this window: create it, then count.
+        cache.add(key, 0, timeout=2 * window + 60)
+        return cache.incr(key, amount)
+
+
+async def _aadd(key, amount, window):
+    try:
+        return await cache.aincr(key, amount)
+    except ValueError:
+        await cache.aadd(key, 0, timeout=2 * window + 60)
+        return await cache.aincr(key, amount)
+
+
+def _retry_after(previous, current, amount, limit, elapsed, window):
+    """Seconds until ``amount`` fits under ``limit``, assuming no other usage."""
+    if current + amount <= limit:
+        # Wait for enough of the previous window to slide out.
+        needed = 1 - (limit - current - amount) / previous
+        return (needed - elapsed) * window
+    if amount > limit:
+        return 2 * window
+    # Wait for the next window, then for enough of this one to slide out.
+    needed = 1 - (limit - amount) / current
+    return (1 - elapsed + needed) * window
+
+
+def _wait(retry_after, previous, current, amount, limit, elapsed, window):
+    """``retry_after`` raised to what this counter needs, if it is over its limit."""
+    if previous * (1 - elapsed) + current <= limit:
+        return retry_after
+    return max(retry_after or 0, _retry_after(previous, current - amount, amount, limit, elapsed, window))
+
+
+class Reservation:
+    """A call counted against the budgets, to be corrected by ``settle`` or taken back by ``release``."""
+
+    __slots__ = ('user_id', 'added', 'tokens', 'day', 'global_day', 'counted')
+
+    def __init__(self, user_id, added, tokens, day=None, global_day=None):
+        self.user_id = user_id
+        self.added = added  # (cache key, amount, metric)
+        self.tokens = tokens
+        self.day = day  # LLMUsage row the call was counted in, if any
+        self.global_day = global_day  # LLMGlobalUsage row the call was counted in, if any
+        self.counted = True
+
+
+def _fits(limits, tokens, used_tokens):
+    """Conditions under which a usage row can take one more call of ``tokens`` within ``limits``."""
+    return [
+        LessThan(F('requests'), limit) if metric == 'requests' else LessThanOrEqual(used_tokens + tokens, limit)
+        for _, metric, limit in limits
+    ]
+
+
+def _count_if_fits(model, keys, conditions, amounts):
+    """
+    Add ``amounts`` to the ``model`` row matching ``keys`` if ``conditions``
+    hold, in one ``UPDATE``; the row is created first if needed. Returns
+    whether the row was updated.
+    """
+    changes = {name: F(name) + amount for name, amount in amounts.items()}
+    if model.objects.filter(*conditions, **keys).update(**changes):
+        return True
+    try:
+        with serialized_write():
+            model.objects.create(**keys)
+    except IntegrityError:
+        # The row exists (or another call just created it): try once more.
+        pass
+    return bool(model.objects.filter(*conditions, **keys).update(**changes))
+
+
+def _count_for_user(user_id, tokens, limits, day):
+    if user_id is None:
+        return True
+    conditions = _fits(limits, tokens, F('prompt_tokens') + F('completion_tokens'))
+    return _count_if_fits(
+        LLMUsage, {'user_id': user_id, 'day': day}, conditions, {'requests': 1, 'prompt_tokens': tokens},
+    )
+
+
+def _reserve_in_database(user_id, tokens, limits):
+    """
+    ``reserve`` against today's ``LLMUsage`` and ``LLMGlobalUsage`` rows, for
+    deployments without a shared cache.
+
+    Each row is checked and counted by one conditional ``UPDATE``, so
+    concurrent calls can neither overshoot a budget nor be refused under it.
+    """
+    day = timezone.localdate()
+    global_limits = [limit for limit in limits if limit[0] == 'global']
+    user_limits = [limit for limit in limits if limit[0] != 'global']
+    with serialized_write():
+        # The global row first, then the user's, always in that order.
+        counted = (not global_limits or _count_if_fits(
+            LLMGlobalUsage, {'day': day}, _fits(global_limits, tokens, F('tokens')),
+            {'requests': 1, 'tokens': tokens},
+        )) and _count_for_user(user_id, tokens, user_limits, day)
+        if not counted:
+            # Take back the global count if the user's budget refused the call.
+            transaction.set_rollback(True)
+
+    if not counted:
+        now = timezone.localtime()
+        midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return None, max(1, math.ceil((midnight - now).total_seconds()))
+    return Reservation(
+        user_id, [], tokens, day if user_id is not None else None, day if global_limits else None,
+    ), None
+
+
+def _add_global(day, requests=0, tokens=0):
+    LLMGlobalUsage.objects.filter(day=day).update(requests=F('requests') + requests, tokens=F('tokens') + tokens)
+
+
+def reserve(user_id, tokens):
+    """
+    Count one call of ``tokens`` against every budget of ``user_id``.
+
+    Returns ``(reservation, None)``, or ``(None, retry_after)`` in seconds
+    if a budget would be exceeded; nothing is counted then.
+    """
+    limits = _limits(user_id)
+    if not limits:
+        return Reservation(user_id, [], tokens), None
+    if not settings.CACHE_SHARED:
+        return _reserve_in_database(user_id, tokens, limits)
+
+    window, bucket, elapsed = _window()
+    counters = _counters(limits, tokens, bucket)
+    previous = cache.get_many([previous_key for _, previous_key, _, _, _ in counters])
+
+    added = []
+    retry_after = None
+    for key, previous_key, amount, metric, limit in counters:
+        current = _add(key, amount, window)
+        added.append((key, amount, metric))
+        retry_after = _wait(retry_after, previous.get(previous_key, 0), current, amount, limit, elapsed, window)
+
+    reservation = Reservation(user_id, added, tokens)
+    if retry_after is not None:
+        release(reservation)
+        return None, max(1, math.ceil(retry_after))
+    return reservation, None
+
+
+async def areserve(user_id, tokens):
+    """``reserve`` for async code."""
+    limits = _limits(user_id)
+    if not limits:
+        return Reservation(user_id, [], tokens), None
+    if not settings.CACHE_SHARED:
+        return await sync_to_async(_reserve_in_database)(user_id, tokens, limits)
+
+    window, bucket, elapsed = _window()
+    counters = _counters(limits, tokens, bucket)
+    previous = await cache.aget_many([previous_key for _, previous_key, _, _, _ in counters])
+
+    added = []
+    retry_after = None
+    for key, previous_key, amount, metric, limit in counters:
+        current = await _aadd(key, amount, window)
+        added.append((key, amount, metric))
+        retry_after = _wait(retry_after, previous.get(previous_key, 0), current, amount, limit, elapsed, window)
+
+    reservation = Reservation(user_id, added, tokens)
+    if retry_after is not None:
+        await arelease(reservation)
+        return None, max(1, math.ceil(retry_after))
+    return reservation, None
+
+
+def _release_in_database(reservation):
+    if reservation.day is not None:
+        record_usage(reservation.user_id, requests=-1, prompt_tokens=-reservation.tokens, day=reservation.day)
+    if reservation.global_day is not None:
+        _add_global(reservation.global_day, requests=-1, tokens=-reservation.tokens)
+
+
+def release(reservation):
+    """Take back a call that was not made."""
+    _release_in_database(reservation)
+    window = settings.LLM_BUDGET_WINDOW_SECONDS
+    for key, amount, _ in reservation.added:
+        _add(key, -amount, window)
+    reservation.counted = False
+
+
+async def arelease(reservation):
+    """``release`` for async code."""
+    if reservation.day is not None or reservation.global_day is not None:
+        await sync_to_async(_release_in_database)(reservation)
+    window = settings.LLM_BUDGET_WINDOW_SECONDS
+    for key, amount, _ in reservation.added:
+        await _aadd(key, -amount, window)
+    reservation.counted = False
+
+
+def _usage_to_record(reservation, prompt_tokens, completion_tokens):
+    if reservation.day is not None:
+        # The call and its estimated prompt are already in the row.
+        return {'requests': 0, 'prompt_tokens': prompt_tokens - reservation.tokens,
+                'completion_tokens': completion_tokens, 'day': reservation.day}
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens}
+
+
+def _settle_in_database(reservation, prompt_tokens, completion_tokens):
+    record_usage(reservation.user_id, **_usage_to_record(reservation, prompt_tokens, completion_tokens))
+    difference = prompt_tokens + completion_tokens - reservation.tokens
+    if reservation.global_day is not None and difference:
+        _add_global(reservation.global_day, tokens=difference)
+
+
+def settle(reservation, prompt_tokens, completion_tokens):
+    """Replace the estimated token count of ``reservation`` with the real one and record the usage."""
+    difference = prompt_tokens + completion_tokens - reservation.tokens
+    if difference:
+        window = settings.LLM_BUDGET_WINDOW_SECONDS
+        for key, _, metric in reservation.added:
+            if metric == 'tokens':
+                _add(key, difference, window)
+    _settle_in_database(reservation, prompt_tokens, completion_tokens)
+
+
+async def asettle(reservation, prompt_tokens, completion_tokens):
+    """``settle`` for async code."""
+    difference = prompt_tokens + completion_tokens - reservation.tokens
+    if difference:
+        window = settings.LLM_BUDGET_WINDOW_SECONDS
+        for key, _, metric in reservation.added:
+            if metric == 'tokens':
+                await _aadd(key, difference, window)
+    await sync_to_async(_settle_in_database)(reservation, prompt_tokens, completion_tokens)
+
+
+def record_usage(user_id, requests=1, prompt_tokens=0, completion_tokens=0, rejected=0, day=None):
+    """Add to the ``LLMUsage`` row of ``user_id`` for ``day`` (default: today)."""
+    if user_id is None:
+        return
+    day = day or timezone.localdate()
+    updated = LLMUsage.objects.filter(user_id=user_id, day=day).update(
+        requests=F('requests') + requests,
+        prompt_tokens=F('prompt_tokens') + prompt_tokens,
+        completion_tokens=F('completion_tokens') + completion_tokens,
+        rejected=F('rejected') + rejected,
+    )
+    if updated:
+        return
+    try:
+        with serialized_write():
+            LLMUsage.objects.create(
+                user_id=user_id, day=day, requests=requests, prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens, rejected=rejected,
+            )
+    except IntegrityError:
+        # Another call created today's row first; add to it.
+        record_usage(user_id, requests, prompt_tokens, completion_tokens, rejected, day)
@@ -2,19 +2,45 @@
 AI-powered Diet Plan Generator using Google Gemini.
 """
 
-from .gemini_service import GeminiService
+from .gemini_service import AIBusyError, GeminiService
 from diet.models import DietPlan, DietPlanItem, Ingredient
 from profiles.models import DietGoal
-from django.db import transaction
+from profiles.targets import calculate_targets
+from diet.shopping import plan_token_key
+from nutrifit.cache import touch
+from asgiref.sync import sync_to_async
+from nutrifit.db import serialized_write
+from django.db import connections, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from decimal import Decimal, InvalidOperation
 import json
 
 
+# Largest quantity accepted for a single plan item from the AI.
+MAX_ITEM_GRAMS = Decimal('2000')
+
+
+def _quantity_grams(value):
+    """Validate an AI-provided quantity; returns it as a Decimal with two places."""
+    
+    try:
+        grams = Decimal(str(value))
+        if not grams.is_finite():
+            raise ValueError
+        grams = grams.quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        raise Exception(f"AI response contains an invalid quantity: {value!r}")
+    if not 0 < grams <= MAX_ITEM_GRAMS:
+        raise Exception(f"AI response contains a quantity outside 0-{MAX_ITEM_GRAMS}g: {value!r}")
+    return grams
+
+
 class DietPlanGenerator:
     """Generate personalized diet plans using AI."""
     
     def __init__(self, user):
         self.user = user
-        self.gemini = GeminiService()
+        self.gemini = GeminiService(user)
     
     def generate_plan(self, params):
         """
@@ -31,19 +57,49 @@ class DietPlanGenerator:
             DietPlan: The generated diet plan object
         """
         
-        # Get user profile and preferences
-        profile_data = self._get_user_context(params)
-        
-        # Calculate nutritional targets
-        targets = self._calculate_targets(profile_data)
+        # Get user context, targets and the AI prompt
+        targets, prompt = self._prepare_generation(params)
         
         # Generate meal plan using AI
-        meal_plan = self._generate_meals_with_ai(profile_data, targets)
+        try:
+            meal_plan = self.gemini.parse_json_response(prompt)
+        except AIBusyError:
+            raise
+        except Exception as e:
+            raise Exception(f"Failed to generate meal plan: {str(e)}")
         
         # Create diet plan in database
         diet_plan = self._create_diet_plan(meal_plan, targets)
         
-        return diet_plan
+        return self._with_items(diet_plan)
+    
+    async def generate_plan_async(self, params):
+        """
+        ``generate_plan`` for async views.
+        
+        The database work runs in worker threads while the LLM call is
+        awaited, so no thread is held for the duration of the generation.
+        """
+        
+        targets, prompt = await sync_to_async(self._prepare_generation)(params)
+        try:
+            meal_plan = await self.gemini.parse_json_response_async(prompt)
+        except AIBusyError:
+            raise
+        except Exception as e:
+            raise Exception(f"Failed to generate meal plan: {str(e)}")
+        return await sync_to_async(lambda: self._with_items(self._create_diet_plan(meal_plan, targets)))()
+    
+    def _prepare_generation(self, params):
+        """Load the user context and build ``(targets, prompt)`` for a full plan."""
+        
+        # Get user profile and preferences
+        profile_data = self._get_user_context(params)
+        
+        # Calculate nutritional targets
+        targets = self._calculate_targets(profile_data)
+        
+        return targets, self._meal_plan_prompt(profile_data, targets)
     
     def _get_user_context(self, params):
         """Gather user context from profile and parameters."""
@@ -93,71 +149,17 @@ class DietPlanGenerator:
     def _calculate_targets(self, profile_data):
         """Calculate calorie and macro targets using Harris-Benedict equation."""
         
-        age = profile_data['age']
-        weight = profile_data['weight']
-        height = profile_data['height']
-        sex = profile_data['sex']
-        activity_level = profile_data['activity_level']
-        goal_type = profile_data['goal_type']
-        
-        # Calculate BMR (Basal Metabolic Rate)
-        if sex == 'male':
-            bmr = 88.362 + (13.397 * weight) + (4.799 * height) - (5.677 * age)
-        else:
-            bmr = 447.593 + (9.247 * weight) + (3.098 * height) - (4.330 * age)
-        
-        # Activity multipliers
-        activity_multipliers = {
-            'sedentary': 1.2,
-            'light': 1.375,
-            'moderate': 1.55,
-            'active': 1.725,
-            'very_active': 1.9,
-        }
-        
-        tdee = bmr * activity_multipliers.get(activity_level, 1.55)
-        
-        # Adjust for goal
-        if goal_type == 'lose_weight':
-            calories = tdee - 500  # 500 calorie deficit
-            protein_ratio = 0.30
-            carbs_ratio = 0.35
-            fat_ratio = 0.35
-        elif goal_type == 'gain_weight' or goal_type == 'muscle_gain':
-            calories = tdee + 300  # 300 calorie surplus
-            protein_ratio = 0.30
-            carbs_ratio = 0.45
-            fat_ratio = 0.25
-        else:  # maintain or health_management
-            calories = tdee
-            protein_ratio = 0.25
-            carbs_ratio = 0.45
-            fat_ratio = 0.30
-        
-        return {
-            'calories': int(calories),
-            'protein': int((calories * protein_ratio) / 4),  # 4 cal per gram
-            'carbs': int((calories * carbs_ratio) / 4),
-            'fat': int((calories * fat_ratio) / 9),  # 9 cal per gram
-        }
+        return calculate_targets(
+            profile_data['age'], profile_data['weight'], profile_data['height'],
+            profile_data['sex'], profile_data['activity_level'], profile_data['goal_type'],
+        )
     
-    def _generate_meals_with_ai(self, profile_data, targets):
-        """Use Gemini AI to generate meal plan."""
+    def _meal_plan_prompt(self, profile_data, targets):
+        """Build the Gemini prompt for a full day's meal plan."""
         
-        # Get available ingredients
-        ingredients = Ingredient.objects.all()
-        
-        # Filter based on dietary preferences
         dietary_type = profile_data['preferences'].get('dietaryType', 'none')
-        if dietary_type == 'vegetarian':
-            ingredients = ingredients.filter(is_vegetarian=True)
-        elif dietary_type == 'vegan':
-            ingredients = ingredients.filter(is_vegan=True)
-        
-        # Filter out allergens
         allergies = profile_data['preferences'].get('allergies', [])
-        for allergy in allergies:
-            ingredients = ingredients.exclude(common_allergens__contains=allergy)
+        ingredients = self._available_ingredients(dietary_type, allergies)
         
         # Create ingredient list for AI
         ingredient_list = []
@@ -172,7 +174,7 @@ class DietPlanGenerator:
                 'fat_per_100g': float(ing.fat_per_100g),
             })
         
-        prompt = f"""
+        return f"""
 You are a professional nutritionist AI. Create a personalized daily meal plan.
 
 User Profile:
@@ -219,14 +221,54 @@ Rules:
 5. Ensure variety in ingredients
 6. Return ONLY valid JSON
 """
+    
+    def _available_ingredients(self, dietary_type, allergies):
+        """Ingredients compatible with the dietary type and allergies."""
+        
+        ingredients = Ingredient.objects.all()
+        
+        # Filter based on dietary preferences
+        if dietary_type == 'vegetarian':
+            ingredients = ingredients.filter(is_vegetarian=True)
+        elif dietary_type == 'vegan':
+            ingredients = ingredients.filter(is_vegan=True)
+        
+        # Filter out allergens
+        json_contains = connections[ingredients.db].features.supports_json_field_contains
+        for allergy in allergies or []:
+            if json_contains:
+                ingredients = ingredients.exclude(common_allergens__contains=allergy)
+            else:
+                # SQLite has no JSON containment; match the encoded list element.
+                ingredients = ingredients.exclude(common_allergens__icontains=json.dumps(allergy))
+        
+        return ingredients
+    
+    def _build_items(self, diet_plan, meals, meal_type=None):
+        """Validate AI meal entries and build unsaved DietPlanItems."""
         
         try:
-            meal_plan = self.gemini.parse_json_response(prompt)
-            return meal_plan
-        except Exception as e:
-            raise Exception(f"Failed to generate meal plan: {str(e)}")
+            ingredient_ids = {int(meal['ingredient_id']) for meal in meals}
+        except (KeyError, TypeError, ValueError):
+            raise Exception("AI response contains an invalid ingredient id")
+        ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+        missing = ingredient_ids - set(ingredients)
+        if missing:
+            raise Exception(f"AI response used unknown ingredient ids: {sorted(missing)}")
+        
+        return [
+            DietPlanItem(
+                diet_plan=diet_plan,
+                ingredient=ingredients[int(meal['ingredient_id'])],
+                quantity_grams=_quantity_grams(meal.get('quantity_grams')),
+                meal_type=meal_type or meal['meal_type'],
+                ai_description=meal['description'],
+                order_index=meal.get('order_index', 0),
+            )
+            for meal in meals
+        ]
     
-    @transaction.atomic
+    @serialized_write()
     def _create_diet_plan(self, meal_plan, targets):
         """Create DietPlan and DietPlanItems in database."""
         
@@ -241,17 +283,108 @@ Rules:
             total_fat=targets['fat'],
         )
         
-        # Create diet plan items
-        for meal in meal_plan['meals']:
-            ingredient = Ingredient.objects.get(id=meal['ingredient_id'])
+        # Create diet plan items (one ingredient lookup, one insert)
+        DietPlanItem.objects.bulk_create(self._build_items(diet_plan, meal_plan['meals']))
+        
+        return diet_plan
+    
+    def regenerate_meal(self, diet_plan, meal_type, instructions=''):
+        """
+        Regenerate a single meal of an existing diet plan.
+        
+        Only the remaining calorie/macro budget and the plan's other meals are
+        sent to the AI, so the prompt and response are a fraction of a full
+        plan generation.
+        
+        Args:
+            diet_plan (DietPlan): Plan owned by this generator's user
+            meal_type (str): One of DietPlanItem.MEAL_TYPE_CHOICES
+            instructions (str): Optional free-text wishes for the new meal
             
-            DietPlanItem.objects.create(
-                diet_plan=diet_plan,
-                ingredient=ingredient,
-                quantity_grams=meal['quantity_grams'],
-                meal_type=meal['meal_type'],
-                ai_description=meal['description'],
-                order_index=meal.get('order_index', 0),
+        Returns:
+            DietPlan: The updated diet plan
+        """
+        
+        other_items = list(
+            diet_plan.items.exclude(meal_type=meal_type).values_list(
+                'meal_type', 'quantity_grams', 'ingredient__name',
+                'ingredient__calories_per_100g', 'ingredient__protein_per_100g',
+                'ingredient__carbs_per_100g', 'ingredient__fat_per_100g',
             )
+        )
+        
+        budget = {
+            'calories': float(diet_plan.total_calories),
+            'protein': float(diet_plan.total_protein),
+            'carbs': float(diet_plan.total_carbs),
+            'fat': float(diet_plan.total_fat),
+        }
+        other_meals = []
+        for other_meal_type, grams, name, calories, protein, carbs, fat in other_items:
+            multiplier = float(grams) / 100
+            budget['calories'] -= float(calories) * multiplier
+            budget['protein'] -= float(protein) * multiplier
+            budget['carbs'] -= float(carbs) * multiplier
+            budget['fat'] -= float(fat) * multiplier
+            other_meals.append(f"{other_meal_type}: {name} {float(grams):g}g")
+        budget = {key: max(0, round(value)) for key, value in budget.items()}
+        
+        try:
+            prefs = self.user.preferences
+            dietary_type = prefs.dietary_type
+            allergies = prefs.allergies
+        except Exception:
+            dietary_type = 'none'
+            allergies = []
+        
+        ingredients = self._available_ingredients(dietary_type, allergies).values_list(
+            'id', 'name', 'calories_per_100g', 'protein_per_100g', 'carbs_per_100g', 'fat_per_100g'
+        )[:100]
+        ingredient_lines = '\n'.join(
+            f"{pk}|{name}|{float(cal):g}|{float(pro):g}|{float(carb):g}|{float(fat):g}"
+            for pk, name, cal, pro, carb, fat in ingredients
+        )
         
+        prompt = f"""
+You are a professional nutritionist AI. Replace the {meal_type} of an existing daily meal plan.
+
+Budget for the new {meal_type}: {budget['calories']} kcal, {budget['protein']}g protein, {budget['carbs']}g carbs, {budget['fat']}g fat.
+Dietary type: {dietary_type}. Allergies: {json.dumps(allergies)}.
+Other meals today: {'; '.join(other_meals) or 'none'}.
+{f'User wishes: {instructions}' if instructions else ''}
+Ingredients (id|name|kcal|protein|carbs|fat per 100g):
+{ingredient_lines}
+
+Return ONLY a JSON object:
+{{"items": [{{"ingredient_id": <id>, "quantity_grams": <grams>, "description": "<short reason>", "order_index": 0}}]}}
+Use 1-4 ingredients from the list, stay within 50 kcal of the budget and avoid repeating the other meals.
+"""
+        
+        try:
+            response = self.gemini.parse_json_response(prompt)
+            meals = response['items']
+        except AIBusyError:
+            raise
+        except Exception as e:
+            raise Exception(f"Failed to regenerate {meal_type}: {str(e)}")
+        if not meals:
+            raise Exception(f"Failed to regenerate {meal_type}: AI returned no items")
+        
+        new_items = self._build_items(diet_plan, meals, meal_type=meal_type)
+        with serialized_write():
+            diet_plan.items.filter(meal_type=meal_type).delete()
+            DietPlanItem.objects.bulk_create(new_items)
+            # bulk_create skips model signals; invalidate cached plan data.
+            transaction.on_commit(lambda: touch(plan_token_key(diet_plan.pk)))
+        
+        getattr(diet_plan, '_prefetched_objects_cache', {}).pop('items', None)
+        return self._with_items(diet_plan)
+    
+    @staticmethod
+    def _with_items(diet_plan):
+        """Load the plan's items with their ingredients in one query for serialization."""
+        
+        prefetch_related_objects(
+            [diet_plan], Prefetch('items', queryset=DietPlanItem.objects.select_related('ingredient'))
+        )
         return diet_plan
@@ -0,0 +1,79 @@
+"""
+Offline stand-in for the Gemini model, selected with ``AI_BACKEND=fake``.
+
+Answers the prompts NutriFit sends with well-formed JSON after a fixed
+``AI_FAKE_LATENCY`` delay, so load tests and local development exercise the
+whole AI request path without network access or API costs.
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+
+
+PARSED_INPUT = {
+    'age': 32,
+    'weight': 78,
+    'height': 178,
+    'sex': 'male',
+    'activityLevel': 'moderate',
+    'goalType': 'lose_weight',
+    'medicalConditions': [],
+    'preferences': {'dietaryType': 'none', 'allergies': []},
+}
+
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner', 'snack')
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Mimics ``genai.GenerativeModel.generate_content(_async)``."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def generate_content(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeResponse(self._answer(prompt))
+
+    async def generate_content_async(self, prompt):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return FakeResponse(self._answer(prompt))
+
+    def _answer(self, prompt):
+        if 'Parse the following user input' in prompt:
+            payload = PARSED_INPUT
+        elif 'Replace the' in prompt:
+            ids = [int(pk) for pk in re.findall(r'^(\d+)\|', prompt, re.MULTILINE)]
+            payload = {'items': self._meals(ids, 2, prompt)}
+        else:
+            ids = [int(pk) for pk in re.findall(r'"id": (\d+)', prompt)]
+            payload = {
+                'plan_name': 'Balanced Day',
+                'description': 'A balanced plan generated by the offline test backend.',
+                'meals': self._meals(ids, 5, prompt),
+            }
+        return f'```json\n{json.dumps(payload)}\n```'
+
+    @staticmethod
+    def _meals(ingredient_ids, count, prompt):
+        chooser = random.Random(prompt)
+        chosen = chooser.sample(ingredient_ids, min(count, len(ingredient_ids)))
+        return [
+            {
+                'meal_type': MEAL_TYPES[index % len(MEAL_TYPES)],
+                'ingredient_id': ingredient_id,
+                'quantity_grams': chooser.choice((80, 100, 150, 200)),
+                'description': 'Chosen by the offline test backend.',
+                'order_index': index,
+            }
+            for index, ingredient_id in enumerate(chosen)
+        ]
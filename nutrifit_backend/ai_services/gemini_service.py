@@ -2,24 +2,147 @@
 Google Gemini AI service for NutriFit.
 """
 
+import asyncio
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from nutrifit.timing import llm_timer
+from . import budgets
+
+
+_genai = None
+
+
+def _load_genai():
+    """Import ``google.generativeai`` on first use; it pulls in gRPC and protobuf."""
+    global _genai
+    if _genai is None:
+        try:
+            import google.generativeai as genai  # optional dependency
+        except Exception:
+            return None
+        _genai = genai
+    return _genai
+
+
+class AIBusyError(Exception):
+    """Raised when no LLM slot frees up within ``AI_QUEUE_TIMEOUT`` seconds."""
+    
+    status_code = 503
+    
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMBudgetExceeded(AIBusyError):
+    """Raised when a call would exceed the user's or the global LLM budget."""
+    
+    status_code = 429
+
+
+_slots = None
+_slots_lock = threading.Lock()
+_executor = None
+_waiter_executor = None
 
 
-try:
-    import google.generativeai as genai  # optional dependency
-except Exception:
-    genai = None
+def _get_slots():
+    """Process-wide semaphore of ``AI_MAX_CONCURRENCY`` in-flight LLM calls."""
+    global _slots
+    with _slots_lock:
+        if _slots is None or _slots.size != settings.AI_MAX_CONCURRENCY:
+            _slots = threading.BoundedSemaphore(settings.AI_MAX_CONCURRENCY)
+            _slots.size = settings.AI_MAX_CONCURRENCY
+        return _slots
+
+
+def _busy():
+    return AIBusyError('Too many AI requests in progress, please retry shortly.')
+
+
+@contextmanager
+def llm_slot():
+    """
+    Hold one of the ``AI_MAX_CONCURRENCY`` in-flight LLM call slots of this process.
+
+    The slots are shared by every thread and event loop (under WSGI each
+    async request runs in its own loop), so the cap holds however the
+    project is served.
+    """
+    slots = _get_slots()
+    if not slots.acquire(timeout=settings.AI_QUEUE_TIMEOUT):
+        raise _busy()
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+@asynccontextmanager
+async def llm_slot_async():
+    """``llm_slot`` for coroutines; waits for a slot in a thread instead of blocking the event loop."""
+    slots = _get_slots()
+    if not slots.acquire(blocking=False):
+        deadline = time.monotonic() + settings.AI_QUEUE_TIMEOUT
+        future = asyncio.get_running_loop().run_in_executor(
+            _get_waiter_executor(), lambda: slots.acquire(timeout=max(0, deadline - time.monotonic())),
+        )
+        try:
+            acquired = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The waiting thread cannot be interrupted; give back the slot it may still get.
+            future.add_done_callback(lambda done: not done.cancelled() and done.result() and slots.release())
+            raise
+        if not acquired:
+            raise _busy()
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+def _get_waiter_executor():
+    """Threads that wait for a free slot on behalf of coroutines."""
+    global _waiter_executor
+    if _waiter_executor is None:
+        _waiter_executor = ThreadPoolExecutor(
+            max_workers=settings.AI_EXECUTOR_WORKERS, thread_name_prefix='llm-slot',
+        )
+    return _waiter_executor
+
+
+def _get_executor():
+    """Bounded thread pool for clients without a native async API."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.AI_EXECUTOR_WORKERS, thread_name_prefix='llm')
+    return _executor
 
 
 class GeminiService:
     """Wrapper for Google Gemini AI API.
 
-    This class lazily checks for the `google.generativeai` package and provides
-    clear error messages if it's missing or misconfigured so the server doesn't
-    crash at import time.
+    This class lazily imports the `google.generativeai` package on first use and
+    provides clear error messages if it's missing or misconfigured so the server
+    doesn't crash, or pay for the import, at startup.
     """
 
-    def __init__(self):
+    def __init__(self, user=None):
+        # Calls count against this user's LLM budget (see ai_services.budgets).
+        self.user_id = user.pk if user is not None else None
+        if settings.AI_BACKEND == 'fake':
+            from .fake_llm import FakeGenerativeModel
+            self.model = FakeGenerativeModel(latency=settings.AI_FAKE_LATENCY)
+            return
+
+        genai = _load_genai()
         if genai is None:
             raise Exception(
                 'google.generativeai package is not installed. Run `pip install google-generativeai` '
@@ -36,35 +159,103 @@ class GeminiService:
         except Exception as e:
             raise Exception(f'Failed to initialize Gemini model: {e}')
 
+    @staticmethod
+    def _rejection(retry_after):
+        return LLMBudgetExceeded(
+            f'AI usage limit reached, please retry in {retry_after} seconds.', retry_after=retry_after,
+        )
+
+    @staticmethod
+    def _usage(reservation, response):
+        """``(prompt_tokens, completion_tokens)`` reported by ``response``, or estimated."""
+        prompt_tokens, completion_tokens = reservation.tokens, 0
+        metadata = getattr(response, 'usage_metadata', None)
+        if metadata is not None:
+            prompt_tokens = getattr(metadata, 'prompt_token_count', 0) or prompt_tokens
+            completion_tokens = getattr(metadata, 'candidates_token_count', 0) or 0
+        elif response is not None:
+            try:
+                completion_tokens = budgets.estimate_tokens(response.text)
+            except Exception:
+                pass
+        return prompt_tokens, completion_tokens
+
     def generate_text(self, prompt):
+        reservation, retry_after = budgets.reserve(self.user_id, budgets.estimate_tokens(prompt))
+        if reservation is None:
+            budgets.record_usage(self.user_id, requests=0, rejected=1)
+            raise self._rejection(retry_after)
+        response = None
         try:
-            response = self.model.generate_content(prompt)
+            with llm_slot():
+                with llm_timer():
+                    response = self.model.generate_content(prompt)
             return response.text
+        except AIBusyError:
+            # No slot: the call was never made.
+            budgets.release(reservation)
+            raise
         except Exception as e:
             raise Exception(f'Gemini AI error: {str(e)}')
+        finally:
+            if reservation.counted:
+                budgets.settle(reservation, *self._usage(reservation, response))
+
+    async def generate_text_async(self, prompt):
+        """``generate_text`` for async views; waits for a free LLM slot first."""
+        reservation, retry_after = await budgets.areserve(self.user_id, budgets.estimate_tokens(prompt))
+        if reservation is None:
+            await sync_to_async(budgets.record_usage)(self.user_id, requests=0, rejected=1)
+            raise self._rejection(retry_after)
+        response = None
+        try:
+            async with llm_slot_async():
+                with llm_timer():
+                    if hasattr(self.model, 'generate_content_async'):
+                        response = await self.model.generate_content_async(prompt)
+                    else:
+                        loop = asyncio.get_running_loop()
+                        response = await loop.run_in_executor(_get_executor(), self.model.generate_content, prompt)
+                return response.text
+        except AIBusyError:
+            # No slot: the call was never made.
+            await budgets.arelease(reservation)
+            raise
+        except Exception as e:
+            raise Exception(f'Gemini AI error: {str(e)}')
+        finally:
+            if reservation.counted:
+                await budgets.asettle(reservation, *self._usage(reservation, response))
 
     def parse_json_response(self, prompt):
-        import json
-        import re
+        try:
+            return self._extract_json(self.generate_text(prompt))
+        except AIBusyError:
+            raise
+        except json.JSONDecodeError as e:
+            raise Exception(f'Failed to parse JSON response: {str(e)}')
+        except Exception as e:
+            raise Exception(f'Gemini AI error: {str(e)}')
 
+    async def parse_json_response_async(self, prompt):
+        response_text = await self.generate_text_async(prompt)
         try:
-            response_text = self.generate_text(prompt)
+            return self._extract_json(response_text)
+        except json.JSONDecodeError as e:
+            raise Exception(f'Failed to parse JSON response: {str(e)}')
 
-            # Extract JSON from response (handle markdown code blocks)
-            json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
+    @staticmethod
+    def _extract_json(response_text):
+        # Extract JSON from response (handle markdown code blocks)
+        json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
+        if json_match:
+            json_str = json_match.group(1)
+        else:
+            # Try to find JSON object directly
+            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
             if json_match:
-                json_str = json_match.group(1)
+                json_str = json_match.group(0)
             else:
-                # Try to find JSON object directly
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                else:
-                    json_str = response_text
+                json_str = response_text
 
-            return json.loads(json_str)
-
-        except json.JSONDecodeError as e:
-            raise Exception(f'Failed to parse JSON response: {str(e)}')
-        except Exception as e:
-            raise Exception(f'Gemini AI error: {str(e)}')
+        return json.loads(json_str)
@@ -0,0 +1,336 @@
+"""
+Idempotency keys and single-flight coalescing for the generation endpoints.
+
+A double-click or a frontend retry must not pay for a second LLM call or
+create a second plan:
+
+- Identical requests (same user, path, body and ``Idempotency-Key``) that
+  arrive while one is running in this process wait for it and get the same
+  response instead of running the view again.
+- A request with an ``Idempotency-Key`` header claims an ``IdempotencyKey``
+  row. A successful response is stored on it and replayed, with an
+  ``Idempotent-Replayed: true`` header, for every later request with the
+  same key until ``IDEMPOTENCY_KEY_TTL_HOURS`` have passed. Reusing a key for
+  a different request is a 422; a key still in progress in another process
+  is a 409. Failed requests release the key so that they can be retried, and
+  a claim whose worker died is taken over once ``IDEMPOTENCY_LOCK_SECONDS``
+  have passed.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from nutrifit.db import serialized_write
+from .models import IdempotencyKey
+
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+# Claims retried after losing a race before answering 409.
+MAX_CLAIM_ATTEMPTS = 3
+
+
+class _Abandoned(Exception):
+    """The leading call was cancelled or interrupted; a waiter runs it instead."""
+
+
+class SingleFlight:
+    """
+    Run one call per key at a time; concurrent callers with the same key
+    share its result (or exception).
+
+    Results are handed over through ``concurrent.futures.Future``, so
+    waiters may be threads or coroutines on any event loop. Cancellation of
+    the leader (a client that disconnected) is not shared: one of the
+    waiters becomes the new leader and runs the call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _join(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            del self._calls[key]
+        if error is not None:
+            future.set_exception(error if isinstance(error, Exception) else _Abandoned())
+        else:
+            future.set_result(result)
+
+    def do(self, key, function):
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return future.result()
+            except _Abandoned:
+                continue
+        try:
+            result = function()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key, function):
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return await asyncio.wrap_future(future)
+            except _Abandoned:
+                continue
+        try:
+            result = await function()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+
+flights = SingleFlight()
+
+
+class Outcome:
+    """A response reduced to what is needed to rebuild it for another request."""
+
+    __slots__ = ('status_code', 'body', 'replayed', 'headers')
+
+    def __init__(self, status_code, body, replayed=False, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.replayed = replayed
+        self.headers = headers or {}
+
+
+def _fingerprint(request):
+    """
+    Hash of the request's method, path and body.
+
+    Only JSON and form bodies are hashed; anything else, such as a file
+    upload, raises ``ValueError``.
+    """
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    try:
+        payload = json.dumps(data, sort_keys=True)
+    except TypeError:
+        raise ValueError('Requests to this endpoint must have a JSON or form body.')
+    return hashlib.sha256(f'{request.method}\n{request.path}\n{payload}'.encode()).hexdigest()
+
+
+def _lease(now):
+    return now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+
+
+def _in_progress():
+    return Outcome(status.HTTP_409_CONFLICT, json.dumps({
+        'error': 'A request with this Idempotency-Key is still in progress.'
+    }), headers={'Retry-After': '1'})
+
+
+def _claim(user, key, endpoint, request_hash):
+    """Return ``(record, None)`` if this request owns ``key``, else ``(None, Outcome)`` to answer with."""
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        claimed = _try_claim(user, key, endpoint, request_hash)
+        if claimed is not None:
+            return claimed
+    # Lost every race to concurrent requests with the same key.
+    return None, _in_progress()
+
+
+def _try_claim(user, key, endpoint, request_hash):
+    """One ``_claim`` attempt; ``None`` if a concurrent request changed the key meanwhile."""
+    now = timezone.now()
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is not None and record.expires_at <= now:
+        record.delete()
+        record = None
+    if record is None:
+        try:
+            with serialized_write():
+                record = IdempotencyKey.objects.create(
+                    user=user, key=key, endpoint=endpoint, request_hash=request_hash, locked_until=_lease(now),
+                    expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+                )
+            return record, None
+        except IntegrityError:
+            # A concurrent request claimed it first.
+            return None
+
+    if record.request_hash != request_hash:
+        return None, Outcome(status.HTTP_422_UNPROCESSABLE_ENTITY, json.dumps({
+            'error': 'Idempotency-Key was already used for a different request.'
+        }))
+    if record.status_code is None:
+        if record.locked_until is None or record.locked_until <= now:
+            # The claiming worker died without settling; take the key over
+            # unless another request just did.
+            locked_until = _lease(now)
+            with serialized_write():
+                taken = IdempotencyKey.objects.filter(
+                    pk=record.pk, status_code__isnull=True, locked_until=record.locked_until,
+                ).update(locked_until=locked_until)
+            if not taken:
+                return None
+            record.locked_until = locked_until
+            return record, None
+        return None, _in_progress()
+    return None, Outcome(record.status_code, record.response_body, replayed=True)
+
+
+def _settle(record, outcome):
+    """
+    Store a successful outcome on ``record``; release the key otherwise.
+
+    Does nothing if the lease was lost to another request in the meantime.
+    """
+    claim = IdempotencyKey.objects.filter(pk=record.pk, locked_until=record.locked_until)
+    if outcome is not None and status.is_success(outcome.status_code):
+        claim.update(status_code=outcome.status_code, response_body=outcome.body, locked_until=None)
+    else:
+        claim.delete()
+
+
+def _validate_key(request):
+    key = request.META.get(HEADER)
+    if key is not None and not 0 < len(key) <= MAX_KEY_LENGTH:
+        raise ValueError(f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters.')
+    return key
+
+
+def idempotent(view):
+    """
+    Add ``Idempotency-Key`` support and single-flight coalescing to a POST view.
+
+    Use as the innermost decorator, below ``api_view`` (the view returns a DRF
+    ``Response``) or ``async_api_view`` (it returns a JSON ``HttpResponse``).
+    """
+    if asyncio.iscoroutinefunction(view):
+        return _idempotent_async(view)
+
+    def to_outcome(response):
+        return Outcome(response.status_code, json.dumps(response.data, cls=JSONEncoder))
+
+    def to_response(outcome):
+        response = Response(json.loads(outcome.body), status=outcome.status_code)
+        _add_headers(response, outcome)
+        return response
+
+    @wraps(view)
+    def wrapped_view(request, *args, **kwargs):
+        try:
+            key = _validate_key(request)
+            request_hash = _fingerprint(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        own = {}
+
+        def run():
+            record = None
+            if key is not None:
+                record, outcome = _claim(request.user, key, request.path, request_hash)
+                if outcome is not None:
+                    return outcome
+            outcome = None
+            try:
+                own['response'] = view(request, *args, **kwargs)
+                outcome = to_outcome(own['response'])
+            finally:
+                if record is not None:
+                    _settle(record, outcome)
+            return outcome
+
+        outcome = flights.do((request.user.pk, key, request_hash), run)
+        if 'response' in own:
+            return own['response']
+        return to_response(outcome)
+
+    return wrapped_view
+
+
+def _idempotent_async(view):
+    @wraps(view)
+    async def wrapped_view(request, *args, **kwargs):
+        try:
+            key = _validate_key(request)
+            request_hash = _fingerprint(request)
+        except ValueError as e:
+            return HttpResponse(
+                json.dumps({'error': str(e)}), status=status.HTTP_400_BAD_REQUEST, content_type='application/json',
+            )
+        own = {}
+
+        async def run():
+            record = None
+            if key is not None:
+                record, outcome = await sync_to_async(_claim)(request.user, key, request.path, request_hash)
+                if outcome is not None:
+                    return outcome
+            outcome = None
+            try:
+                own['response'] = await view(request, *args, **kwargs)
+                outcome = Outcome(own['response'].status_code, own['response'].content.decode())
+            finally:
+                if record is not None:
+                    await sync_to_async(_settle)(record, outcome)
+            return outcome
+
+        outcome = await flights.do_async((request.user.pk, key, request_hash), run)
+        if 'response' in own:
+            return own['response']
+        response = HttpResponse(outcome.body, status=outcome.status_code, content_type='application/json')
+        _add_headers(response, outcome)
+        return response
+
+    return wrapped_view
+
+
+def _add_headers(response, outcome):
+    for name, value in outcome.headers.items():
+        response[name] = value
+    if outcome.replayed:
+        response['Idempotent-Replayed'] = 'true'
+
+
+def prune_expired_keys(batch_size=1000):
+    """Delete expired ``IdempotencyKey`` rows in batches; returns how many were removed."""
+    expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+    removed = 0
+    while True:
+        ids = list(expired.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            IdempotencyKey.objects.filter(id__in=ids).delete()
+        removed += len(ids)
+        if len(ids) < batch_size:
+            break
+    return removed
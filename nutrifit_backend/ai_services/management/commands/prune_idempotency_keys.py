@@ -0,0 +1,17 @@
+"""
+Management command to delete expired idempotency keys.
+"""
+
+from django.core.management.base import BaseCommand
+from ai_services.idempotency import prune_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL_HOURS in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Keys deleted per transaction (default: 1000)')
+
+    def handle(self, *args, **options):
+        removed = prune_expired_keys(batch_size=max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {removed} expired idempotency keys'))
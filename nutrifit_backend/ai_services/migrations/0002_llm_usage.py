@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ai_services', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('requests', models.PositiveIntegerField(default=0)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('rejected', models.PositiveIntegerField(default=0, help_text='Calls refused by the LLM budgets')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='llm_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'LLM usage',
+                'db_table': 'llm_usage',
+                'ordering': ['-day', '-requests'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='llmusage',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='llm_usage_user_day'),
+        ),
+    ]
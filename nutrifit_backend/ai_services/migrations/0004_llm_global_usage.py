@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0003_idempotency_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMGlobalUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('requests', models.PositiveIntegerField(default=0)),
+                ('tokens', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'LLM global usage',
+                'db_table': 'llm_global_usage',
+                'ordering': ['-day'],
+            },
+        ),
+    ]
@@ -1,3 +1,78 @@
 from django.db import models
+from django.conf import settings
 
-# Create your models here.
+
+class IdempotencyKey(models.Model):
+    """Outcome of a generation request sent with an ``Idempotency-Key`` header."""
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64, help_text='SHA-256 of method, path and body')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, help_text='Empty while in progress')
+    response_body = models.TextField(blank=True)
+    locked_until = models.DateTimeField(
+        null=True, blank=True, help_text='While in progress, when another request may take the key over'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        db_table = 'idempotency_keys'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_user_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.key} ({self.endpoint})"
+
+
+class LLMUsage(models.Model):
+    """LLM calls and tokens of one user on one day, for the admin."""
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='llm_usage'
+    )
+    day = models.DateField()
+    requests = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0, help_text='Calls refused by the LLM budgets')
+    
+    class Meta:
+        db_table = 'llm_usage'
+        ordering = ['-day', '-requests']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='llm_usage_user_day'),
+        ]
+        verbose_name_plural = 'LLM usage'
+    
+    def __str__(self):
+        return f"{self.day} - {self.user.email}"
+    
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+
+class LLMGlobalUsage(models.Model):
+    """LLM calls and tokens of the whole deployment on one day, for the global budgets."""
+    
+    day = models.DateField(unique=True)
+    requests = models.PositiveIntegerField(default=0)
+    tokens = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'llm_global_usage'
+        ordering = ['-day']
+        verbose_name_plural = 'LLM global usage'
+    
+    def __str__(self):
+        return str(self.day)
@@ -2,14 +2,16 @@
 Natural Language Parser using Google Gemini AI.
 """
 
-from .gemini_service import GeminiService
+from profiles.models import UserProfile
+from .gemini_service import AIBusyError, GeminiService
 
 
 class NaturalLanguageParser:
     """Parse natural language input to extract diet plan parameters."""
     
-    def __init__(self):
-        self.gemini = GeminiService()
+    def __init__(self, user=None):
+        # ``user`` is charged for the LLM call (see ai_services.budgets).
+        self.gemini = GeminiService(user)
     
     def parse(self, user_input, user):
         """
@@ -24,9 +26,35 @@ class NaturalLanguageParser:
         """
         
         # Get user profile for context if available
-        profile_context = ""
         try:
             profile = user.profile
+        except Exception:
+            profile = None
+        
+        try:
+            parsed_data = self.gemini.parse_json_response(self._build_prompt(user_input, profile))
+            return parsed_data
+        except AIBusyError:
+            raise
+        except Exception as e:
+            raise Exception(f"Failed to parse natural language input: {str(e)}")
+    
+    async def parse_async(self, user_input, user):
+        """``parse`` for async views: the LLM call does not hold a thread."""
+        
+        profile = await UserProfile.objects.filter(user_id=user.pk).afirst()
+        prompt = self._build_prompt(user_input, profile)
+        try:
+            return await self.gemini.parse_json_response_async(prompt)
+        except AIBusyError:
+            raise
+        except Exception as e:
+            raise Exception(f"Failed to parse natural language input: {str(e)}")
+    
+    def _build_prompt(self, user_input, profile):
+        """Prompt asking the AI to extract plan parameters from ``user_input``."""
+        
+        if profile is not None:
             profile_context = f"""
 Current user profile:
 - Age: {profile.age}
@@ -35,10 +63,10 @@ Current user profile:
 - Sex: {profile.sex}
 - Activity Level: {profile.activity_level}
 """
-        except:
+        else:
             profile_context = "No existing profile found."
         
-        prompt = f"""
+        return f"""
 You are a nutrition AI assistant. Parse the following user input and extract structured information.
 
 {profile_context}
@@ -70,9 +98,3 @@ Rules:
 5. Extract dietary preferences (vegetarian, vegan, etc.) and allergies
 6. Return ONLY valid JSON, no additional text
 """
-        
-        try:
-            parsed_data = self.gemini.parse_json_response(prompt)
-            return parsed_data
-        except Exception as e:
-            raise Exception(f"Failed to parse natural language input: {str(e)}")
@@ -1,3 +1,312 @@
-from django.test import TestCase
+import asyncio
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ai_services import budgets, idempotency, urls
+from ai_services.gemini_service import AIBusyError, llm_slot, llm_slot_async
+from ai_services.models import IdempotencyKey, LLMGlobalUsage, LLMUsage
+from nutrifit.testing import QueryBudgetMixin, build_fixture
+
+
+@override_settings(AI_BACKEND='fake', AI_FAKE_LATENCY=0)
+class AIServicesQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Natural-language parsing within a fixed number of queries."""
+
+    budgets = {
+        # Checking and counting the call in a new LLMUsage row for today takes seven, settling it one.
+        'parse-nl': 10,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = build_fixture()['user']
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.user)
+
+    def test_every_url_has_a_budget(self):
+        self.assertEveryURLHasBudget(urls.urlpatterns)
+
+    def test_parse_natural_language(self):
+        self.assertQueryBudget(
+            'parse-nl', 'post', data={'input': 'Vegetarian, 1800 kcal, no nuts'}, format='json', status=200,
+        )
+
+
+@override_settings(AI_BACKEND='fake', AI_FAKE_LATENCY=0)
+class AsyncAPIViewTests(QueryBudgetMixin, TestCase):
+    """The async AI views answer like DRF views."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = build_fixture(plans=1, items_per_plan=1, ingredients=5, food_log_entries=0,
+                                 weight_entries=0, archived_plans=0)['user']
+
+    def post(self, data, **extra):
+        return self.client.post('/api/ai/parse-natural-language/', data, format='json', **extra)
+
+    def test_invalid_token(self):
+        response = self.post({'input': 'x'}, HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+
+    def test_body_must_be_an_object(self):
+        self.authenticate(self.user)
+        response = self.post(['input'])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('detail', response.json())
+
+    def test_throttling(self):
+        self.authenticate(self.user)
+        cache.clear()
+        throttled = {
+            'DEFAULT_THROTTLE_CLASSES': ['rest_framework.throttling.UserRateThrottle'],
+            'DEFAULT_THROTTLE_RATES': {'user': '1/min'},
+        }
+        with self.settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, **throttled}):
+            self.assertEqual(self.post({'input': 'Vegetarian, 1800 kcal'}).status_code, 200)
+            response = self.post({'input': 'Vegetarian, 1800 kcal'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+
+@override_settings(AI_MAX_CONCURRENCY=1, AI_QUEUE_TIMEOUT=0.05)
+class LLMSlotTests(SimpleTestCase):
+    """AI_MAX_CONCURRENCY holds across threads and event loops."""
+
+    @staticmethod
+    def acquire_in_new_loop():
+        async def acquire():
+            async with llm_slot_async():
+                pass
+        asyncio.run(acquire())
+
+    def test_slots_are_shared_by_sync_and_async_callers(self):
+        with llm_slot():
+            with self.assertRaises(AIBusyError):
+                self.acquire_in_new_loop()
+        self.acquire_in_new_loop()
+        with llm_slot():
+            pass
+
+
+@override_settings(LLM_USER_REQUEST_BUDGET=2, LLM_USER_TOKEN_BUDGET=0,
+                   LLM_GLOBAL_REQUEST_BUDGET=0, LLM_GLOBAL_TOKEN_BUDGET=0)
+class LLMBudgetTests(TestCase):
+    """Budgets are counted in LLMUsage without a shared cache and in the cache with one."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='budget@example.com', password='budget-pass-123')
+
+    def setUp(self):
+        cache.clear()
+
+    def usage(self):
+        usage = LLMUsage.objects.get(user=self.user)
+        return usage.requests, usage.prompt_tokens, usage.completion_tokens
+
+    @override_settings(CACHE_SHARED=False)
+    def test_database_budget(self):
+        first, _ = budgets.reserve(self.user.pk, 100)
+        budgets.settle(first, 120, 30)
+        self.assertEqual(self.usage(), (1, 120, 30))
+        second, _ = budgets.reserve(self.user.pk, 100)
+        refused, retry_after = budgets.reserve(self.user.pk, 100)
+        self.assertIsNone(refused)
+        self.assertGreater(retry_after, 0)
+        budgets.release(second)
+        self.assertEqual(self.usage(), (1, 120, 30))
+        self.assertIsNotNone(budgets.reserve(self.user.pk, 100)[0])
+
+    @override_settings(CACHE_SHARED=True)
+    def test_shared_cache_budget(self):
+        # async_to_sync keeps the ORM work of the async API on this thread and transaction.
+        reserve = async_to_sync(budgets.areserve)
+        first, _ = reserve(self.user.pk, 100)
+        async_to_sync(budgets.asettle)(first, 120, 30)
+        self.assertEqual(self.usage(), (1, 120, 30))
+        second, _ = budgets.reserve(self.user.pk, 100)
+        refused, retry_after = reserve(self.user.pk, 100)
+        self.assertIsNone(refused)
+        self.assertGreater(retry_after, 0)
+        async_to_sync(budgets.arelease)(second)
+        self.assertIsNotNone(reserve(self.user.pk, 100)[0])
+
+
+# The in-memory test database does not wait for locks, so writes must take the process lock.
+@override_settings(CACHE_SHARED=False, SQLITE_SERIALIZE_WRITES=True, LLM_USER_TOKEN_BUDGET=0)
+class LLMBudgetConcurrencyTests(TransactionTestCase):
+    """Concurrent reservations in LLMUsage fill a budget exactly, neither overshooting nor refusing under it."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.users = [
+            User.objects.create_user(email=f'concurrent{i}@example.com', password='concurrent-pass-123')
+            for i in range(2)
+        ]
+
+    def reserve_concurrently(self, user_ids):
+        barrier = threading.Barrier(len(user_ids))
+        results = []
+
+        def reserve(user_id):
+            try:
+                barrier.wait()
+                results.append(budgets.reserve(user_id, 100)[0] is not None)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=reserve, args=(user_id,)) for user_id in user_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results.count(True)
+
+    @override_settings(LLM_USER_REQUEST_BUDGET=5, LLM_GLOBAL_REQUEST_BUDGET=0)
+    def test_user_budget(self):
+        user_id = self.users[0].pk
+        self.assertEqual(self.reserve_concurrently([user_id] * 5), 5)
+        budgets.record_usage(user_id, requests=-2)
+        self.assertEqual(self.reserve_concurrently([user_id] * 8), 2)
+        self.assertEqual(LLMUsage.objects.get(user_id=user_id).requests, 5)
+
+    @override_settings(LLM_USER_REQUEST_BUDGET=0, LLM_GLOBAL_REQUEST_BUDGET=3, LLM_GLOBAL_TOKEN_BUDGET=0)
+    def test_global_budget(self):
+        self.assertEqual(self.reserve_concurrently([user.pk for user in self.users] * 4), 3)
+        day = timezone.localdate()
+        self.assertEqual(LLMGlobalUsage.objects.get(day=day).requests, 3)
+        self.assertEqual(LLMUsage.objects.filter(day=day).aggregate(total=Sum('requests'))['total'], 3)
+
+    @override_settings(LLM_USER_REQUEST_BUDGET=1, LLM_GLOBAL_REQUEST_BUDGET=5, LLM_GLOBAL_TOKEN_BUDGET=1000)
+    def test_refused_by_user_budget(self):
+        user_id = self.users[0].pk
+        self.assertEqual(self.reserve_concurrently([user_id] * 4), 1)
+        # Calls the user's budget refused are not left in the global count.
+        global_usage = LLMGlobalUsage.objects.get(day=timezone.localdate())
+        self.assertEqual((global_usage.requests, global_usage.tokens), (1, 100))
+        reservation, _ = budgets.reserve(self.users[1].pk, 100)
+        budgets.settle(reservation, 300, 50)
+        global_usage.refresh_from_db()
+        self.assertEqual((global_usage.requests, global_usage.tokens), (2, 450))
+        reservation, retry_after = budgets.reserve(self.users[1].pk, 600)
+        self.assertIsNone(reservation)
+        self.assertGreater(retry_after, 0)
+
+
+class IdempotencyLeaseTests(TestCase):
+    """An in-progress claim blocks repeats until its lease runs out."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='lease@example.com', password='lease-pass-123')
+
+    def claim(self):
+        return idempotency._claim(self.user, 'nl-1', '/api/diet-plans/generate-from-nl/', '0' * 64)
+
+    def test_stale_claim_is_taken_over(self):
+        record, _ = self.claim()
+        _, outcome = self.claim()
+        self.assertEqual(outcome.status_code, 409)
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        taken, outcome = self.claim()
+        self.assertIsNone(outcome)
+        self.assertEqual(taken.pk, record.pk)
+
+        # The original worker's late result no longer counts.
+        idempotency._settle(record, idempotency.Outcome(201, '{"id": 1}'))
+        self.assertIsNone(IdempotencyKey.objects.get(pk=record.pk).status_code)
+        idempotency._settle(taken, idempotency.Outcome(201, '{"id": 2}'))
+        _, outcome = self.claim()
+        self.assertEqual((outcome.body, outcome.replayed), ('{"id": 2}', True))
+
+
+class IdempotencyRequestTests(TestCase):
+    """Claims give up after a bounded number of lost races; only JSON and form bodies are fingerprinted."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='claims@example.com', password='claims-pass-123')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_claim_gives_up_after_lost_races(self):
+        # Every insert loses to a concurrent request whose row this one never sees.
+        with mock.patch.object(IdempotencyKey.objects, 'create', side_effect=IntegrityError) as create:
+            record, outcome = idempotency._claim(self.user, 'race', '/api/diet-plans/generate/', '0' * 64)
+        self.assertIsNone(record)
+        self.assertEqual((outcome.status_code, outcome.headers), (409, {'Retry-After': '1'}))
+        self.assertEqual(create.call_count, idempotency.MAX_CLAIM_ATTEMPTS)
+
+    def test_request_bodies(self):
+        url = reverse('generate-diet-plan')
+        response = self.client.post(url, {'plan_name': 'Form plan'}, HTTP_IDEMPOTENCY_KEY='form-1')
+        self.assertEqual(response.status_code, 201)
+        replayed = self.client.post(url, {'plan_name': 'Form plan'}, HTTP_IDEMPOTENCY_KEY='form-1')
+        self.assertEqual((replayed['Idempotent-Replayed'], replayed.json()), ('true', response.json()))
+
+        upload = SimpleUploadedFile('plan.bin', bytes(range(256)))
+        response = self.client.post(url, {'plan_name': 'Upload', 'file': upload}, HTTP_IDEMPOTENCY_KEY='upload-1')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Requests to this endpoint must have a JSON or form body.'})
+        self.assertFalse(IdempotencyKey.objects.filter(key='upload-1').exists())
+
+
+class SingleFlightTests(SimpleTestCase):
+    """Waiters share the leader's result but not its cancellation."""
+
+    def test_cancelled_leader_hands_over_to_a_waiter(self):
+        flights = idempotency.SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(None)
+            await asyncio.sleep(0.01 if len(calls) == 1 else 0)
+            return len(calls)
+
+        async def scenario():
+            leader = asyncio.ensure_future(flights.do_async('key', call))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(flights.do_async('key', call))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await waiter
+
+        self.assertEqual(asyncio.run(scenario()), 2)
+
+
+class AIServicesAdminQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Admin pages of the ai_services models."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = build_fixture()['user']
+        IdempotencyKey.objects.create(
+            user=user, key='nl-1', endpoint='/api/diet-plans/generate-from-nl/', request_hash='0' * 64,
+            status_code=201, response_body='{}', expires_at=timezone.now() + timedelta(hours=1),
+        )
+        LLMUsage.objects.create(user=user, day=timezone.localdate(), requests=2, prompt_tokens=900, completion_tokens=300)
+        cls.admin = get_user_model().objects.create_superuser(email='admin@example.com', password='admin-pass-123')
+
+    def test_admin_pages(self):
+        self.client.force_login(self.admin)
+        self.assertAdminBudgets('ai_services', changelist_budget=8, change_budget=7)
@@ -1,33 +1,34 @@
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
+from django.http import JsonResponse
 from rest_framework import status
+from .async_views import async_api_view
+from .gemini_service import AIBusyError
 from .nl_parser import NaturalLanguageParser
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def parse_natural_language(request):
+@async_api_view(['POST'])
+async def parse_natural_language(request):
     """Parse natural language input to extract diet parameters."""
     
     try:
         user_input = request.data.get('input', '')
         
         if not user_input:
-            return Response({
+            return JsonResponse({
                 'error': 'Input text is required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        parser = NaturalLanguageParser()
-        parsed_data = parser.parse(user_input, request.user)
+        parser = NaturalLanguageParser(request.user)
+        parsed_data = await parser.parse_async(user_input, request.user)
         
-        return Response({
+        return JsonResponse({
             'success': True,
             'data': parsed_data
         }, status=status.HTTP_200_OK)
     
+    except AIBusyError:
+        raise
     except Exception as e:
-        return Response({
+        return JsonResponse({
             'success': False,
             'error': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Ingredient, DietPlan, DietPlanItem
+from profiles.models import DietGoal
+from .models import Ingredient, DietPlan, DietPlanItem, ArchivedDietPlan, FoodLogEntry, DailyNutritionTotal
 
 
 @admin.register(Ingredient)
@@ -13,7 +14,43 @@ class IngredientAdmin(admin.ModelAdmin):
 class DietPlanItemInline(admin.TabularInline):
     model = DietPlanItem
     extra = 0
-    readonly_fields = ('calories', 'protein', 'carbs', 'fat')
+    readonly_fields = ('item_calories', 'item_protein', 'item_carbs', 'item_fat')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'ingredient':
+            # Evaluate the catalog once per page instead of once per item row
+            # (iterating rather than list() also skips a COUNT query).
+            choices = getattr(request, '_ingredient_choices', None)
+            if choices is None:
+                choices = request._ingredient_choices = [choice for choice in formfield.choices]
+            formfield.choices = choices
+        return formfield
+    
+    def _macro(self, obj, name):
+        # The blank "add another" row has no ingredient or quantity yet.
+        if obj.ingredient_id is None or obj.quantity_grams is None:
+            return '-'
+        return round(getattr(obj, name), 2)
+    
+    @admin.display(description='Calories')
+    def item_calories(self, obj):
+        return self._macro(obj, 'calories')
+    
+    @admin.display(description='Protein')
+    def item_protein(self, obj):
+        return self._macro(obj, 'protein')
+    
+    @admin.display(description='Carbs')
+    def item_carbs(self, obj):
+        return self._macro(obj, 'carbs')
+    
+    @admin.display(description='Fat')
+    def item_fat(self, obj):
+        return self._macro(obj, 'fat')
 
 
 @admin.register(DietPlan)
@@ -21,7 +58,17 @@ class DietPlanAdmin(admin.ModelAdmin):
     list_display = ('plan_name', 'user', 'total_calories', 'is_favorite', 'created_at')
     list_filter = ('is_favorite', 'created_at')
     search_fields = ('plan_name', 'user__email')
+    raw_id_fields = ('user',)
     inlines = [DietPlanItemInline]
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'goal':
+            # DietGoal.__str__ shows the user's email.
+            kwargs['queryset'] = DietGoal.objects.select_related('user')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
 @admin.register(DietPlanItem)
@@ -29,3 +76,32 @@ class DietPlanItemAdmin(admin.ModelAdmin):
     list_display = ('diet_plan', 'ingredient', 'quantity_grams', 'meal_type', 'order_index')
     list_filter = ('meal_type',)
     search_fields = ('diet_plan__plan_name', 'ingredient__name')
+    raw_id_fields = ('diet_plan', 'ingredient')
+
+
+@admin.register(ArchivedDietPlan)
+class ArchivedDietPlanAdmin(admin.ModelAdmin):
+    list_display = ('plan_name', 'user', 'created_at', 'archived_at', 'raw_size')
+    list_filter = ('archived_at',)
+    search_fields = ('plan_name', 'user__email')
+    exclude = ('payload',)
+    readonly_fields = ('original_id', 'user', 'plan_name', 'created_at', 'archived_at', 'raw_size')
+
+
+@admin.register(FoodLogEntry)
+class FoodLogEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'quantity_grams', 'meal_type', 'consumed_at', 'calories')
+    list_filter = ('meal_type',)
+    search_fields = ('user__email', 'ingredient__name')
+    list_select_related = ('user', 'ingredient')
+    raw_id_fields = ('ingredient',)
+    # Totals are maintained by diet.food_log; log through the API instead.
+    readonly_fields = ('calories', 'protein', 'carbs', 'fat')
+
+
+@admin.register(DailyNutritionTotal)
+class DailyNutritionTotalAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'entry_count', 'calories', 'protein', 'carbs', 'fat')
+    list_filter = ('date',)
+    search_fields = ('user__email',)
+    list_select_related = ('user',)
@@ -0,0 +1,166 @@
+"""
+Archival of old diet plans into compressed snapshots.
+
+Plans older than the retention window (favorites excluded) are copied
+into ``ArchivedDietPlan`` as zlib-compressed JSON and then deleted from
+``diet_plans``/``diet_plan_items``. Work is done in small batches, each
+in its own short transaction, so no long-lived locks are held.
+"""
+
+import json
+import time
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from nutrifit.cache import touch, user_token_key
+from nutrifit.db import serialized_write
+
+from .models import ArchivedDietPlan, DietPlan, DietPlanItem
+
+
+PLAN_FIELDS = (
+    'id', 'user_id', 'goal_id', 'plan_name', 'ai_description', 'total_calories',
+    'total_protein', 'total_carbs', 'total_fat', 'is_favorite', 'created_at',
+)
+ITEM_FIELDS = (
+    'id', 'diet_plan_id', 'ingredient_id', 'ingredient__name', 'quantity_grams',
+    'meal_type', 'ai_description', 'preparation_notes', 'order_index',
+)
+
+COMPRESSION_LEVEL = 9
+
+
+class ArchiveStats:
+    """Counters reported by an archival run."""
+
+    def __init__(self):
+        self.plans = 0
+        self.items = 0
+        self.batches = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.started = time.perf_counter()
+
+    @property
+    def compression_savings(self):
+        """Bytes by which the compressed snapshots are smaller than their JSON (not freed table space)."""
+        return max(self.raw_bytes - self.stored_bytes, 0)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def retention_cutoff(days=None):
+    """Creation time before which non-favorite plans are archived."""
+    if days is None:
+        days = settings.DIET_PLAN_RETENTION_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_plans(cutoff):
+    return DietPlan.objects.filter(created_at__lt=cutoff, is_favorite=False)
+
+
+def compress_payload(data):
+    raw = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+    return raw, zlib.compress(raw, COMPRESSION_LEVEL)
+
+
+def load_payload(archived):
+    """Decompress an ``ArchivedDietPlan`` back into the plan dict."""
+    return json.loads(zlib.decompress(bytes(archived.payload)).decode('utf-8'))
+
+
+def _snapshot(plan_ids):
+    plans = {row['id']: dict(row, items=[]) for row in DietPlan.objects.filter(id__in=plan_ids).values(*PLAN_FIELDS)}
+    items = (
+        DietPlanItem.objects.filter(diet_plan_id__in=plan_ids)
+        .order_by('diet_plan_id', 'meal_type', 'order_index')
+        .values(*ITEM_FIELDS)
+    )
+    for item in items:
+        item['ingredient'] = item.pop('ingredient__name')
+        plans[item.pop('diet_plan_id')]['items'].append(item)
+    return plans
+
+
+def _build_archives(plans, stats):
+    """Compress snapshots into unsaved ``ArchivedDietPlan`` rows; returns ``(archives, item_count)``."""
+    archives = []
+    item_count = 0
+    for plan in plans.values():
+        raw, compressed = compress_payload(plan)
+        stats.raw_bytes += len(raw)
+        stats.stored_bytes += len(compressed)
+        item_count += len(plan['items'])
+        archives.append(ArchivedDietPlan(
+            original_id=plan['id'],
+            user_id=plan['user_id'],
+            plan_name=plan['plan_name'],
+            created_at=plan['created_at'],
+            payload=compressed,
+            raw_size=len(raw),
+        ))
+    return archives, item_count
+
+
+def _delete_plans(plan_ids):
+    """
+    Delete plans and their items with one DELETE each.
+
+    ``QuerySet.delete`` would load every row to send ``post_delete``, whose
+    handlers touch one cache token per plan and item; the caller touches
+    the owners' tokens once per batch instead.
+    """
+    DietPlanItem.objects.filter(diet_plan_id__in=plan_ids)._raw_delete(DietPlanItem.objects.db)
+    DietPlan.objects.filter(id__in=plan_ids)._raw_delete(DietPlan.objects.db)
+
+
+def archive_plans(cutoff, batch_size=500, dry_run=False, pause=0.0, on_batch=None):
+    """
+    Move plans created before ``cutoff`` into the archive table.
+
+    ``pause`` seconds are slept between batches to leave room for other
+    writers. Returns an ``ArchiveStats``.
+    """
+    stats = ArchiveStats()
+    last_id = 0
+    while True:
+        plan_ids = list(
+            archivable_plans(cutoff).filter(id__gt=last_id)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not plan_ids:
+            break
+        last_id = plan_ids[-1]
+
+        if dry_run:
+            archives, item_count = _build_archives(_snapshot(plan_ids), stats)
+        else:
+            with serialized_write():
+                # Lock the batch and re-check the filter, so plans favorited
+                # meanwhile are kept and edits made meanwhile are archived.
+                batch = archivable_plans(cutoff).filter(id__in=plan_ids)
+                if connection.features.has_select_for_update:
+                    batch = batch.select_for_update()
+                plan_ids = list(batch.values_list('id', flat=True))
+                archives, item_count = _build_archives(_snapshot(plan_ids), stats)
+                ArchivedDietPlan.objects.bulk_create(archives)
+                _delete_plans(plan_ids)
+                user_keys = {user_token_key(archive.user_id) for archive in archives}
+                transaction.on_commit(lambda keys=user_keys: touch(*keys))
+
+        stats.plans += len(archives)
+        stats.items += item_count
+        stats.batches += 1
+        if on_batch:
+            on_batch(stats)
+        if pause:
+            time.sleep(pause)
+    return stats
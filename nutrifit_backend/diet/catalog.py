@@ -0,0 +1,25 @@
+"""
+Version of the ingredient catalog, for data derived from all ingredients.
+
+The version is a ``nutrifit.cache`` token: every committed ingredient
+change replaces it, which re-keys cached shopping lists and makes
+in-process structures such as the swap index rebuild on next use. Without
+a shared cache the token also expires after ``UNSHARED_CACHE_TIMEOUT``, so
+processes that did not see a write pick it up within that time.
+"""
+
+from nutrifit.cache import get_tokens, touch
+
+
+# Invalidation token touched by any ingredient change (names, categories, nutrients).
+CATALOG_TOKEN_KEY = 'ingredient-catalog'
+
+
+def catalog_version():
+    """Current catalog version; changes after every catalog write."""
+    return get_tokens([CATALOG_TOKEN_KEY])[CATALOG_TOKEN_KEY]
+
+
+def invalidate_catalog():
+    """Mark the catalog as changed. Call it once the change is committed."""
+    touch(CATALOG_TOKEN_KEY)
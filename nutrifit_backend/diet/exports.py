@@ -0,0 +1,218 @@
+"""
+Streaming exports of diet plans (CSV, JSON-lines and iCalendar).
+
+Rows are read with ``QuerySet.iterator`` and written out as they arrive,
+so memory use stays flat no matter how many plans are exported.
+"""
+
+import csv
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .summaries import MACROS
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'ics': 'text/calendar; charset=utf-8',
+}
+
+EXPORT_COLUMNS = (
+    'plan_id', 'user_id', 'plan_name', 'plan_created_at', 'is_favorite',
+    'target_calories', 'target_protein', 'target_carbs', 'target_fat',
+    'meal_type', 'order_index', 'ingredient_id', 'ingredient', 'quantity_grams',
+    'calories', 'protein', 'carbs', 'fat', 'description',
+)
+
+# Fields read from DietPlan, joined to its items and their ingredients.
+_QUERY_FIELDS = (
+    'id', 'user_id', 'plan_name', 'created_at', 'is_favorite',
+    'total_calories', 'total_protein', 'total_carbs', 'total_fat',
+    'items__meal_type', 'items__order_index', 'items__ingredient_id',
+    'items__ingredient__name', 'items__quantity_grams',
+    'items__ingredient__calories_per_100g', 'items__ingredient__protein_per_100g',
+    'items__ingredient__carbs_per_100g', 'items__ingredient__fat_per_100g',
+    'items__ai_description',
+)
+
+# Nominal times used to place meals on the calendar.
+MEAL_TIMES = {
+    'breakfast': (time(8, 0), 30),
+    'lunch': (time(12, 30), 45),
+    'snack': (time(16, 0), 15),
+    'dinner': (time(19, 0), 45),
+}
+
+# Leading characters that make spreadsheet applications evaluate a cell.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+
+def export_rows(plans, chunk_size=CHUNK_SIZE):
+    """
+    Yield one dict per plan item (or per empty plan) in ``EXPORT_COLUMNS`` order.
+
+    ``plans`` is a ``DietPlan`` queryset; it is joined to items and
+    ingredients in a single streamed query.
+    """
+    rows = (
+        plans.order_by('created_at', 'id', 'items__meal_type', 'items__order_index')
+        .values_list(*_QUERY_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    hundred = Decimal(100)
+    for row in rows:
+        (plan_id, user_id, plan_name, created_at, is_favorite,
+         total_calories, total_protein, total_carbs, total_fat,
+         meal_type, order_index, ingredient_id, ingredient, grams,
+         calories, protein, carbs, fat, description) = row
+        if grams is not None:
+            per_100g = (calories, protein, carbs, fat)
+            nutrients = [round(float(grams * value / hundred), 2) for value in per_100g]
+        else:
+            nutrients = [None] * len(MACROS)
+        yield dict(zip(EXPORT_COLUMNS, (
+            plan_id, user_id, plan_name, created_at, is_favorite,
+            total_calories, total_protein, total_carbs, total_fat,
+            meal_type, order_index, ingredient_id, ingredient, grams,
+            *nutrients, description,
+        )))
+
+
+def _buffered(chunks, size=BUFFER_SIZE):
+    """Join small string chunks into larger ones to keep write calls cheap."""
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+class _Echo:
+    """File-like object whose ``write`` just returns the value (for csv.writer)."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    """Quote text a spreadsheet would run as a formula (CSV injection)."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        values = [_csv_cell(value) for value in row.values()]
+        values[3] = values[3].isoformat()
+        yield writer.writerow(values)
+
+
+def _jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def _ics_escape(text):
+    return (
+        str(text).replace('\\', '\\\\').replace(';', '\\;')
+        .replace(',', '\\,').replace('\n', '\\n')
+    )
+
+
+def _ics_line(line):
+    """Fold a content line at 75 octets as required by RFC 5545."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte UTF-8 sequence.
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _ics_event(plan, meal_type, items, stamp):
+    start_time, minutes = MEAL_TIMES.get(meal_type, (time(12, 0), 30))
+    day = timezone.localtime(plan['plan_created_at']).date()
+    start = datetime.combine(day, start_time)
+    end = start + timedelta(minutes=minutes)
+    calories = sum(item['calories'] for item in items)
+    summary = f"{meal_type.capitalize()}: {', '.join(item['ingredient'] for item in items)}"
+    description = '\n'.join(
+        f"{item['ingredient']} - {item['quantity_grams']}g ({item['calories']:.0f} kcal)"
+        for item in items
+    )
+    description += f"\nTotal: {calories:.0f} kcal\nPlan: {plan['plan_name']}"
+    lines = (
+        'BEGIN:VEVENT',
+        f"UID:plan-{plan['plan_id']}-{meal_type}@nutrifit",
+        f'DTSTAMP:{stamp}',
+        f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}",
+        f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}",
+        f'SUMMARY:{_ics_escape(summary)}',
+        f'DESCRIPTION:{_ics_escape(description)}',
+        'END:VEVENT',
+    )
+    return ''.join(_ics_line(line) for line in lines)
+
+
+def _ics_lines(rows):
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%SZ')
+    yield _ics_line('BEGIN:VCALENDAR')
+    yield _ics_line('VERSION:2.0')
+    yield _ics_line('PRODID:-//NutriFit//Diet Plans//EN')
+    yield _ics_line('CALSCALE:GREGORIAN')
+    yield _ics_line('X-WR-CALNAME:NutriFit meals')
+
+    # Rows arrive ordered by plan then meal type, so each meal is a run.
+    current_key = None
+    current_plan = None
+    items = []
+    for row in rows:
+        if row['meal_type'] is None:
+            continue
+        key = (row['plan_id'], row['meal_type'])
+        if key != current_key:
+            if items:
+                yield _ics_event(current_plan, current_key[1], items, stamp)
+            current_key, current_plan, items = key, row, []
+        items.append(row)
+    if items:
+        yield _ics_event(current_plan, current_key[1], items, stamp)
+
+    yield _ics_line('END:VCALENDAR')
+
+
+_WRITERS = {
+    'csv': _csv_lines,
+    'jsonl': _jsonl_lines,
+    'ics': _ics_lines,
+}
+
+
+def stream_export(plans, export_format, chunk_size=CHUNK_SIZE):
+    """Yield the export of ``plans`` in ``export_format`` as text chunks."""
+    writer = _WRITERS[export_format]
+    return _buffered(writer(export_rows(plans, chunk_size=chunk_size)))
@@ -0,0 +1,201 @@
+"""
+Food consumption log with incrementally maintained daily totals.
+
+Each log write adjusts the user's ``DailyNutritionTotal`` row for that day
+with ``F()`` increments in the same transaction, so "today" and adherence
+reads are indexed lookups on ``(user, date)`` instead of scans over the
+raw entries. Nutrients are captured on the entry at log time, which keeps
+totals exact when an entry is deleted after the catalog changed.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from nutrifit.db import serialized_write
+from profiles.targets import get_targets
+from .models import DailyNutritionTotal, DietPlan, FoodLogEntry, Ingredient
+from .summaries import MACROS
+
+
+MAX_BULK_ENTRIES = 500
+# A day counts as adherent when calories are within this share of the target.
+ADHERENCE_TOLERANCE = 0.10
+
+
+def _apply_deltas(user_id, deltas):
+    """Add ``{date: {'entry_count': n, 'calories': x, ...}}`` to the daily totals."""
+    existing = set(
+        DailyNutritionTotal.objects.filter(user_id=user_id, date__in=list(deltas)).values_list('date', flat=True)
+    )
+    missing = [day for day in deltas if day not in existing]
+    if missing:
+        try:
+            with transaction.atomic():
+                DailyNutritionTotal.objects.bulk_create([
+                    DailyNutritionTotal(user_id=user_id, date=day, **deltas[day]) for day in missing
+                ])
+        except IntegrityError:
+            pass  # Some were created concurrently; the loop below handles every day.
+        else:
+            deltas = {day: delta for day, delta in deltas.items() if day in existing}
+
+    for day, delta in deltas.items():
+        updated = DailyNutritionTotal.objects.filter(user_id=user_id, date=day).update(
+            **{name: F(name) + value for name, value in delta.items()}
+        )
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                DailyNutritionTotal.objects.create(user_id=user_id, date=day, **delta)
+        except IntegrityError:
+            # Created concurrently; retry as an increment.
+            DailyNutritionTotal.objects.filter(user_id=user_id, date=day).update(
+                **{name: F(name) + value for name, value in delta.items()}
+            )
+
+
+def log_entries(user, entries):
+    """
+    Log several foods at once.
+
+    ``entries`` are dicts with ``ingredient_id``, ``quantity_grams`` and optional ``consumed_at``, ``meal_type`` and
+    ``client_id``. Entries whose ``client_id`` was already logged are
+    skipped. Returns ``(created_entries, skipped_count)``.
+    """
+    try:
+        return _log_entries(user, entries)
+    except IntegrityError:
+        # A concurrent request logged one of the client_ids first; the
+        # retry sees it and skips it.
+        return _log_entries(user, entries)
+
+
+def _log_entries(user, entries):
+    client_ids = [entry['client_id'] for entry in entries if entry.get('client_id')]
+    ingredient_ids = {entry['ingredient_id'] for entry in entries}
+
+    with serialized_write():
+        seen = set(
+            FoodLogEntry.objects.filter(user=user, client_id__in=client_ids).values_list('client_id', flat=True)
+        ) if client_ids else set()
+        ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+
+        now = timezone.now()
+        objects = []
+        for entry in entries:
+            client_id = entry.get('client_id') or None
+            if client_id is not None:
+                if client_id in seen:
+                    continue
+                seen.add(client_id)
+            ingredient = ingredients.get(entry['ingredient_id'])
+            if ingredient is None:
+                raise Ingredient.DoesNotExist(f"Unknown ingredient id: {entry['ingredient_id']}")
+            multiplier = float(entry['quantity_grams']) / 100
+            objects.append(FoodLogEntry(
+                user=user,
+                ingredient=ingredient,
+                quantity_grams=entry['quantity_grams'],
+                meal_type=entry.get('meal_type') or '',
+                consumed_at=entry.get('consumed_at') or now,
+                client_id=client_id,
+                **{name: round(float(getattr(ingredient, f'{name}_per_100g')) * multiplier, 2) for name in MACROS},
+            ))
+
+        created = FoodLogEntry.objects.bulk_create(objects)
+        deltas = defaultdict(lambda: dict.fromkeys(('entry_count',) + MACROS, 0))
+        for entry in created:
+            delta = deltas[timezone.localdate(entry.consumed_at)]
+            delta['entry_count'] += 1
+            for name in MACROS:
+                delta[name] += getattr(entry, name)
+        _apply_deltas(user.pk, deltas)
+
+    return created, len(entries) - len(created)
+
+
+def delete_entry(entry):
+    """Remove a log entry and subtract it from its day's totals."""
+    delta = {'entry_count': -1, **{name: -getattr(entry, name) for name in MACROS}}
+    with serialized_write():
+        entry.delete()
+        _apply_deltas(entry.user_id, {timezone.localdate(entry.consumed_at): delta})
+
+
+def daily_target(user):
+    """
+    Daily calorie/macro target: the latest diet plan's totals, falling
+    back to the profile's metabolic targets.
+    """
+    plan = (
+        DietPlan.objects.filter(user=user)
+        .only('id', *(f'total_{name}' for name in MACROS))
+        .order_by('-created_at').first()
+    )
+    if plan is not None:
+        return {'source': 'diet_plan', 'diet_plan_id': plan.pk,
+                **{name: float(getattr(plan, f'total_{name}')) for name in MACROS}}
+    targets = get_targets(user)
+    if targets is not None:
+        return {'source': 'profile', **{name: targets[name] for name in MACROS}}
+    return None
+
+
+def _totals(row):
+    return {name: round(getattr(row, name), 2) if row else 0.0 for name in MACROS}
+
+
+def day_progress(user, day):
+    """Logged totals for ``day`` against the daily target."""
+    row = DailyNutritionTotal.objects.filter(user=user, date=day).first()
+    totals = _totals(row)
+    target = daily_target(user)
+    return {
+        'date': day,
+        'entry_count': row.entry_count if row else 0,
+        'totals': totals,
+        'target': target,
+        'remaining': {name: round(target[name] - totals[name], 2) for name in MACROS} if target else None,
+    }
+
+
+def adherence(user, days=30, end=None):
+    """
+    Calorie adherence over the ``days`` days ending on ``end`` (default today).
+
+    Days without any log count as missed.
+    """
+    end = end or timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    rows = {
+        row.date: row
+        for row in DailyNutritionTotal.objects.filter(user=user, date__range=(start, end))
+    }
+    target = daily_target(user)
+    calorie_target = target['calories'] if target else None
+
+    series = []
+    adherent = 0
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day)
+        calories = round(row.calories, 2) if row else 0.0
+        ratio = round(calories / calorie_target, 3) if calorie_target else None
+        if ratio is not None and row and abs(ratio - 1) <= ADHERENCE_TOLERANCE:
+            adherent += 1
+        series.append({'date': day, 'calories': calories, 'ratio': ratio})
+
+    return {
+        'start': start,
+        'end': end,
+        'target': target,
+        'logged_days': len(rows),
+        'adherent_days': adherent,
+        'adherence': round(adherent / days, 3),
+        'days': series,
+    }
@@ -0,0 +1,329 @@
+"""
+Streaming bulk importer for ingredient (food-composition) datasets.
+"""
+
+import csv
+import gzip
+import io
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.db import transaction
+
+from .catalog import invalidate_catalog
+from .models import Ingredient
+
+
+# Columns copied onto Ingredient rows (everything except the natural key).
+IMPORT_FIELDS = (
+    'category', 'calories_per_100g', 'protein_per_100g', 'carbs_per_100g',
+    'fat_per_100g', 'fiber_per_100g', 'image_url', 'is_vegetarian', 'is_vegan',
+    'common_allergens',
+)
+
+# Upper bounds implied by the DecimalField max_digits on Ingredient.
+NUTRIENT_LIMITS = {
+    'calories_per_100g': Decimal('9999.99'),
+    'protein_per_100g': Decimal('999.99'),
+    'carbs_per_100g': Decimal('999.99'),
+    'fat_per_100g': Decimal('999.99'),
+    'fiber_per_100g': Decimal('999.99'),
+}
+
+# Common column names used by public food-composition datasets.
+COLUMN_ALIASES = {
+    'food': 'name',
+    'description': 'name',
+    'food_name': 'name',
+    'group': 'category',
+    'food_group': 'category',
+    'calories': 'calories_per_100g',
+    'energy_kcal': 'calories_per_100g',
+    'kcal': 'calories_per_100g',
+    'protein': 'protein_per_100g',
+    'protein_g': 'protein_per_100g',
+    'carbs': 'carbs_per_100g',
+    'carbohydrate': 'carbs_per_100g',
+    'carbohydrate_g': 'carbs_per_100g',
+    'fat': 'fat_per_100g',
+    'total_fat': 'fat_per_100g',
+    'fat_g': 'fat_per_100g',
+    'fiber': 'fiber_per_100g',
+    'fibre': 'fiber_per_100g',
+    'fiber_g': 'fiber_per_100g',
+    'allergens': 'common_allergens',
+    'vegetarian': 'is_vegetarian',
+    'vegan': 'is_vegan',
+}
+
+CATEGORIES = {value for value, _ in Ingredient.CATEGORY_CHOICES}
+CATEGORY_ALIASES = {
+    'meat': 'protein',
+    'fish': 'protein',
+    'seafood': 'protein',
+    'legumes': 'protein',
+    'carbohydrates': 'carbs',
+    'vegetable': 'vegetables',
+    'fruit': 'fruits',
+    'milk': 'dairy',
+    'oils': 'fats',
+    'fats & oils': 'fats',
+    'cereals': 'grains',
+    'grain': 'grains',
+    'nuts & seeds': 'nuts',
+    'seeds': 'nuts',
+}
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n', ''}
+
+TWO_PLACES = Decimal('0.01')
+
+
+class RowError(ValueError):
+    """Raised when an input row cannot be turned into an ingredient."""
+
+
+def open_source(path):
+    """Open a (optionally gzip-compressed) text file for streaming."""
+    path = Path(path)
+    if path.suffix == '.gz':
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def detect_format(path):
+    """Guess the input format from the file name."""
+    suffixes = [s.lower() for s in Path(path).suffixes if s.lower() != '.gz']
+    if suffixes and suffixes[-1] in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_rows(stream, file_format='csv'):
+    """Yield ``(line_number, raw_row)`` pairs without reading the whole file."""
+    if file_format == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, RowError(f'invalid JSON: {e}')
+                continue
+            yield line_number, row
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def _to_decimal(value, field):
+    if value in (None, ''):
+        if field == 'fiber_per_100g':
+            return Decimal('0.00')
+        raise RowError(f'{field} is required')
+    try:
+        number = Decimal(str(value).strip().replace(',', '.'))
+    except InvalidOperation:
+        raise RowError(f'{field} is not a number: {value!r}')
+    if not number.is_finite() or number < 0:
+        raise RowError(f'{field} must be a non-negative number: {value!r}')
+    number = number.quantize(TWO_PLACES)
+    if number > NUTRIENT_LIMITS[field]:
+        raise RowError(f'{field} is out of range: {value!r}')
+    return number
+
+
+def _to_bool(value, default):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return default if text == '' else False
+    raise RowError(f'invalid boolean: {value!r}')
+
+
+def _to_allergens(value):
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith('['):
+            try:
+                value = json.loads(text)
+            except json.JSONDecodeError:
+                raise RowError(f'invalid allergen list: {value!r}')
+        else:
+            value = text.replace('|', ';').replace(',', ';').split(';')
+    if not isinstance(value, (list, tuple)):
+        raise RowError(f'invalid allergen list: {value!r}')
+    allergens = []
+    for allergen in value:
+        allergen = str(allergen).strip().lower()
+        if allergen and allergen not in allergens:
+            allergens.append(allergen)
+    return allergens
+
+
+def _to_category(value):
+    category = ' '.join(str(value or '').split()).lower()
+    category = CATEGORY_ALIASES.get(category, category)
+    return category if category in CATEGORIES else 'other'
+
+
+def normalize_row(raw):
+    """Validate a raw row and return clean Ingredient field values."""
+    if isinstance(raw, Exception):
+        raise raw
+    if not isinstance(raw, dict):
+        raise RowError('row is not an object')
+
+    row = {}
+    for key, value in raw.items():
+        if key is None:
+            continue
+        key = key.strip().lower().replace(' ', '_')
+        row[COLUMN_ALIASES.get(key, key)] = value
+
+    name = ' '.join(str(row.get('name') or '').split())
+    if not name:
+        raise RowError('name is required')
+    if len(name) > Ingredient._meta.get_field('name').max_length:
+        raise RowError('name is too long')
+
+    is_vegan = _to_bool(row.get('is_vegan'), False)
+    clean = {
+        'name': name,
+        'category': _to_category(row.get('category')),
+        'image_url': str(row.get('image_url') or '').strip(),
+        'is_vegan': is_vegan,
+        # Vegan food is vegetarian by definition, whatever the source says.
+        'is_vegetarian': is_vegan or _to_bool(row.get('is_vegetarian'), True),
+        'common_allergens': _to_allergens(row.get('common_allergens')),
+    }
+    for field in NUTRIENT_LIMITS:
+        clean[field] = _to_decimal(row.get(field), field)
+    return clean
+
+
+class ImportStats:
+    """Counters reported at the end of an import run."""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def processed(self):
+        return self.created + self.updated + self.unchanged + self.skipped
+
+    @property
+    def elapsed(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+
+class IngredientImporter:
+    """
+    Upsert ingredients in batches keyed on ``Ingredient.name``.
+
+    Each batch costs one SELECT for the existing rows plus at most one
+    bulk INSERT and one bulk UPDATE, all inside a single transaction.
+    Rows whose values already match the database are left untouched, so
+    re-importing a dataset only writes what actually changed.
+    """
+
+    def __init__(self, batch_size=500, update_existing=True, dry_run=False,
+                 max_errors=None, on_batch=None):
+        self.batch_size = max(1, batch_size)
+        self.update_existing = update_existing
+        self.dry_run = dry_run
+        self.max_errors = max_errors
+        self.on_batch = on_batch
+        self.created_names = []
+
+    def run(self, rows):
+        """Import an iterable of ``(line_number, raw_row)`` pairs."""
+        stats = ImportStats()
+        batch = {}
+        for line_number, raw in rows:
+            try:
+                clean = normalize_row(raw)
+            except RowError as e:
+                stats.skipped += 1
+                stats.errors.append((line_number, str(e)))
+                if self.max_errors is not None and len(stats.errors) > self.max_errors:
+                    raise RowError(f'Too many invalid rows (last on line {line_number}: {e})')
+                continue
+            if clean['name'] in batch:
+                # Later rows win; the superseded one is skipped.
+                stats.skipped += 1
+            batch[clean['name']] = clean
+            if len(batch) >= self.batch_size:
+                self._flush(batch, stats)
+                batch = {}
+        if batch:
+            self._flush(batch, stats)
+        stats.finished = time.perf_counter()
+        return stats
+
+    def _flush(self, batch, stats):
+        with transaction.atomic():
+            existing = {
+                values['name']: values
+                for values in Ingredient.objects.filter(name__in=list(batch)).values('id', 'name', *IMPORT_FIELDS)
+            }
+
+            to_create = []
+            to_update = []
+            for name, clean in batch.items():
+                current = existing.get(name)
+                if current is None:
+                    to_create.append(Ingredient(**clean))
+                elif not self.update_existing or self._same(current, clean):
+                    stats.unchanged += 1
+                else:
+                    to_update.append(Ingredient(id=current['id'], **clean))
+
+            if not self.dry_run:
+                if to_create:
+                    Ingredient.objects.bulk_create(to_create, batch_size=self.batch_size)
+                if to_update:
+                    Ingredient.objects.bulk_update(to_update, IMPORT_FIELDS, batch_size=self.batch_size)
+                if to_create or to_update:
+                    # Bulk writes bypass model signals, so invalidate explicitly.
+                    transaction.on_commit(invalidate_catalog)
+
+        stats.created += len(to_create)
+        stats.updated += len(to_update)
+        self.created_names.extend(ingredient.name for ingredient in to_create)
+        if self.on_batch:
+            self.on_batch(stats)
+
+    @staticmethod
+    def _same(current, clean):
+        for field in IMPORT_FIELDS:
+            value = current[field]
+            if field in NUTRIENT_LIMITS:
+                value = Decimal(value).quantize(TWO_PLACES)
+            if value != clean[field]:
+                return False
+        return True
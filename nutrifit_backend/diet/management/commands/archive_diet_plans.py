@@ -0,0 +1,73 @@
+"""
+Management command to archive old diet plans.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from diet.archive import archive_plans, retention_cutoff
+
+
+def database_pages():
+    """``(file bytes, free bytes)`` of the SQLite database, or ``None`` on other backends."""
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        sizes = []
+        for pragma in ('page_size', 'page_count', 'freelist_count'):
+            cursor.execute(f'PRAGMA {pragma}')
+            sizes.append(cursor.fetchone()[0])
+    page_size, page_count, free_pages = sizes
+    return page_count * page_size, free_pages * page_size
+
+
+class Command(BaseCommand):
+    help = 'Move non-favorite diet plans older than the retention window into the compressed archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.DIET_PLAN_RETENTION_DAYS,
+            help=f'Retention window in days (default: {settings.DIET_PLAN_RETENTION_DAYS})'
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Plans per transaction (default: 500)')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be archived without changing anything')
+        parser.add_argument('--vacuum', action='store_true', help='Run VACUUM afterwards to return freed pages to the OS (SQLite)')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        cutoff = retention_cutoff(options['days'])
+        self.stdout.write(f'Archiving plans created before {cutoff:%Y-%m-%d %H:%M} UTC...')
+
+        def report(stats):
+            if verbosity >= 2:
+                self.stdout.write(f'  batch {stats.batches}: {stats.plans} plans so far')
+
+        before = None if options['dry_run'] else database_pages()
+        stats = archive_plans(
+            cutoff,
+            batch_size=max(1, options['batch_size']),
+            dry_run=options['dry_run'],
+            pause=options['pause'],
+            on_batch=report,
+        )
+
+        if options['vacuum'] and not options['dry_run'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        ratio = stats.stored_bytes / stats.raw_bytes if stats.raw_bytes else 0
+        message = (
+            f'{prefix}Archived {stats.plans} plans ({stats.items} items) in {stats.batches} batches '
+            f'and {stats.elapsed:.2f}s.\n'
+            f'{prefix}Plan data: {stats.raw_bytes / 1024:.1f} KiB as JSON, {stats.stored_bytes / 1024:.1f} KiB '
+            f'compressed ({ratio:.0%}, {stats.compression_savings / 1024:.1f} KiB smaller).'
+        )
+        if before is not None:
+            after = database_pages()
+            message += (
+                f'\nDatabase file: {before[0] / 1024:.1f} KiB ({before[1] / 1024:.1f} KiB free) before, '
+                f'{after[0] / 1024:.1f} KiB ({after[1] / 1024:.1f} KiB free) after.'
+            )
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,44 @@
+"""
+Management command comparing JSON renderers and response encodings.
+"""
+
+import gzip
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from diet.management.serializers import DietPlanSerializer
+from diet.models import DietPlan
+from nutrifit.middleware import brotli
+from nutrifit.renderers import FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = 'Benchmark render time and bytes-on-wire for DietPlanSerializer payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plans', type=int, default=20, help='Number of most recent plans per payload (default: 20)')
+        parser.add_argument('--repeat', type=int, default=50, help='Renders per renderer (default: 50)')
+
+    def handle(self, *args, **options):
+        plans = DietPlan.objects.prefetch_related('items__ingredient').order_by('-created_at')[:options['plans']]
+        data = DietPlanSerializer(plans, many=True).data
+        if not data:
+            raise CommandError('No diet plans to render. Generate or import some plans first.')
+        if orjson is None:
+            self.stderr.write(self.style.WARNING('orjson is not installed; FastJSONRenderer falls back to the standard renderer.'))
+
+        item_count = sum(len(plan['items']) for plan in data)
+        self.stdout.write(f'Payload: {len(data)} plans, {item_count} items, {options["repeat"]} renders each')
+        self.stdout.write(f'{"renderer":<18}{"ms/render":>10}{"raw B":>10}{"gzip B":>10}{"br B":>10}')
+
+        for label, renderer in (('JSONRenderer', JSONRenderer()), ('FastJSONRenderer', FastJSONRenderer())):
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                body = renderer.render(data)
+            elapsed_ms = (time.perf_counter() - start) * 1000 / options['repeat']
+
+            gzip_size = len(gzip.compress(body, compresslevel=settings.GZIP_LEVEL))
+            br_size = len(brotli.compress(body, quality=settings.BROTLI_QUALITY)) if brotli is not None else '-'
+            self.stdout.write(f'{label:<18}{elapsed_ms:>10.2f}{len(body):>10}{gzip_size:>10}{br_size:>10}')
@@ -0,0 +1,151 @@
+"""
+Management command comparing concurrent SQLite throughput per profile.
+
+Each profile gets a fresh database file registered as a temporary alias,
+so the configured database is never touched.
+"""
+
+import os
+import random
+import tempfile
+import threading
+import time
+from copy import deepcopy
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from diet.models import DietPlan, DietPlanItem, Ingredient
+from nutrifit.db import serialized_write
+
+
+PROFILES = {
+    'default': None,
+    'production': False,
+    'production+queue': True,
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent read/write throughput of the stock and production SQLite profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Reader threads (default: 8)')
+        parser.add_argument('--writers', type=int, default=4, help='Writer threads (default: 4)')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration per profile (default: 5)')
+        parser.add_argument('--items', type=int, default=12, help='Items per written plan (default: 12)')
+        parser.add_argument('--profile', action='append', choices=list(PROFILES), help='Profile to run (repeatable; default: all)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{options["readers"]} readers, {options["writers"]} writers, '
+            f'{options["seconds"]:g}s per profile, {options["items"]} items per plan'
+        )
+        self.stdout.write(f'{"profile":<18}{"writes/s":>10}{"reads/s":>10}{"errors":>8}{"p95 write ms":>14}')
+        for name in options['profile'] or PROFILES:
+            with tempfile.TemporaryDirectory() as directory:
+                result = self._run_profile(name, os.path.join(directory, 'bench.sqlite3'), options)
+            self.stdout.write(
+                f'{name:<18}{result["writes"] / options["seconds"]:>10.1f}'
+                f'{result["reads"] / options["seconds"]:>10.1f}{result["errors"]:>8}'
+                f'{result["p95_write_ms"]:>14.1f}'
+            )
+
+    def _database(self, name, path):
+        if PROFILES[name] is None:
+            config = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}
+        else:
+            config = deepcopy(settings.SQLITE_PRODUCTION_DATABASE)
+            config['NAME'] = path
+        return connections.configure_settings({'default': config})['default']
+
+    def _run_profile(self, name, path, options):
+        alias = f'benchmark_{name}'
+        connections.settings[alias] = self._database(name, path)
+        previous = settings.SQLITE_SERIALIZE_WRITES
+        settings.SQLITE_SERIALIZE_WRITES = bool(PROFILES[name])
+        try:
+            call_command('migrate', database=alias, verbosity=0)
+            user_id, ingredient_ids = self._seed(alias)
+            connections[alias].close()
+            return self._hammer(alias, user_id, ingredient_ids, options)
+        finally:
+            settings.SQLITE_SERIALIZE_WRITES = previous
+            connections[alias].close()
+            del connections.settings[alias]
+
+    def _seed(self, alias):
+        user = get_user_model().objects.db_manager(alias).create_user(
+            email='benchmark@example.com', password=None,
+        )
+        Ingredient.objects.using(alias).bulk_create([
+            Ingredient(
+                name=f'Ingredient {index}', category='other', calories_per_100g=100 + index,
+                protein_per_100g=10, carbs_per_100g=10, fat_per_100g=5,
+            )
+            for index in range(200)
+        ])
+        return user.pk, list(Ingredient.objects.using(alias).values_list('id', flat=True))
+
+    def _hammer(self, alias, user_id, ingredient_ids, options):
+        deadline = time.perf_counter() + options['seconds']
+        lock = threading.Lock()
+        result = {'writes': 0, 'reads': 0, 'errors': 0, 'write_ms': []}
+
+        def record(key, elapsed=None):
+            with lock:
+                result[key] += 1
+                if elapsed is not None:
+                    result['write_ms'].append(elapsed * 1000)
+
+        def write():
+            # Read-then-write inside one transaction, like _create_diet_plan.
+            chosen = random.sample(ingredient_ids, options['items'])
+            with serialized_write(using=alias):
+                ingredients = Ingredient.objects.using(alias).in_bulk(chosen)
+                plan = DietPlan.objects.using(alias).create(
+                    user_id=user_id, plan_name='Benchmark plan', ai_description='',
+                    total_calories=2000, total_protein=150, total_carbs=200, total_fat=60,
+                )
+                DietPlanItem.objects.using(alias).bulk_create([
+                    DietPlanItem(
+                        diet_plan=plan, ingredient=ingredients[ingredient_id], quantity_grams=Decimal('100'),
+                        meal_type='lunch', ai_description='', order_index=index,
+                    )
+                    for index, ingredient_id in enumerate(chosen)
+                ])
+
+        def read():
+            plans = DietPlan.objects.using(alias).filter(user_id=user_id).prefetch_related('items__ingredient')
+            list(plans.order_by('-created_at')[:10])
+
+        def worker(operation, key):
+            connection = connections[alias]
+            try:
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        operation()
+                    except OperationalError:
+                        record('errors')
+                    else:
+                        record(key, time.perf_counter() - start if key == 'writes' else None)
+                    # What the request cycle does between requests: without
+                    # CONN_MAX_AGE every request opens a new connection.
+                    connection.close_if_unusable_or_obsolete()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(write, 'writes')) for _ in range(options['writers'])]
+        threads += [threading.Thread(target=worker, args=(read, 'reads')) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        write_ms = sorted(result.pop('write_ms'))
+        result['p95_write_ms'] = write_ms[int(len(write_ms) * 0.95)] if write_ms else 0.0
+        return result
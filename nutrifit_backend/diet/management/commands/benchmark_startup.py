@@ -0,0 +1,205 @@
+"""
+Management command measuring process cold start.
+
+Every sample is a fresh interpreter started from this one:
+
+- ``python``: the bare interpreter, the floor for everything else,
+- ``wsgi``: ``import nutrifit.wsgi`` plus loading the URLconf, i.e. what a
+  worker does before its first request,
+- ``check``: ``manage.py check``, the cost every management command pays.
+
+Wall and CPU time come from the child's rusage, peak RSS from the child
+itself. The ``wsgi`` child
+also reports the time spent importing, the number of loaded modules and
+whether any part of the AI stack was imported, which should only happen
+when an AI endpoint is hit. ``--imports`` lists the packages whose modules
+take longest to import in a worker (from ``python -X importtime``).
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Modules that must not be loaded until an AI endpoint is hit.
+AI_MODULES = ('google.generativeai', 'google.ai.generativelanguage', 'google.protobuf', 'grpc')
+
+# Prepended to every child: prints the peak RSS as JSON on exit. Measured
+# in the child because a forked child's rusage counts the parent's memory.
+PROBE = '''
+import atexit, json, resource, sys
+def _report_memory():
+    peak = None
+    try:
+        with open('/proc/self/status') as status:
+            peak = next(int(line.split()[1]) * 1024 for line in status if line.startswith('VmHWM:'))
+    except (OSError, StopIteration):
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    sys.stdout.flush()
+    print(json.dumps({'rss_mb': peak / 2 ** 20}))
+atexit.register(_report_memory)
+'''
+
+WSGI_SCRIPT = PROBE + '''
+import time
+started = time.perf_counter()
+import nutrifit.wsgi
+imported = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+loaded = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'urls_ms': (loaded - imported) * 1000,
+    'modules': len(sys.modules),
+    'ai_modules': sorted(name for name in %r if name in sys.modules),
+}))
+''' % (AI_MODULES,)
+
+CHECK_SCRIPT = PROBE + '''
+import runpy
+sys.argv = [%r, 'check']
+runpy.run_path(sys.argv[0], run_name='__main__')
+'''
+
+
+class Command(BaseCommand):
+    help = 'Benchmark cold-start time and memory of the interpreter, a WSGI worker and manage.py check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Fresh processes per target (default: 5)')
+        parser.add_argument('--imports', type=int, default=10, help='Heaviest top-level imports to list (default: 10, 0 to skip)')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--json', action='store_true', help='Print the JSON report instead of a table')
+        parser.add_argument('--baseline', help='Compare against an earlier JSON report')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        manage_py = os.path.join(settings.BASE_DIR, 'manage.py')
+        targets = {
+            'python': [sys.executable, '-c', PROBE],
+            'wsgi': [sys.executable, '-c', WSGI_SCRIPT],
+            'check': [sys.executable, '-c', CHECK_SCRIPT % manage_py],
+        }
+
+        report = {}
+        for name, command in targets.items():
+            samples = [self._sample(command) for _ in range(options['repeat'])]
+            report[name] = self._summarize(samples)
+        if options['imports']:
+            report['top_imports'] = self._top_imports(options['imports'])
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print_report(report)
+        if options['baseline']:
+            self._print_comparison(report, options['baseline'])
+
+    def _env(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'nutrifit.settings'))
+        env.pop('PYTHONPROFILEIMPORTTIME', None)
+        return env
+
+    def _sample(self, command):
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            command, cwd=settings.BASE_DIR, env=self._env(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        )
+        output = process.stdout.read()
+        # wait4 gives this child's own rusage, unlike RUSAGE_CHILDREN.
+        _, exit_status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(exit_status)
+        wall = time.perf_counter() - started
+        output = output.decode(errors='replace')
+        if process.returncode != 0:
+            raise CommandError(f'Startup benchmark child failed:\n{output}')
+
+        sample = {'wall_ms': wall * 1000, 'cpu_ms': (usage.ru_utime + usage.ru_stime) * 1000}
+        for line in output.splitlines():
+            if line.startswith('{'):
+                sample.update(json.loads(line))
+        return sample
+
+    @staticmethod
+    def _summarize(samples):
+        summary = {}
+        for key, value in samples[0].items():
+            if isinstance(value, (int, float)):
+                values = [sample[key] for sample in samples]
+                summary[key] = round(statistics.median(values), 2)
+                if key == 'wall_ms':
+                    summary['wall_ms_min'] = round(min(values), 2)
+                    summary['wall_ms_max'] = round(max(values), 2)
+            else:
+                summary[key] = value
+        return summary
+
+    def _top_imports(self, count):
+        """Import time of a WSGI worker per top-level package, excluding nested imports of other packages."""
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', WSGI_SCRIPT], cwd=settings.BASE_DIR, env=self._env(),
+            capture_output=True, text=True,
+        )
+        if process.returncode != 0:
+            raise CommandError(f'-X importtime run failed:\n{process.stderr}')
+        totals = {}
+        for line in process.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package"
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            own, _, module = line[len('import time:'):].split('|')
+            package = module.strip().split('.')[0]
+            totals[package] = totals.get(package, 0) + int(own) / 1000
+        ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:count]
+        return [[package, round(ms, 2)] for package, ms in ranked]
+
+    def _print_report(self, report):
+        self.stdout.write(f'{"target":<8}{"wall ms":>10}{"min":>9}{"max":>9}{"cpu ms":>9}{"rss MB":>9}')
+        for name in ('python', 'wsgi', 'check'):
+            stats = report[name]
+            self.stdout.write(
+                f'{name:<8}{stats["wall_ms"]:>10.1f}{stats["wall_ms_min"]:>9.1f}{stats["wall_ms_max"]:>9.1f}'
+                f'{stats["cpu_ms"]:>9.1f}{stats["rss_mb"]:>9.1f}'
+            )
+        wsgi = report['wsgi']
+        self.stdout.write(
+            f'\nnutrifit.wsgi: import {wsgi["import_ms"]:.1f} ms, URLconf {wsgi["urls_ms"]:.1f} ms, '
+            f'{wsgi["modules"]} modules'
+        )
+        if wsgi['ai_modules']:
+            self.stdout.write(self.style.WARNING(f'AI stack loaded at startup: {", ".join(wsgi["ai_modules"])}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('AI stack not loaded at startup'))
+        if report.get('top_imports'):
+            self.stdout.write('\nHeaviest imports (ms, per package):')
+            for package, ms in report['top_imports']:
+                self.stdout.write(f'  {package:<32}{ms:>9.1f}')
+
+    def _print_comparison(self, report, path):
+        try:
+            with open(path) as baseline_file:
+                baseline = json.load(baseline_file)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read baseline report {path}: {e}')
+        self.stdout.write(f'\nChange against {path}:')
+        for name in ('python', 'wsgi', 'check'):
+            if name not in baseline:
+                continue
+            changes = []
+            for key in ('wall_ms', 'cpu_ms', 'rss_mb'):
+                before, after = baseline[name][key], report[name][key]
+                percent = (after - before) / before * 100 if before else 0.0
+                changes.append(f'{key} {before:.1f} -> {after:.1f} ({percent:+.1f}%)')
+            self.stdout.write(f'  {name:<8}' + ', '.join(changes))
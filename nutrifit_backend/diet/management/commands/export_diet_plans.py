@@ -0,0 +1,43 @@
+"""
+Management command to export diet plans in bulk for analysis.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from diet.exports import CHUNK_SIZE, EXPORT_FORMATS, stream_export
+from diet.models import DietPlan
+
+
+class Command(BaseCommand):
+    help = 'Stream diet plans (with items) to CSV, JSON-lines or iCalendar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=tuple(EXPORT_FORMATS), default='csv', help='Export format (default: csv)')
+        parser.add_argument('--output', '-o', help='Output file (default: stdout)')
+        parser.add_argument('--user', help='Only export plans of the user with this email')
+        parser.add_argument('--since', help='Only plans created on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Only plans created on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help=f'Rows fetched per round-trip (default: {CHUNK_SIZE})')
+
+    def handle(self, *args, **options):
+        plans = DietPlan.objects.all()
+        if options['user']:
+            plans = plans.filter(user__email=options['user'])
+        for option, lookup in (('since', 'created_at__date__gte'), ('until', 'created_at__date__lte')):
+            if options[option]:
+                try:
+                    day = parse_date(options[option])
+                except ValueError:
+                    day = None
+                if day is None:
+                    raise CommandError(f'--{option} must be a date in YYYY-MM-DD format')
+                plans = plans.filter(**{lookup: day})
+
+        chunks = stream_export(plans, options['format'], chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+            self.stderr.write(self.style.SUCCESS(f"Exported diet plans to {options['output']}"))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,55 @@
+"""
+Management command to bulk import ingredients from CSV or JSON-lines files.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from diet.importers import IngredientImporter, RowError, detect_format, iter_rows, open_source
+
+
+class Command(BaseCommand):
+    help = 'Stream ingredients from a CSV or JSON-lines file and upsert them in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON-lines file (optionally .gz compressed)')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='Input format (default: from file extension)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per transaction (default: 500)')
+        parser.add_argument('--insert-only', action='store_true', help='Never modify ingredients that already exist')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and diff without writing')
+        parser.add_argument('--max-errors', type=int, default=None, help='Abort after this many invalid rows')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+
+        importer = IngredientImporter(
+            batch_size=options['batch_size'],
+            update_existing=not options['insert_only'],
+            dry_run=options['dry_run'],
+            max_errors=options['max_errors'],
+            on_batch=self._report_progress,
+        )
+
+        try:
+            with open_source(path) as stream:
+                stats = importer.run(iter_rows(stream, file_format))
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+        except RowError as e:
+            raise CommandError(str(e))
+
+        for line_number, message in stats.errors[:20]:
+            self.stderr.write(f'  line {line_number}: {message}')
+        if len(stats.errors) > 20:
+            self.stderr.write(f'  ... and {len(stats.errors) - 20} more invalid rows')
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Processed {stats.processed} rows in {stats.elapsed:.2f}s '
+            f'({stats.rows_per_second:.0f} rows/sec): {stats.created} created, '
+            f'{stats.updated} updated, {stats.unchanged} unchanged, {stats.skipped} skipped'
+        ))
+
+    def _report_progress(self, stats):
+        if self.verbosity >= 2:
+            self.stdout.write(f'  {stats.processed} rows ({stats.rows_per_second:.0f} rows/sec)')
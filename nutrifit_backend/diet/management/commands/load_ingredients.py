@@ -3,6 +3,7 @@ Management command to load initial ingredient data.
 """
 
 from django.core.management.base import BaseCommand
+from diet.importers import IngredientImporter
 from diet.models import Ingredient
 
 
@@ -54,15 +55,10 @@ class Command(BaseCommand):
             {'name': 'Cheese', 'category': 'dairy', 'calories_per_100g': 402, 'protein_per_100g': 25, 'carbs_per_100g': 1.3, 'fat_per_100g': 33, 'fiber_per_100g': 0, 'is_vegetarian': True, 'is_vegan': False, 'image_url': 'https://images.pexels.com/photos/821365/pexels-photo-821365.jpeg', 'common_allergens': ['dairy']},
         ]
         
-        created_count = 0
-        for ing_data in ingredients_data:
-            ingredient, created = Ingredient.objects.get_or_create(
-                name=ing_data['name'],
-                defaults=ing_data
-            )
-            if created:
-                created_count += 1
-                self.stdout.write(f'  Created: {ingredient.name}')
+        importer = IngredientImporter(update_existing=False)
+        stats = importer.run(enumerate(ingredients_data, start=1))
+        for name in importer.created_names:
+            self.stdout.write(f'  Created: {name}')
         
-        self.stdout.write(self.style.SUCCESS(f'\nSuccessfully loaded {created_count} new ingredients!'))
+        self.stdout.write(self.style.SUCCESS(f'\nSuccessfully loaded {stats.created} new ingredients!'))
         self.stdout.write(f'Total ingredients in database: {Ingredient.objects.count()}')
@@ -0,0 +1,437 @@
+"""
+Management command driving a weighted mix of API scenarios under load.
+
+By default requests go through Django's in-process test client against the
+configured database, with the offline LLM stand-in (``AI_BACKEND=fake``).
+``--base-url`` targets a running server instead; seed it with the same
+command's ``--seed-only`` first or register the users through the API.
+
+The report (``--output`` / ``--json``) lists requests, errors, error rate,
+RPS and p50/p95/p99 latency per endpoint; ``--baseline`` compares against
+an earlier report.
+"""
+
+import http.client
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from accounts.tokens import NutriFitRefreshToken
+from diet.models import DietPlan, DietPlanItem, Ingredient
+
+
+User = get_user_model()
+
+EMAIL_TEMPLATE = 'loadtest-{}@example.com'
+PASSWORD = 'Loadtest-pass-123'
+SEED_INGREDIENT_PREFIX = 'Loadtest ingredient'
+SEARCH_TERMS = ('chicken', 'rice', 'egg', 'oat', 'apple', 'milk', 'bean', 'a', 'loadtest')
+NL_INPUTS = (
+    'I am 32, 78kg, 178cm, exercise three times a week and want to lose weight',
+    'Vegetarian, 60kg, 165cm female, want to maintain my weight',
+)
+
+DEFAULT_MIX = {
+    'register': 2,
+    'login': 5,
+    'bootstrap': 25,
+    'ingredient_search': 25,
+    'plan_list': 20,
+    'plan_detail': 20,
+    'generate_nl': 3,
+}
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class InProcessTransport:
+    """Requests through ``django.test.Client``; one instance per thread."""
+
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, body=None, token=None):
+        extra = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        if body is None:
+            response = getattr(self.client, method.lower())(path, **extra)
+        else:
+            response = getattr(self.client, method.lower())(
+                path, data=json.dumps(body), content_type='application/json', **extra,
+            )
+        return response.status_code, response.content
+
+    def close(self):
+        connections.close_all()
+
+
+class HTTPTransport:
+    """Keep-alive HTTP(S) connection to ``base_url``; one instance per thread."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.connection = None
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Accept': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = self.connection_class(self.netloc, timeout=60)
+            try:
+                self.connection.request(method, self.prefix + path, body=payload, headers=headers)
+                response = self.connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # Server closed the kept-alive connection; retry once on a new one.
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+class VirtualUser:
+    def __init__(self, email):
+        self.email = email
+        self.access = None
+        self.plan_ids = []
+
+
+class Scenarios:
+    """The request steps; each returns the response status."""
+
+    def __init__(self, transport, rng):
+        self.transport = transport
+        self.rng = rng
+
+    def _json(self, content):
+        try:
+            return json.loads(content)
+        except ValueError:
+            return None
+
+    def prepare(self, name, user):
+        """Untimed setup a step depends on: a token, known plan ids."""
+        if name in ('register', 'login'):
+            return
+        if user.access is None:
+            self.login(user)
+        if name == 'plan_detail' and not user.plan_ids:
+            self.plan_list(user)
+
+    def register(self, user):
+        email = EMAIL_TEMPLATE.format(uuid.uuid4().hex[:12])
+        body = {'email': email, 'password': PASSWORD, 'password2': PASSWORD}
+        status, _ = self.transport.request('POST', '/api/auth/register/', body)
+        return status
+
+    def login(self, user):
+        body = {'email': user.email, 'password': PASSWORD}
+        status, content = self.transport.request('POST', '/api/auth/login/', body)
+        data = self._json(content) if status == 200 else None
+        if data:
+            user.access = data['tokens']['access']
+        return status
+
+    def bootstrap(self, user):
+        status, _ = self.transport.request('GET', '/api/profiles/me/bootstrap/', token=user.access)
+        return status
+
+    def ingredient_search(self, user):
+        query = urlencode({'search': self.rng.choice(SEARCH_TERMS)})
+        status, _ = self.transport.request('GET', f'/api/ingredients/?{query}', token=user.access)
+        return status
+
+    def plan_list(self, user):
+        status, content = self.transport.request('GET', '/api/diet-plans/', token=user.access)
+        data = self._json(content) if status == 200 else None
+        if data is not None:
+            results = data['results'] if isinstance(data, dict) else data
+            user.plan_ids = [plan['id'] for plan in results]
+        return status
+
+    def plan_detail(self, user):
+        if not user.plan_ids:
+            return None
+        plan_id = self.rng.choice(user.plan_ids)
+        status, _ = self.transport.request('GET', f'/api/diet-plans/{plan_id}/', token=user.access)
+        return status
+
+    def generate_nl(self, user):
+        body = {'input': self.rng.choice(NL_INPUTS)}
+        status, content = self.transport.request('POST', '/api/diet-plans/generate-from-nl/', body, token=user.access)
+        data = self._json(content) if status == 201 else None
+        if data:
+            user.plan_ids.append(data['id'])
+        return status
+
+
+class Command(BaseCommand):
+    help = 'Load-test the REST API with a weighted scenario mix and report latency percentiles per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', help='Target a running server (e.g. http://localhost:8000) instead of the in-process client')
+        parser.add_argument('--users', type=int, default=20, help='Virtual users to seed and rotate through (default: 20)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Worker threads (default: 8)')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run (default: 30)')
+        parser.add_argument('--requests', type=int, default=0, help='Stop after this many requests instead (default: use --duration)')
+        parser.add_argument('--mix', help='Scenario weights, e.g. "bootstrap=50,plan_list=50" (default: built-in mix)')
+        parser.add_argument('--plans-per-user', type=int, default=5, help='Diet plans seeded per user in-process (default: 5)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the scenario choice (default: 0)')
+        parser.add_argument('--seed-only', action='store_true', help='Seed users, ingredients and plans in the configured database and exit')
+        parser.add_argument('--cleanup', action='store_true', help='Delete load-test users and ingredients from the configured database and exit')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--json', action='store_true', help='Print the JSON report instead of a table')
+        parser.add_argument('--baseline', help='Compare against an earlier JSON report')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            return self._cleanup()
+        mix = self._parse_mix(options['mix'])
+
+        if options['base_url'] is None or options['seed_only']:
+            users = self._seed(options['users'], options['plans_per_user'])
+            if options['seed_only']:
+                self.stdout.write(f'Seeded {len(users)} users (password {PASSWORD!r}).')
+                return
+        else:
+            users = [VirtualUser(EMAIL_TEMPLATE.format(index)) for index in range(options['users'])]
+        if options['base_url'] is None:
+            # Skip the (deliberately slow) password check for the warm-up;
+            # the login scenario still measures it.
+            tokens = {
+                user.email: str(NutriFitRefreshToken.for_user(user).access_token)
+                for user in User.objects.filter(email__in=[user.email for user in users])
+            }
+            for user in users:
+                user.access = tokens.get(user.email)
+
+        if options['base_url'] is None:
+            if settings.AI_BACKEND != 'fake':
+                self.stderr.write('Using the offline LLM stand-in (AI_BACKEND=fake) for generate_nl.')
+                settings.AI_BACKEND = 'fake'
+            # The virtual users would soon run into their LLM budgets.
+            for name in ('LLM_USER_REQUEST_BUDGET', 'LLM_USER_TOKEN_BUDGET',
+                         'LLM_GLOBAL_REQUEST_BUDGET', 'LLM_GLOBAL_TOKEN_BUDGET'):
+                setattr(settings, name, 0)
+            if 'testserver' not in settings.ALLOWED_HOSTS and '*' not in settings.ALLOWED_HOSTS:
+                settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+            make_transport = InProcessTransport
+        else:
+            make_transport = lambda: HTTPTransport(options['base_url'])  # noqa: E731
+
+        report = self._run(users, mix, make_transport, options)
+        report['target'] = options['base_url'] or 'in-process'
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print_report(report)
+        if options['baseline']:
+            self._print_comparison(report, options['baseline'])
+
+    def _parse_mix(self, value):
+        if not value:
+            return dict(DEFAULT_MIX)
+        mix = {}
+        for part in value.split(','):
+            name, _, weight = part.partition('=')
+            name = name.strip()
+            if name not in DEFAULT_MIX:
+                raise CommandError(f'Unknown scenario {name!r}; choose from {", ".join(DEFAULT_MIX)}.')
+            try:
+                mix[name] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f'Invalid weight for {name!r}: {weight!r}')
+        return mix
+
+    def _seed(self, count, plans_per_user):
+        """Create missing load-test users (one password hash) and their plans."""
+        emails = [EMAIL_TEMPLATE.format(index) for index in range(count)]
+        existing = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([User(email=email, password=password) for email in emails if email not in existing])
+
+        if Ingredient.objects.count() < 20:
+            Ingredient.objects.bulk_create([
+                Ingredient(
+                    name=f'{SEED_INGREDIENT_PREFIX} {index}', category=Ingredient.CATEGORY_CHOICES[index % 9][0],
+                    calories_per_100g=50 + index * 7 % 400, protein_per_100g=index % 30,
+                    carbs_per_100g=index * 3 % 70, fat_per_100g=index % 20,
+                )
+                for index in range(100)
+            ], ignore_conflicts=True)
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True)[:200])
+
+        users = User.objects.filter(email__in=emails)
+        missing_plans = [user for user in users if not user.diet_plans.exists()]
+        rng = random.Random(0)
+        for user in missing_plans:
+            plans = DietPlan.objects.bulk_create([
+                DietPlan(
+                    user=user, plan_name=f'Load test plan {index}', ai_description='Seeded by loadtest.',
+                    total_calories=2000, total_protein=150, total_carbs=200, total_fat=60,
+                )
+                for index in range(plans_per_user)
+            ])
+            DietPlanItem.objects.bulk_create([
+                DietPlanItem(
+                    diet_plan=plan, ingredient_id=ingredient_id, quantity_grams=Decimal('100'),
+                    meal_type=DietPlanItem.MEAL_TYPE_CHOICES[position % 4][0],
+                    ai_description='Seeded by loadtest.', order_index=position,
+                )
+                for plan in plans
+                for position, ingredient_id in enumerate(rng.sample(ingredient_ids, min(8, len(ingredient_ids))))
+            ])
+        return [VirtualUser(email) for email in emails]
+
+    def _cleanup(self):
+        users, _ = User.objects.filter(email__startswith='loadtest-', email__endswith='@example.com').delete()
+        ingredients, _ = Ingredient.objects.filter(
+            name__startswith=SEED_INGREDIENT_PREFIX, diet_plan_items__isnull=True, food_log_entries__isnull=True,
+        ).delete()
+        self.stdout.write(f'Deleted {users} rows for load-test users and {ingredients} seeded ingredients.')
+
+    def _run(self, users, mix, make_transport, options):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        samples = defaultdict(list)
+        statuses = defaultdict(lambda: defaultdict(int))
+        lock = threading.Lock()
+        counter = iter(range(options['requests'] or 10 ** 12))
+        deadline = None if options['requests'] else time.perf_counter() + options['duration']
+
+        def worker(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            transport = make_transport()
+            scenarios = Scenarios(transport, rng)
+            local_samples = defaultdict(list)
+            local_statuses = defaultdict(lambda: defaultdict(int))
+            try:
+                while deadline is None or time.perf_counter() < deadline:
+                    with lock:
+                        if next(counter, None) is None:
+                            break
+                    user = users[rng.randrange(len(users))]
+                    name = rng.choices(names, weights)[0]
+                    scenarios.prepare(name, user)
+                    start = time.perf_counter()
+                    try:
+                        status = getattr(scenarios, name)(user)
+                    except Exception as e:
+                        status = f'error: {type(e).__name__}'
+                    if status is None:
+                        continue
+                    local_samples[name].append(((time.perf_counter() - start) * 1000, status))
+                    local_statuses[name][str(status)] += 1
+            finally:
+                transport.close()
+                with lock:
+                    for name, values in local_samples.items():
+                        samples[name].extend(values)
+                    for name, counts in local_statuses.items():
+                        for key, value in counts.items():
+                            statuses[name][key] += value
+
+        started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        endpoints = {name: self._summarize(samples[name], statuses[name], elapsed) for name in names if samples[name]}
+        everything = [sample for name in names for sample in samples[name]]
+        totals = self._summarize(everything, {}, elapsed)
+        totals.pop('status_codes')
+        return {
+            'started_at': started_at.isoformat(),
+            'duration_s': round(elapsed, 3),
+            'concurrency': options['concurrency'],
+            'users': len(users),
+            'mix': mix,
+            'totals': totals,
+            'endpoints': endpoints,
+        }
+
+    @staticmethod
+    def _summarize(values, status_counts, elapsed):
+        latencies = sorted(latency for latency, _ in values)
+        errors = sum(1 for _, status in values if not isinstance(status, int) or status >= 400)
+        return {
+            'requests': len(values),
+            'errors': errors,
+            'error_rate': round(errors / len(values), 4) if values else 0.0,
+            'rps': round(len(values) / elapsed, 2) if elapsed else 0.0,
+            'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            'p50_ms': round(_percentile(latencies, 50), 2),
+            'p95_ms': round(_percentile(latencies, 95), 2),
+            'p99_ms': round(_percentile(latencies, 99), 2),
+            'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+            'status_codes': dict(status_counts),
+        }
+
+    def _print_report(self, report):
+        self.stdout.write(
+            f'{report["target"]}: {report["concurrency"]} workers, {report["users"]} users, {report["duration_s"]:.1f}s'
+        )
+        self.stdout.write(f'{"endpoint":<20}{"reqs":>7}{"err%":>7}{"rps":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}')
+        rows = list(report['endpoints'].items()) + [('TOTAL', report['totals'])]
+        for name, row in rows:
+            self.stdout.write(
+                f'{name:<20}{row["requests"]:>7}{row["error_rate"] * 100:>7.1f}{row["rps"]:>8.1f}'
+                f'{row["p50_ms"]:>9.1f}{row["p95_ms"]:>9.1f}{row["p99_ms"]:>9.1f}'
+            )
+
+    def _print_comparison(self, report, path):
+        try:
+            with open(path) as baseline_file:
+                baseline = json.load(baseline_file)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read baseline report {path}: {e}')
+        self.stdout.write(f'Against {path}:')
+        self.stdout.write(f'{"endpoint":<20}{"rps":>10}{"p95 ms":>10}{"err%":>10}')
+        current = {**report['endpoints'], 'TOTAL': report['totals']}
+        previous = {**baseline.get('endpoints', {}), 'TOTAL': baseline.get('totals', {})}
+        for name, row in current.items():
+            before = previous.get(name)
+            if not before:
+                continue
+            self.stdout.write(
+                f'{name:<20}{row["rps"] - before["rps"]:>+10.1f}{row["p95_ms"] - before["p95_ms"]:>+10.1f}'
+                f'{(row["error_rate"] - before["error_rate"]) * 100:>+10.1f}'
+            )
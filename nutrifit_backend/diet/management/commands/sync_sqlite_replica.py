@@ -0,0 +1,55 @@
+"""
+Management command copying the primary SQLite database to its local replica.
+
+Stand-in for real replication when ``SQLITE_REPLICA_PATH`` is set: each
+sync is an online backup, so the primary stays writable and readers of the
+replica see either the old or the new snapshot. Running it on an interval
+gives the replica a realistic lag.
+"""
+
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database to the SQLITE_REPLICA_PATH stand-in replica'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Keep syncing every N seconds (default: sync once)')
+
+    def handle(self, *args, **options):
+        databases = settings.DATABASES
+        if 'replica' not in databases or databases['default']['ENGINE'] not in (
+            'django.db.backends.sqlite3', 'nutrifit.db_backends.sqlite3',
+        ):
+            raise CommandError('Set SQLITE_REPLICA_PATH with a SQLite default database to use a local replica.')
+
+        sticky = settings.REPLICA_STICKY_SECONDS
+        if options['interval'] > sticky:
+            self.stderr.write(self.style.WARNING(
+                f'--interval {options["interval"]:g}s exceeds REPLICA_STICKY_SECONDS ({sticky}s): users may not '
+                f'see their own writes for up to {options["interval"]:g}s. Raise REPLICA_STICKY_SECONDS.'
+            ))
+
+        primary, replica = str(databases['default']['NAME']), str(databases['replica']['NAME'])
+        while True:
+            start = time.perf_counter()
+            self._sync(primary, replica)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.stdout.write(f'Synced {primary} -> {replica} in {elapsed_ms:.1f} ms')
+            if options['interval'] <= 0:
+                return
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def _sync(primary, replica):
+        source = sqlite3.connect(primary)
+        target = sqlite3.connect(replica)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
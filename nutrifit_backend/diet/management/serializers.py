@@ -1,8 +1,12 @@
+from decimal import Decimal
+
 from rest_framework import serializers
-from ..models import Ingredient, DietPlan, DietPlanItem
+from nutrifit.serializers import SparseFieldsetMixin
+from ..archive import load_payload
+from ..models import Ingredient, DietPlan, DietPlanItem, ArchivedDietPlan, FoodLogEntry
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Ingredient model."""
     
     class Meta:
@@ -12,7 +16,7 @@ class IngredientSerializer(serializers.ModelSerializer):
                   'is_vegetarian', 'is_vegan', 'common_allergens')
 
 
-class DietPlanItemSerializer(serializers.ModelSerializer):
+class DietPlanItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for DietPlanItem model."""
     
     ingredient = IngredientSerializer(read_only=True)
@@ -25,9 +29,13 @@ class DietPlanItemSerializer(serializers.ModelSerializer):
         model = DietPlanItem
         fields = ('id', 'ingredient', 'quantity_grams', 'meal_type', 'ai_description',
                   'preparation_notes', 'order_index', 'calories', 'protein', 'carbs', 'fat')
+        sparse_dependencies = {
+            name: ('quantity_grams', f'ingredient__{name}_per_100g')
+            for name in ('calories', 'protein', 'carbs', 'fat')
+        }
 
 
-class DietPlanSerializer(serializers.ModelSerializer):
+class DietPlanSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for DietPlan model."""
     
     items = DietPlanItemSerializer(many=True, read_only=True)
@@ -39,7 +47,7 @@ class DietPlanSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'user', 'created_at')
 
 
-class DietPlanListSerializer(serializers.ModelSerializer):
+class DietPlanListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Lightweight serializer for listing diet plans."""
     
     class Meta:
@@ -47,3 +55,43 @@ class DietPlanListSerializer(serializers.ModelSerializer):
         fields = ('id', 'plan_name', 'ai_description', 'total_calories', 'total_protein',
                   'total_carbs', 'total_fat', 'is_favorite', 'created_at')
         read_only_fields = ('id', 'created_at')
+
+
+class ArchivedDietPlanSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Serializer for listing archived diet plans."""
+    
+    class Meta:
+        model = ArchivedDietPlan
+        fields = ('id', 'original_id', 'plan_name', 'created_at', 'archived_at')
+        read_only_fields = fields
+
+
+class ArchivedDietPlanDetailSerializer(ArchivedDietPlanSerializer):
+    """Archived diet plan with its decompressed snapshot."""
+    
+    plan = serializers.SerializerMethodField()
+    
+    class Meta(ArchivedDietPlanSerializer.Meta):
+        fields = ArchivedDietPlanSerializer.Meta.fields + ('plan',)
+        read_only_fields = fields
+    
+    def get_plan(self, obj):
+        return load_payload(obj)
+
+
+class FoodLogEntrySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Serializer for FoodLogEntry model."""
+    
+    # A plain id (resolved in bulk by diet.food_log) instead of one lookup per entry.
+    ingredient = serializers.IntegerField(source='ingredient_id')
+    ingredient_name = serializers.CharField(source='ingredient.name', read_only=True)
+    consumed_at = serializers.DateTimeField(required=False)
+    
+    class Meta:
+        model = FoodLogEntry
+        fields = ('id', 'ingredient', 'ingredient_name', 'quantity_grams', 'meal_type', 'consumed_at',
+                  'client_id', 'calories', 'protein', 'carbs', 'fat')
+        read_only_fields = ('id', 'calories', 'protein', 'carbs', 'fat')
+        # client_id uniqueness is per user and handled as an idempotent skip.
+        validators = []
+        extra_kwargs = {'quantity_grams': {'min_value': Decimal('0.01')}}
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('diet', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDietPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('plan_name', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField(help_text='When the original plan was created')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('payload', models.BinaryField(help_text='zlib-compressed JSON of the plan and its items')),
+                ('raw_size', models.PositiveIntegerField(help_text='Size of the JSON payload before compression')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_diet_plans', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'archived_diet_plans',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='archived_plans_user_created')],
+            },
+        ),
+    ]
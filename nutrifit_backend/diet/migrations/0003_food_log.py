@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('diet', '0002_archived_diet_plan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyNutritionTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('calories', models.FloatField(default=0)),
+                ('protein', models.FloatField(default=0)),
+                ('carbs', models.FloatField(default=0)),
+                ('fat', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_nutrition_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'daily_nutrition_totals',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FoodLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_grams', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('meal_type', models.CharField(blank=True, choices=[('breakfast', 'Breakfast'), ('lunch', 'Lunch'), ('dinner', 'Dinner'), ('snack', 'Snack')], max_length=10)),
+                ('consumed_at', models.DateTimeField()),
+                ('client_id', models.CharField(blank=True, help_text='Client-generated id, so offline clients can safely resubmit', max_length=64, null=True)),
+                ('calories', models.FloatField()),
+                ('protein', models.FloatField()),
+                ('carbs', models.FloatField()),
+                ('fat', models.FloatField()),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='food_log_entries', to='diet.ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='food_log_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'food_log_entries',
+                'ordering': ['-consumed_at'],
+                'indexes': [models.Index(fields=['user', 'consumed_at'], name='food_log_user_consumed')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='foodlogentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_id__isnull', False)), fields=('user', 'client_id'), name='food_log_user_client_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailynutritiontotal',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='daily_totals_user_date'),
+        ),
+    ]
@@ -126,3 +126,97 @@ class DietPlanItem(models.Model):
         """Calculate fat for this item."""
         multiplier = float(self.quantity_grams) / 100
         return float(self.ingredient.fat_per_100g) * multiplier
+
+
+class ArchivedDietPlan(models.Model):
+    """Compressed snapshot of an old diet plan moved out of the live tables."""
+    
+    original_id = models.BigIntegerField(unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_diet_plans'
+    )
+    plan_name = models.CharField(max_length=200)
+    created_at = models.DateTimeField(help_text='When the original plan was created')
+    archived_at = models.DateTimeField(auto_now_add=True)
+    payload = models.BinaryField(help_text='zlib-compressed JSON of the plan and its items')
+    raw_size = models.PositiveIntegerField(help_text='Size of the JSON payload before compression')
+    
+    class Meta:
+        db_table = 'archived_diet_plans'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archived_plans_user_created'),
+        ]
+    
+    def __str__(self):
+        return f"{self.plan_name} (archived) - {self.user.email}"
+
+
+class FoodLogEntry(models.Model):
+    """Food actually eaten by a user, with nutrients captured at log time."""
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='food_log_entries'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.PROTECT,
+        related_name='food_log_entries'
+    )
+    quantity_grams = models.DecimalField(max_digits=6, decimal_places=2)
+    meal_type = models.CharField(max_length=10, choices=DietPlanItem.MEAL_TYPE_CHOICES, blank=True)
+    consumed_at = models.DateTimeField()
+    client_id = models.CharField(
+        max_length=64, null=True, blank=True,
+        help_text='Client-generated id, so offline clients can safely resubmit'
+    )
+    calories = models.FloatField()
+    protein = models.FloatField()
+    carbs = models.FloatField()
+    fat = models.FloatField()
+    
+    class Meta:
+        db_table = 'food_log_entries'
+        ordering = ['-consumed_at']
+        indexes = [
+            models.Index(fields=['user', 'consumed_at'], name='food_log_user_consumed'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'client_id'], condition=models.Q(client_id__isnull=False),
+                name='food_log_user_client_id'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity_grams}g {self.ingredient.name} - {self.user.email}"
+
+
+class DailyNutritionTotal(models.Model):
+    """Per-day sums of a user's food log, kept in step with every log write."""
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_nutrition_totals'
+    )
+    date = models.DateField()
+    entry_count = models.PositiveIntegerField(default=0)
+    calories = models.FloatField(default=0)
+    protein = models.FloatField(default=0)
+    carbs = models.FloatField(default=0)
+    fat = models.FloatField(default=0)
+    
+    class Meta:
+        db_table = 'daily_nutrition_totals'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='daily_totals_user_date'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date}: {self.calories:.0f} kcal - {self.user.email}"
@@ -0,0 +1,101 @@
+"""
+Consolidated shopping lists across diet plans.
+"""
+
+import math
+
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from nutrifit.cache import entry_timeout, versioned_key
+from .catalog import CATALOG_TOKEN_KEY
+from .models import DietPlanItem, Ingredient
+
+
+# Typical pack sizes (grams) used when rounding to purchasable units.
+PURCHASE_UNIT_GRAMS = {
+    'protein': 250,
+    'carbs': 500,
+    'vegetables': 250,
+    'fruits': 250,
+    'dairy': 500,
+    'fats': 250,
+    'grains': 500,
+    'nuts': 100,
+    'other': 100,
+}
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+CATEGORY_LABELS = dict(Ingredient.CATEGORY_CHOICES)
+
+
+def plan_token_key(plan_id):
+    """Invalidation token name for a single diet plan."""
+    return f'diet-plan:{plan_id}'
+
+
+def build_shopping_list(plans, round_units=False):
+    """
+    Total grams per ingredient across ``plans``, grouped by category.
+
+    ``plans`` is a ``DietPlan`` queryset; the items are summed with a single
+    grouped aggregate query.
+    """
+    rows = (
+        DietPlanItem.objects.filter(diet_plan__in=plans)
+        .values('ingredient_id', 'ingredient__name', 'ingredient__category')
+        .annotate(total_grams=Sum('quantity_grams'), plan_count=Count('diet_plan_id', distinct=True))
+        .order_by('ingredient__category', 'ingredient__name')
+    )
+
+    categories = {}
+    for row in rows:
+        category = row['ingredient__category']
+        total_grams = round(float(row['total_grams']), 2)
+        item = {
+            'ingredient_id': row['ingredient_id'],
+            'name': row['ingredient__name'],
+            'total_grams': total_grams,
+            'plan_count': row['plan_count'],
+        }
+        if round_units:
+            unit = PURCHASE_UNIT_GRAMS.get(category, PURCHASE_UNIT_GRAMS['other'])
+            units = max(1, math.ceil(total_grams / unit))
+            item['unit_grams'] = unit
+            item['units'] = units
+            item['purchase_grams'] = units * unit
+        if category not in categories:
+            categories[category] = {
+                'category': category,
+                'label': CATEGORY_LABELS.get(category, category),
+                'items': [],
+            }
+        categories[category]['items'].append(item)
+
+    return list(categories.values())
+
+
+def get_shopping_list(user, plans, round_units=False):
+    """
+    Cached shopping list for ``plans`` (a queryset already scoped to ``user``).
+
+    The entry is keyed on the exact plan set and invalidated as soon as any
+    member plan, its items or the ingredient catalog change.
+    """
+    plan_ids = sorted(plans.values_list('id', flat=True))
+    key = versioned_key(
+        f'shopping-list:{user.pk}',
+        [CATALOG_TOKEN_KEY] + [plan_token_key(plan_id) for plan_id in plan_ids],
+        ','.join(map(str, plan_ids)), round_units,
+    )
+    result = cache.get(key)
+    if result is None:
+        categories = build_shopping_list(plans, round_units) if plan_ids else []
+        result = {
+            'plan_ids': plan_ids,
+            'item_count': sum(len(category['items']) for category in categories),
+            'categories': categories,
+        }
+        cache.set(key, result, entry_timeout(CACHE_TIMEOUT))
+    return result
@@ -0,0 +1,35 @@
+"""
+Signal handlers keeping derived diet data in sync with the models.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from nutrifit.cache import touch, user_token_key
+from .catalog import invalidate_catalog
+from .models import Ingredient, DietPlan, DietPlanItem
+from .shopping import plan_token_key
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    """Rebuild the swap index and shopping lists lazily after any catalog change, once it is committed."""
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=DietPlan)
+@receiver(post_delete, sender=DietPlan)
+def diet_plan_changed(sender, instance, **kwargs):
+    """Invalidate cached data derived from this plan or the owner's plan list, once committed."""
+    keys = (plan_token_key(instance.pk), user_token_key(instance.user_id))
+    transaction.on_commit(lambda: touch(*keys))
+
+
+@receiver(post_save, sender=DietPlanItem)
+@receiver(post_delete, sender=DietPlanItem)
+def diet_plan_item_changed(sender, instance, **kwargs):
+    """Invalidate cached data derived from the item's plan, once committed."""
+    key = plan_token_key(instance.diet_plan_id)
+    transaction.on_commit(lambda: touch(key))
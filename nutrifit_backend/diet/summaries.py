@@ -0,0 +1,86 @@
+"""
+Database-side nutrition aggregates for diet plans.
+"""
+
+from django.db.models import F, FloatField, Sum
+from django.db.models.expressions import CombinedExpression
+
+
+MACROS = ('calories', 'protein', 'carbs', 'fat')
+
+
+def nutrition_sums(prefix=''):
+    """
+    ``Sum`` annotations of ``grams * nutrient_per_100g`` for plan items.
+
+    The sums are a hundredfold the real amounts; dividing by 100 is left to
+    the caller (see ``scale_sums``) so no database rounds or truncates the
+    intermediate values. ``prefix`` is the lookup path from the queried model
+    to ``DietPlanItem`` (e.g. ``'items__'`` when aggregating from ``DietPlan``).
+    """
+    grams = F(f'{prefix}quantity_grams')
+    return {
+        name: Sum(CombinedExpression(
+            grams, '*', F(f'{prefix}ingredient__{name}_per_100g'), output_field=FloatField()
+        ))
+        for name in MACROS
+    }
+
+
+def scale_sums(row):
+    """Convert ``nutrition_sums`` values in ``row`` to rounded real amounts."""
+    return {name: round(float(row.get(name) or 0) / 100, 2) for name in MACROS}
+
+
+def _round(values):
+    return {name: round(values.get(name) or 0.0, 2) for name in MACROS}
+
+
+def plan_summaries(plans):
+    """
+    Summarize plans grouped by meal type with a single aggregate query.
+
+    ``plans`` is a ``DietPlan`` queryset (already filtered to the user).
+    Returns one dict per plan, newest first, with per-meal totals, overall
+    totals, the plan targets and the deviation from those targets.
+    """
+    rows = (
+        plans.order_by()
+        .values(
+            'id', 'plan_name', 'created_at', 'total_calories',
+            'total_protein', 'total_carbs', 'total_fat', 'items__meal_type',
+        )
+        .annotate(**nutrition_sums('items__'))
+        .order_by('-created_at', 'id')
+    )
+
+    summaries = {}
+    for row in rows:
+        summary = summaries.get(row['id'])
+        if summary is None:
+            summary = summaries[row['id']] = {
+                'id': row['id'],
+                'plan_name': row['plan_name'],
+                'created_at': row['created_at'],
+                'targets': {
+                    'calories': float(row['total_calories']),
+                    'protein': float(row['total_protein']),
+                    'carbs': float(row['total_carbs']),
+                    'fat': float(row['total_fat']),
+                },
+                'meals': {},
+            }
+        meal_type = row['items__meal_type']
+        if meal_type is not None:
+            summary['meals'][meal_type] = scale_sums(row)
+
+    for summary in summaries.values():
+        totals = {
+            name: sum(meal[name] for meal in summary['meals'].values())
+            for name in MACROS
+        }
+        summary['totals'] = _round(totals)
+        summary['deviation'] = _round({
+            name: totals[name] - summary['targets'][name] for name in MACROS
+        })
+    return list(summaries.values())
@@ -0,0 +1,197 @@
+"""
+Nearest-neighbour ingredient swaps over normalized macro profiles.
+
+Each ingredient is described by the share of its energy coming from
+protein, carbs and fat, its fiber density and its calorie density. The
+features are standardized across the catalog and searched with a
+vectorized distance computation, so suggesting swaps needs no LLM call.
+"""
+
+import threading
+
+from .catalog import catalog_version
+from .models import Ingredient
+
+
+try:
+    import numpy as np  # optional dependency
+except Exception:
+    np = None
+
+
+# Feature weights: macro balance dominates, density only breaks ties.
+FEATURE_WEIGHTS = (1.0, 1.0, 1.0, 0.5, 0.35)
+# Extra distance for suggesting an ingredient from another category.
+CATEGORY_PENALTY = 0.5
+# Swaps needing more than this many grams to match calories are not useful.
+MAX_SWAP_GRAMS = 1000.0
+
+
+class SwapIndex:
+    """Standardized feature vectors plus filter masks for the whole catalog."""
+
+    def __init__(self, rows, version=None):
+        if np is None:
+            raise Exception('numpy is not installed. Run `pip install numpy` to use ingredient swaps.')
+        self.version = version
+        count = len(rows)
+        self.ids = np.empty(count, dtype=np.int64)
+        self.nutrients = np.zeros((count, 4), dtype=np.float64)  # kcal, protein, carbs, fat
+        fiber = np.zeros(count, dtype=np.float64)
+        self.names = []
+        self.categories = np.empty(count, dtype=object)
+        self.is_vegetarian = np.zeros(count, dtype=bool)
+        self.is_vegan = np.zeros(count, dtype=bool)
+        self.allergen_masks = {}
+
+        for index, row in enumerate(rows):
+            (ingredient_id, name, category, calories, protein, carbs, fat,
+             fiber_value, vegetarian, vegan, allergens) = row
+            self.ids[index] = ingredient_id
+            self.nutrients[index] = (calories, protein, carbs, fat)
+            fiber[index] = fiber_value
+            self.names.append(name)
+            self.categories[index] = category
+            self.is_vegetarian[index] = vegetarian
+            self.is_vegan[index] = vegan
+            for allergen in allergens or ():
+                allergen = str(allergen).strip().lower()
+                mask = self.allergen_masks.get(allergen)
+                if mask is None:
+                    mask = self.allergen_masks[allergen] = np.zeros(count, dtype=bool)
+                mask[index] = True
+
+        self.lower_names = np.array([name.lower() for name in self.names], dtype=str)
+        self.position = {ingredient_id: index for index, ingredient_id in enumerate(self.ids.tolist())}
+        self.vectors = self._features(self.nutrients, fiber)
+
+    @classmethod
+    def build(cls, version=None):
+        """Build the index with a single query over ``Ingredient``."""
+        rows = list(Ingredient.objects.order_by('id').values_list(
+            'id', 'name', 'category', 'calories_per_100g', 'protein_per_100g',
+            'carbs_per_100g', 'fat_per_100g', 'fiber_per_100g', 'is_vegetarian',
+            'is_vegan', 'common_allergens',
+        ))
+        return cls(rows, version=version)
+
+    @staticmethod
+    def _features(nutrients, fiber):
+        calories = nutrients[:, 0]
+        energy = np.column_stack((nutrients[:, 1] * 4, nutrients[:, 2] * 4, nutrients[:, 3] * 9))
+        total = energy.sum(axis=1)
+        safe_total = np.where(total > 0, total, 1.0)
+        shares = energy / safe_total[:, None]
+        fiber_density = np.where(calories > 0, fiber / np.where(calories > 0, calories, 1.0) * 100, 0.0)
+        features = np.column_stack((shares, fiber_density, np.log1p(calories)))
+
+        std = features.std(axis=0)
+        std[std == 0] = 1.0
+        features = (features - features.mean(axis=0)) / std
+        return features * np.asarray(FEATURE_WEIGHTS)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def candidate_mask(self, dietary_type='none', allergies=(), disliked_foods=()):
+        """Boolean mask of ingredients allowed for the given restrictions."""
+        mask = self.nutrients[:, 0] > 0
+        if dietary_type == 'vegetarian':
+            mask &= self.is_vegetarian
+        elif dietary_type == 'vegan':
+            mask &= self.is_vegan
+        for allergy in allergies or ():
+            allergen_mask = self.allergen_masks.get(str(allergy).strip().lower())
+            if allergen_mask is not None:
+                mask &= ~allergen_mask
+        for food in disliked_foods or ():
+            food = str(food).strip().lower()
+            if food:
+                mask &= np.char.find(self.lower_names, food) < 0
+        return mask
+
+    def suggest(self, ingredient_id, grams, limit=5, dietary_type='none',
+                allergies=(), disliked_foods=(), exclude_ids=()):
+        """
+        Closest substitutes for ``grams`` of ``ingredient_id``.
+
+        Each suggestion carries the quantity that keeps the item's calories
+        unchanged and the resulting macros.
+        """
+        source = self.position.get(ingredient_id)
+        if source is None:
+            raise KeyError(f'Unknown ingredient id: {ingredient_id}')
+
+        grams = float(grams)
+        target_calories = self.nutrients[source, 0] * grams / 100
+
+        mask = self.candidate_mask(dietary_type, allergies, disliked_foods)
+        mask[source] = False
+        for excluded in exclude_ids:
+            position = self.position.get(excluded)
+            if position is not None:
+                mask[position] = False
+
+        if target_calories > 0:
+            swap_grams = target_calories / np.where(mask, self.nutrients[:, 0], 1.0) * 100
+        else:
+            swap_grams = np.full(len(self.ids), grams)
+        mask &= swap_grams <= MAX_SWAP_GRAMS
+
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return []
+
+        deltas = self.vectors[candidates] - self.vectors[source]
+        distances = np.sqrt(np.einsum('ij,ij->i', deltas, deltas))
+        distances += np.where(self.categories[candidates] == self.categories[source], 0.0, CATEGORY_PENALTY)
+
+        limit = min(limit, candidates.size)
+        nearest = np.argpartition(distances, limit - 1)[:limit]
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+
+        suggestions = []
+        for offset in nearest:
+            index = candidates[offset]
+            quantity = round(float(swap_grams[index]), 1)
+            calories, protein, carbs, fat = (self.nutrients[index] * quantity / 100).tolist()
+            suggestions.append({
+                'ingredient_id': int(self.ids[index]),
+                'name': self.names[index],
+                'category': self.categories[index],
+                'quantity_grams': quantity,
+                'calories': round(calories, 2),
+                'protein': round(protein, 2),
+                'carbs': round(carbs, 2),
+                'fat': round(fat, 2),
+                'distance': round(float(distances[offset]), 4),
+            })
+        return suggestions
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def _is_current(index, version, ingredient_id):
+    return (
+        index is not None and index.version == version
+        and (ingredient_id is None or ingredient_id in index.position)
+    )
+
+
+def get_swap_index(ingredient_id=None):
+    """
+    Return the process-wide swap index, rebuilding it if the catalog changed.
+
+    Pass ``ingredient_id`` to also rebuild it when that ingredient is
+    missing, e.g. one committed before this process saw the new version.
+    """
+    global _index
+    version = catalog_version()
+    if _is_current(_index, version, ingredient_id):
+        return _index
+    with _lock:
+        if not _is_current(_index, version, ingredient_id):
+            _index = SwapIndex.build(version=version)
+        return _index
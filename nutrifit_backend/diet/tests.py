@@ -1,3 +1,820 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from ai_services.models import LLMUsage
+from diet import urls
+from diet.archive import archive_plans, load_payload, retention_cutoff
+from diet.catalog import catalog_version
+from diet.exports import EXPORT_COLUMNS, EXPORT_FORMATS
+from diet.importers import IngredientImporter, iter_rows
+from diet.management.serializers import DietPlanSerializer
+from diet.models import ArchivedDietPlan, DietPlan, DietPlanItem, FoodLogEntry, Ingredient
+from nutrifit.cache import get_tokens, touch, user_token_key
+from nutrifit.renderers import FastJSONRenderer
+from nutrifit.serializers import optimize_queryset
+from nutrifit.testing import QueryBudgetMixin, build_fixture
+from profiles.models import UserPreferences
+
+
+@override_settings(AI_BACKEND='fake', AI_FAKE_LATENCY=0)
+class DietQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every diet endpoint within a fixed number of queries, for a user with 50 plans of 20 items."""
+
+    budgets = {
+        'ingredient-list': 3,
+        'ingredient-detail': 2,
+        'diet-plan-list': 3,
+        'diet-plan-detail': {'GET': 3, 'PATCH': 5, 'DELETE': 5},
+        'diet-plan-summary': 2,
+        'diet-plan-range-summary': 2,
+        'diet-plan-export': 2,
+        'shopping-list': 3,
+        'diet-plan-item-swaps': 4,
+        'archived-diet-plan-list': 3,
+        'archived-diet-plan-detail': 2,
+        'food-log-list': {'GET': 3, 'POST': 7},
+        'food-log-detail': {'GET': 2, 'DELETE': 7},
+        'food-log-day': 3,
+        'food-log-adherence': 3,
+        'generate-diet-plan': 3,
+        # Each of the two LLM calls is checked and counted in the user's LLMUsage row in one
+        # transaction, then settled; the first call creates today's row.
+        'generate-from-nl': 24,
+        'regenerate-meal': 16,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture()
+        cls.user = cls.fixture['user']
+        cls.plan = cls.fixture['plans'][0]
+        cls.ingredient = cls.fixture['ingredients'][0]
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.user)
+
+    def test_every_url_has_a_budget(self):
+        self.assertEveryURLHasBudget(urls.urlpatterns)
+
+    def test_ingredients(self):
+        self.assertQueryBudget('ingredient-list', path='/api/ingredients/?search=ingredient', status=200)
+        self.assertQueryBudget('ingredient-detail', args=[self.ingredient.pk], status=200)
+
+    def test_plan_list_and_detail(self):
+        self.assertQueryBudget('diet-plan-list', status=200)
+        self.assertQueryBudget('diet-plan-list', path='/api/diet-plans/?expand=items,items.ingredient', status=200)
+        self.assertQueryBudget('diet-plan-detail', args=[self.plan.pk], status=200)
+
+    def test_plan_update_and_delete(self):
+        self.assertQueryBudget(
+            'diet-plan-detail', 'patch', args=[self.plan.pk], data={'is_favorite': True}, format='json', status=200,
+        )
+        self.assertQueryBudget('diet-plan-detail', 'delete', args=[self.plan.pk], status=204)
+
+    def test_summaries(self):
+        self.assertQueryBudget('diet-plan-summary', args=[self.plan.pk], status=200)
+        self.assertQueryBudget('diet-plan-range-summary', status=200)
+
+    def test_exports(self):
+        for export_format in EXPORT_FORMATS:
+            with self.subTest(export_format=export_format):
+                self.assertQueryBudget('diet-plan-export', args=[export_format], status=200)
+
+    def test_shopping_list(self):
+        self.assertQueryBudget('shopping-list', status=200)
+
+    def test_item_swaps(self):
+        item = self.plan.items.first()
+        self.assertQueryBudget('diet-plan-item-swaps', args=[item.pk], status=200)
+
+    def test_archived_plans(self):
+        archived = ArchivedDietPlan.objects.filter(user=self.user).first()
+        self.assertQueryBudget('archived-diet-plan-list', status=200)
+        self.assertQueryBudget('archived-diet-plan-detail', args=[archived.pk], status=200)
+
+    def test_food_log(self):
+        self.assertQueryBudget('food-log-list', status=200)
+        entry = {'ingredient': self.ingredient.pk, 'quantity_grams': '100', 'meal_type': 'lunch'}
+        self.assertQueryBudget('food-log-list', 'post', data=entry, format='json', status=201)
+        entries = [dict(entry, ingredient=ingredient.pk) for ingredient in self.fixture['ingredients'][:50]]
+        self.assertQueryBudget('food-log-list', 'post', data=entries, format='json', status=201)
+
+        logged = self.fixture['food_log'][0]
+        self.assertQueryBudget('food-log-detail', args=[logged.pk], status=200)
+        self.assertQueryBudget('food-log-detail', 'delete', args=[logged.pk], status=204)
+        self.assertQueryBudget('food-log-day', status=200)
+        self.assertQueryBudget('food-log-day', path='/api/food-log/day/?date=2024-02-30', status=400)
+        self.assertQueryBudget('food-log-list', path='/api/food-log/?date=2024-02-30', status=400)
+        self.assertQueryBudget('food-log-adherence', status=200)
+
+    def test_generation(self):
+        self.assertQueryBudget(
+            'generate-diet-plan', 'post', data={'plan_name': 'Manual plan'}, format='json', status=201,
+        )
+        self.assertQueryBudget(
+            'generate-from-nl', 'post', data={'input': 'I want to lose weight'}, format='json', status=201,
+        )
+        self.assertQueryBudget(
+            'regenerate-meal', 'post', args=[self.plan.pk], data={'meal_type': 'lunch'}, format='json', status=200,
+        )
+
+    def test_generation_with_idempotency_key(self):
+        request = {'data': {'input': 'I want to lose weight'}, 'format': 'json', 'HTTP_IDEMPOTENCY_KEY': 'nl-1'}
+        # Claiming the key and storing the response add five queries.
+        first = self.assertQueryBudget('generate-from-nl', 'post', budget=29, status=201, **request)
+        plans = DietPlan.objects.count()
+        replay = self.assertQueryBudget('generate-from-nl', 'post', budget=2, status=201, **request)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json()['id'], first.json()['id'])
+        self.assertEqual(DietPlan.objects.count(), plans)
+
+        request['data'] = {'input': 'I want to gain muscle'}
+        self.assertQueryBudget('generate-from-nl', 'post', budget=2, status=422, **request)
+
+    @override_settings(LLM_USER_REQUEST_BUDGET=1)
+    def test_generation_over_llm_budget(self):
+        # Parsing the input uses up the budget, generating the plan is refused.
+        plans = DietPlan.objects.count()
+        response = self.assertQueryBudget(
+            'generate-from-nl', 'post', data={'input': 'I want to lose weight'}, format='json', status=429,
+        )
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(DietPlan.objects.count(), plans)
+        usage = LLMUsage.objects.get(user=self.user)
+        self.assertEqual((usage.requests, usage.rejected), (1, 1))
+
+
+class PlanSummaryTests(TestCase):
+    """Per-meal totals and deviations from the targets, computed in the database."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='summary@example.com', password='summary-pass-123')
+        oats, milk, chicken = Ingredient.objects.bulk_create([
+            Ingredient(name='Summary oats', category='grains', calories_per_100g='389', protein_per_100g='16.9',
+                       carbs_per_100g='66', fat_per_100g='6.9'),
+            Ingredient(name='Summary milk', category='dairy', calories_per_100g='42', protein_per_100g='3.4',
+                       carbs_per_100g='5', fat_per_100g='1'),
+            Ingredient(name='Summary chicken', category='protein', calories_per_100g='165', protein_per_100g='31',
+                       carbs_per_100g='0', fat_per_100g='3.6'),
+        ])
+        cls.plan = DietPlan.objects.create(
+            user=cls.user, plan_name='Summary plan', ai_description='', total_calories=2000,
+            total_protein=150, total_carbs=200, total_fat=60,
+        )
+        DietPlanItem.objects.bulk_create([
+            DietPlanItem(diet_plan=cls.plan, ingredient=oats, quantity_grams=50, meal_type='breakfast'),
+            DietPlanItem(diet_plan=cls.plan, ingredient=milk, quantity_grams=200, meal_type='breakfast'),
+            DietPlanItem(diet_plan=cls.plan, ingredient=chicken, quantity_grams=150, meal_type='lunch'),
+        ])
+        cls.empty_plan = DietPlan.objects.create(
+            user=cls.user, plan_name='Empty plan', ai_description='', total_calories=1800,
+            total_protein=100, total_carbs=200, total_fat=50,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_plan_summary(self):
+        summary = self.client.get(reverse('diet-plan-summary', args=[self.plan.pk])).json()
+        self.assertEqual(summary['meals'], {
+            'breakfast': {'calories': 278.5, 'protein': 15.25, 'carbs': 43.0, 'fat': 5.45},
+            'lunch': {'calories': 247.5, 'protein': 46.5, 'carbs': 0.0, 'fat': 5.4},
+        })
+        self.assertEqual(summary['totals'], {'calories': 526.0, 'protein': 61.75, 'carbs': 43.0, 'fat': 10.85})
+        self.assertEqual(summary['deviation'], {'calories': -1474.0, 'protein': -88.25, 'carbs': -157.0, 'fat': -49.15})
+
+    def test_empty_plan(self):
+        summary = self.client.get(reverse('diet-plan-summary', args=[self.empty_plan.pk])).json()
+        self.assertEqual(summary['meals'], {})
+        self.assertEqual(summary['totals'], {'calories': 0.0, 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0})
+        self.assertEqual(summary['deviation']['calories'], -1800.0)
+
+    def test_range_summary(self):
+        DietPlan.objects.filter(pk=self.plan.pk).update(created_at=datetime(2024, 3, 10, 12, tzinfo=dt_timezone.utc))
+        DietPlan.objects.filter(pk=self.empty_plan.pk).update(
+            created_at=datetime(2024, 4, 10, 12, tzinfo=dt_timezone.utc),
+        )
+        response = self.client.get(reverse('diet-plan-range-summary'), {'start': '2024-03-01', 'end': '2024-03-31'})
+        data = response.json()
+        self.assertEqual((data['start'], data['end']), ('2024-03-01', '2024-03-31'))
+        self.assertEqual([plan['id'] for plan in data['plans']], [self.plan.pk])
+        self.assertEqual(data['plans'][0]['totals'], {'calories': 526.0, 'protein': 61.75, 'carbs': 43.0, 'fat': 10.85})
+
+        data = self.client.get(reverse('diet-plan-range-summary'), {'start': '2024-03-01'}).json()
+        self.assertEqual([plan['id'] for plan in data['plans']], [self.empty_plan.pk, self.plan.pk])
+
+        response = self.client.get(reverse('diet-plan-range-summary'), {'end': '2024-02-30'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_users_plan(self):
+        other = get_user_model().objects.create_user(email='other-summary@example.com', password='other-pass-123')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(reverse('diet-plan-summary', args=[self.plan.pk])).status_code, 404)
+
+
+class SparseFieldsetTests(TestCase):
+    """``?fields=`` and ``?expand=`` prune responses and the columns and joins queried for them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='sparse@example.com', password='sparse-pass-123')
+        cls.oats, cls.chicken = Ingredient.objects.bulk_create([
+            Ingredient(name='Sparse oats', category='grains', calories_per_100g='389', protein_per_100g='16.9',
+                       carbs_per_100g='66', fat_per_100g='6.9'),
+            Ingredient(name='Sparse chicken', category='protein', calories_per_100g='165', protein_per_100g='31',
+                       carbs_per_100g='0', fat_per_100g='3.6'),
+        ])
+        cls.plan = DietPlan.objects.create(
+            user=cls.user, plan_name='Sparse plan', ai_description='Long description', total_calories=2000,
+            total_protein=150, total_carbs=200, total_fat=60,
+        )
+        DietPlanItem.objects.bulk_create([
+            DietPlanItem(diet_plan=cls.plan, ingredient=cls.oats, quantity_grams=50, meal_type='breakfast'),
+            DietPlanItem(diet_plan=cls.plan, ingredient=cls.chicken, quantity_grams=150, meal_type='lunch',
+                         order_index=1),
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, **params):
+        response = self.client.get(reverse('diet-plan-detail', args=[self.plan.pk]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def serializer(self, **params):
+        request = Request(APIRequestFactory().get('/', params))
+        return DietPlanSerializer(context={'request': request})
+
+    def test_fields(self):
+        data = self.get(fields='id,plan_name,items.meal_type,items.calories')
+        self.assertEqual(data, {
+            'id': self.plan.pk,
+            'plan_name': 'Sparse plan',
+            'items': [{'meal_type': 'breakfast', 'calories': '194.50'}, {'meal_type': 'lunch', 'calories': '247.50'}],
+        })
+        # Naming a nested field without a sub-path keeps all of its fields.
+        item = self.get(fields='items')['items'][0]
+        self.assertEqual(item['ingredient']['name'], 'Sparse oats')
+        self.assertEqual(item['quantity_grams'], '50.00')
+
+    def test_expand(self):
+        self.assertEqual(self.get(fields='items', expand='')['items'], sorted(self.plan.items.values_list('id', flat=True)))
+        items = self.get(fields='items.ingredient,items.meal_type', expand='items')['items']
+        self.assertEqual(items, [
+            {'ingredient': self.oats.pk, 'meal_type': 'breakfast'},
+            {'ingredient': self.chicken.pk, 'meal_type': 'lunch'},
+        ])
+        ingredient = self.get(fields='items.ingredient.name', expand='items,items.ingredient')['items'][1]['ingredient']
+        self.assertEqual(ingredient, {'name': 'Sparse chicken'})
+
+    def test_writes_ignore_fields(self):
+        response = self.client.patch(
+            f"{reverse('diet-plan-detail', args=[self.plan.pk])}?fields=id", {'is_favorite': True}, format='json',
+        )
+        self.assertTrue(response.json()['is_favorite'])
+        self.assertIn('items', response.json())
+
+    def test_optimize_queryset(self):
+        serializer = self.serializer(fields='plan_name,items.calories')
+        queryset = optimize_queryset(DietPlan.objects.filter(pk=self.plan.pk), serializer)
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'plan_name'}, False))
+        with self.assertNumQueries(2):
+            plan = queryset.get()
+            self.assertEqual(plan.get_deferred_fields() & {'plan_name', 'ai_description'}, {'ai_description'})
+            items = list(plan.items.all())
+            # Calories read the ingredient's nutrients, joined into the prefetch.
+            self.assertEqual([float(item.calories) for item in items], [194.5, 247.5])
+            self.assertIn('meal_type', items[0].get_deferred_fields())
+            self.assertIn('category', items[0].ingredient.get_deferred_fields())
+
+    def test_optimize_queryset_collapsed(self):
+        serializer = self.serializer(fields='items', expand='')
+        queryset = optimize_queryset(DietPlan.objects.filter(pk=self.plan.pk), serializer)
+        item_ids = sorted(self.plan.items.values_list('id', flat=True))
+        with self.assertNumQueries(2):
+            items = list(queryset.get().items.all())
+        # Only the keys are loaded for a collapsed relation.
+        self.assertEqual(sorted(item.pk for item in items), item_ids)
+        self.assertIn('quantity_grams', items[0].get_deferred_fields())
+
+
+@override_settings(AI_BACKEND='fake', AI_FAKE_LATENCY=0)
+class RegenerateMealTests(TestCase):
+    """Regenerating one meal prompts with the remaining budget and replaces only that meal."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='regenerate@example.com', password='regen-pass-123')
+        cls.oats, cls.milk, cls.chicken, cls.rice = Ingredient.objects.bulk_create([
+            Ingredient(name='Regen oats', category='grains', calories_per_100g='389', protein_per_100g='16.9',
+                       carbs_per_100g='66', fat_per_100g='6.9'),
+            Ingredient(name='Regen milk', category='dairy', calories_per_100g='42', protein_per_100g='3.4',
+                       carbs_per_100g='5', fat_per_100g='1'),
+            Ingredient(name='Regen chicken', category='protein', calories_per_100g='165', protein_per_100g='31',
+                       carbs_per_100g='0', fat_per_100g='3.6', is_vegetarian=False),
+            Ingredient(name='Regen rice', category='grains', calories_per_100g='130', protein_per_100g='2.7',
+                       carbs_per_100g='28', fat_per_100g='0.3', is_vegan=True),
+        ])
+        cls.plan = DietPlan.objects.create(
+            user=cls.user, plan_name='Regen plan', ai_description='', total_calories=2000,
+            total_protein=150, total_carbs=200, total_fat=60,
+        )
+        DietPlanItem.objects.bulk_create([
+            DietPlanItem(diet_plan=cls.plan, ingredient=cls.oats, quantity_grams=50, meal_type='breakfast'),
+            DietPlanItem(diet_plan=cls.plan, ingredient=cls.milk, quantity_grams=200, meal_type='breakfast'),
+            DietPlanItem(diet_plan=cls.plan, ingredient=cls.chicken, quantity_grams=150, meal_type='lunch'),
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def regenerate(self, items, **data):
+        with mock.patch('ai_services.gemini_service.GeminiService.parse_json_response',
+                        return_value={'items': items}) as parse:
+            response = self.client.post(
+                reverse('regenerate-meal', args=[self.plan.pk]), {'meal_type': 'lunch', **data}, format='json',
+            )
+        return response, parse
+
+    def meals(self):
+        return sorted(self.plan.items.values_list('meal_type', 'ingredient__name', 'quantity_grams'))
+
+    def test_replaces_meal(self):
+        response, parse = self.regenerate(
+            [{'ingredient_id': self.rice.pk, 'quantity_grams': 250.004, 'description': 'Plain rice'}],
+            instructions='no meat',
+        )
+        self.assertEqual(response.status_code, 200)
+        prompt = parse.call_args.args[0]
+        # 2000 kcal minus the 278.5 kcal breakfast, and so on for each macro.
+        self.assertIn('Budget for the new lunch: 1722 kcal, 135g protein, 157g carbs, 55g fat.', prompt)
+        self.assertIn('Other meals today: breakfast: Regen oats 50g; breakfast: Regen milk 200g.', prompt)
+        self.assertIn('User wishes: no meat', prompt)
+        lunch = [item for item in response.json()['items'] if item['meal_type'] == 'lunch']
+        self.assertEqual([(item['ingredient']['name'], item['quantity_grams'], item['calories']) for item in lunch],
+                         [('Regen rice', '250.00', '325.00')])
+        self.assertEqual(self.meals(), [
+            ('breakfast', 'Regen milk', Decimal('200.00')),
+            ('breakfast', 'Regen oats', Decimal('50.00')),
+            ('lunch', 'Regen rice', Decimal('250.00')),
+        ])
+
+    def test_invalid_response_keeps_meal(self):
+        before = self.meals()
+        for items, error in (
+            ([{'ingredient_id': self.rice.pk, 'quantity_grams': -5, 'description': ''}], 'outside 0-2000g'),
+            ([{'ingredient_id': self.rice.pk, 'quantity_grams': 'NaN', 'description': ''}], 'invalid quantity'),
+            ([{'ingredient_id': 999999, 'quantity_grams': 100, 'description': ''}], 'unknown ingredient ids'),
+            ([], 'AI returned no items'),
+        ):
+            response, _ = self.regenerate(items)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(error, response.json()['error'])
+        self.assertEqual(self.meals(), before)
+
+    def test_invalid_meal_type(self):
+        response, parse = self.regenerate([], meal_type='brunch')
+        self.assertEqual(response.status_code, 400)
+        parse.assert_not_called()
+
+
+class FoodLogTotalsTests(TestCase):
+    """Daily totals follow logged, replayed and deleted entries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='food-log@example.com', password='food-pass-123')
+        cls.rice, cls.chicken = Ingredient.objects.bulk_create([
+            Ingredient(name='Logged rice', category='grains', calories_per_100g='130', protein_per_100g='2.7',
+                       carbs_per_100g='28', fat_per_100g='0.3'),
+            Ingredient(name='Logged chicken', category='protein', calories_per_100g='165', protein_per_100g='31',
+                       carbs_per_100g='0', fat_per_100g='3.6'),
+        ])
+        DietPlan.objects.create(
+            user=cls.user, plan_name='Target plan', ai_description='', total_calories=2000,
+            total_protein=150, total_carbs=200, total_fat=60,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        consumed_at = timezone.make_aware(datetime(2024, 5, 1, 12)).isoformat()
+        self.entries = [
+            {'ingredient': self.rice.pk, 'quantity_grams': '200', 'client_id': 'rice-1', 'consumed_at': consumed_at},
+            {'ingredient': self.chicken.pk, 'quantity_grams': '150', 'client_id': 'chicken-1',
+             'consumed_at': consumed_at},
+        ]
+
+    def log(self, data):
+        return self.client.post(reverse('food-log-list'), data, format='json')
+
+    def day(self):
+        return self.client.get(reverse('food-log-day'), {'date': '2024-05-01'}).json()
+
+    def test_totals(self):
+        response = self.log(self.entries)
+        self.assertEqual((response.status_code, response.json()['skipped']), (201, 0))
+        day = self.day()
+        self.assertEqual(day['entry_count'], 2)
+        self.assertEqual(day['totals'], {'calories': 507.5, 'protein': 51.9, 'carbs': 56.0, 'fat': 6.0})
+        self.assertEqual(day['remaining'], {'calories': 1492.5, 'protein': 98.1, 'carbs': 144.0, 'fat': 54.0})
+
+    def test_client_id_replay(self):
+        first = self.log(self.entries).json()['created']
+        response = self.log(self.entries)
+        self.assertEqual((response.status_code, response.json()), (201, {'created': [], 'skipped': 2}))
+        response = self.log(self.entries[0])
+        self.assertEqual((response.status_code, response.json()['id']), (200, first[0]['id']))
+        day = self.day()
+        self.assertEqual((day['entry_count'], day['totals']['calories']), (2, 507.5))
+        self.assertEqual(FoodLogEntry.objects.filter(user=self.user).count(), 2)
+
+    def test_delete(self):
+        rice, chicken = self.log(self.entries).json()['created']
+        response = self.client.delete(reverse('food-log-detail', args=[chicken['id']]))
+        self.assertEqual(response.status_code, 204)
+        day = self.day()
+        self.assertEqual(day['entry_count'], 1)
+        self.assertEqual(day['totals'], {'calories': 260.0, 'protein': 5.4, 'carbs': 56.0, 'fat': 0.6})
+
+        # The nutrients captured at log time are subtracted, not the current catalog values.
+        Ingredient.objects.filter(pk=self.rice.pk).update(calories_per_100g=999)
+        self.client.delete(reverse('food-log-detail', args=[rice['id']]))
+        day = self.day()
+        self.assertEqual(day['entry_count'], 0)
+        self.assertEqual(day['totals'], {'calories': 0.0, 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0})
+
+
+class ExportTests(TestCase):
+    """Column layout of every export format and formula-safe CSV cells."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='export@example.com', password='export-pass-123')
+        ingredient = Ingredient.objects.create(
+            name='+SUM(1,2)', category='grains', calories_per_100g=200, protein_per_100g=10,
+            carbs_per_100g=30, fat_per_100g=5,
+        )
+        cls.plan = DietPlan.objects.create(
+            user=cls.user, plan_name='=HYPERLINK("http://example.com")', ai_description='', total_calories=2000,
+            total_protein=150, total_carbs=200, total_fat=60,
+        )
+        DietPlanItem.objects.create(
+            diet_plan=cls.plan, ingredient=ingredient, quantity_grams=150, meal_type='lunch',
+            ai_description='@cmd', order_index=0,
+        )
+        cls.empty_plan = DietPlan.objects.create(
+            user=cls.user, plan_name='-empty', ai_description='', total_calories=1800,
+            total_protein=100, total_carbs=200, total_fat=50,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, export_format):
+        response = self.client.get(reverse('diet-plan-export', args=[export_format]))
+        self.assertEqual(response['Content-Type'], EXPORT_FORMATS[export_format])
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        header, item, empty = csv.reader(io.StringIO(self.export('csv')))
+        self.assertEqual(tuple(header), EXPORT_COLUMNS)
+        item = dict(zip(header, item))
+        self.assertEqual(item['plan_name'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(item['ingredient'], "'+SUM(1,2)")
+        self.assertEqual(item['description'], "'@cmd")
+        self.assertEqual((item['meal_type'], item['quantity_grams']), ('lunch', '150.00'))
+        self.assertEqual((item['calories'], item['protein'], item['carbs'], item['fat']), ('300.0', '15.0', '45.0', '7.5'))
+        empty = dict(zip(header, empty))
+        self.assertEqual((empty['plan_name'], empty['meal_type'], empty['calories']), ("'-empty", '', ''))
+
+    def test_jsonl(self):
+        item, empty = [json.loads(line) for line in self.export('jsonl').splitlines()]
+        self.assertEqual(tuple(item), EXPORT_COLUMNS)
+        # Only spreadsheets evaluate formulas; JSON keeps the values as they are.
+        self.assertEqual((item['plan_name'], item['ingredient']), ('=HYPERLINK("http://example.com")', '+SUM(1,2)'))
+        self.assertEqual((item['plan_id'], item['calories']), (self.plan.pk, 300.0))
+        self.assertEqual((empty['plan_id'], empty['meal_type']), (self.empty_plan.pk, None))
+
+    def test_ics(self):
+        lines = self.export('ics').split('\r\n')
+        self.assertEqual((lines[0], lines[-2]), ('BEGIN:VCALENDAR', 'END:VCALENDAR'))
+        # One event for the lunch of the first plan; the empty plan has none.
+        self.assertEqual(lines.count('BEGIN:VEVENT'), 1)
+        self.assertIn(f'UID:plan-{self.plan.pk}-lunch@nutrifit', lines)
+        self.assertIn('SUMMARY:Lunch: +SUM(1\\,2)', lines)
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """The orjson renderer produces the same bytes as DRF's for the types DRF's encoder handles."""
+
+    @staticmethod
+    def payload():
+        return {
+            'decimal': Decimal('1.10'),
+            'bytes': b'abc',
+            'uuid': uuid.UUID(int=5),
+            'datetime': datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc),
+            'date': date(2024, 1, 2),
+            'time': dt_time(1, 2, 3),
+            'timedelta': timedelta(minutes=90),
+            'lazy': gettext_lazy('Hello'),
+            'set': {1},
+            'generator': (number for number in range(3)),
+            'separator': 'a\u2028b',
+            1: 'integer key',
+        }
+
+    def test_matches_drf(self):
+        self.assertEqual(FastJSONRenderer().render(self.payload()), JSONRenderer().render(self.payload()))
+        self.assertEqual(FastJSONRenderer().render([self.payload(), None]),
+                         JSONRenderer().render([self.payload(), None]))
+        self.assertEqual(json.loads(FastJSONRenderer().render(self.payload()))['bytes'], 'abc')
+
+    def test_unsupported_type(self):
+        with self.assertRaises(TypeError):
+            FastJSONRenderer().render({'object': object()})
+
+
+class ShoppingListInvalidationTests(TestCase):
+    """Cached shopping lists are invalidated once catalog and plan changes commit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture(plans=2, items_per_plan=3, ingredients=10, food_log_entries=0,
+                                    weight_entries=0, archived_plans=0)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.fixture['user'])
+
+    def names(self):
+        response = self.client.get(reverse('shopping-list'))
+        return {item['name'] for category in response.json()['categories'] for item in category['items']}
+
+    def test_ingredient_rename(self):
+        item = self.fixture['plans'][0].items.select_related('ingredient').first()
+        self.assertIn(item.ingredient.name, self.names())
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            item.ingredient.name = 'renamed ingredient'
+            item.ingredient.save()
+        # Not committed yet: the cached list may still be served.
+        self.assertNotIn('renamed ingredient', self.names())
+        for callback in callbacks:
+            callback()
+        self.assertIn('renamed ingredient', self.names())
+
+
+class CatalogVersionTests(TestCase):
+    """The catalog version changes on committed ingredient writes and expires without a shared cache."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_changes_on_commit(self):
+        version = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(
+                name='Kale', category='vegetables', calories_per_100g=49, protein_per_100g=4,
+                carbs_per_100g=9, fat_per_100g=1,
+            )
+            self.assertEqual(catalog_version(), version)
+        self.assertNotEqual(catalog_version(), version)
+
+    @override_settings(CACHE_SHARED=False, UNSHARED_CACHE_TIMEOUT=30)
+    def test_expires_without_shared_cache(self):
+        version = catalog_version()
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 31):
+            self.assertNotEqual(catalog_version(), version)
+
+    @override_settings(CACHE_SHARED=True)
+    def test_kept_with_shared_cache(self):
+        version = catalog_version()
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 3600):
+            self.assertEqual(catalog_version(), version)
+
+
+class SwapIndexTests(TestCase):
+    """Swaps are ranked by macro profile and filtered by the user's restrictions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='swaps@example.com', password='swaps-pass-123')
+        rows = (
+            ('Swap chicken', 'protein', '165', '31', '0', '3.6', False, False, []),
+            ('Swap turkey', 'protein', '135', '30', '0', '1', False, False, []),
+            ('Swap salmon', 'protein', '208', '20', '0', '13', False, False, ['fish']),
+            ('Swap tofu', 'protein', '76', '8', '1.9', '4.8', True, True, ['soy']),
+            ('Swap rice', 'grains', '130', '2.7', '28', '0.3', True, True, []),
+        )
+        cls.ingredients = {
+            name.split()[1]: Ingredient.objects.create(
+                name=name, category=category, calories_per_100g=calories, protein_per_100g=protein,
+                carbs_per_100g=carbs, fat_per_100g=fat, is_vegetarian=vegetarian, is_vegan=vegan,
+                common_allergens=allergens,
+            )
+            for name, category, calories, protein, carbs, fat, vegetarian, vegan, allergens in rows
+        }
+        plan = DietPlan.objects.create(
+            user=cls.user, plan_name='Swap plan', ai_description='', total_calories=2000,
+            total_protein=150, total_carbs=200, total_fat=60,
+        )
+        cls.item = DietPlanItem.objects.create(
+            diet_plan=plan, ingredient=cls.ingredients['chicken'], quantity_grams=150, meal_type='lunch',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def swaps(self, **preferences):
+        if preferences:
+            UserPreferences.objects.update_or_create(user=self.user, defaults=preferences)
+        response = self.client.get(reverse('diet-plan-item-swaps', args=[self.item.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['swaps']
+
+    def test_ranking(self):
+        swaps = self.swaps()
+        self.assertEqual([swap['name'] for swap in swaps],
+                         ['Swap turkey', 'Swap tofu', 'Swap salmon', 'Swap rice'])
+        distances = [swap['distance'] for swap in swaps]
+        self.assertEqual(distances, sorted(distances))
+        # Quantities keep the item's 247.5 kcal.
+        self.assertEqual(swaps[0]['quantity_grams'], 183.3)
+        self.assertEqual(swaps[0]['calories'], 247.46)
+
+    def test_dietary_filters(self):
+        self.assertEqual([swap['name'] for swap in self.swaps(dietary_type='vegan')], ['Swap tofu', 'Swap rice'])
+        self.assertEqual(
+            [swap['name'] for swap in self.swaps(dietary_type='vegan', allergies=['Soy'])], ['Swap rice'],
+        )
+        self.assertEqual(
+            [swap['name'] for swap in self.swaps(dietary_type='none', allergies=['fish'], disliked_foods=['rice'])],
+            ['Swap turkey', 'Swap tofu'],
+        )
+
+    def test_rebuilds_for_unknown_ingredient(self):
+        self.swaps()
+        # Committed elsewhere: this process has not seen a new catalog version.
+        with self.captureOnCommitCallbacks(execute=False):
+            beef = Ingredient.objects.create(
+                name='Swap beef', category='protein', calories_per_100g=250, protein_per_100g=26,
+                carbs_per_100g=0, fat_per_100g=15, is_vegetarian=False,
+            )
+        DietPlanItem.objects.filter(pk=self.item.pk).update(ingredient=beef)
+        self.assertEqual(self.swaps()[0]['name'], 'Swap salmon')
+
+
+class ArchiveTests(TestCase):
+    """Old plans are snapshotted, bulk-deleted and their owners' caches invalidated once per batch."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture(plans=5, items_per_plan=4, ingredients=10, food_log_entries=0,
+                                    weight_entries=0, archived_plans=0)
+        cls.user = cls.fixture['user']
+        plans = cls.fixture['plans']
+        cls.old_ids = [plan.pk for plan in plans[:3]]
+        cls.favorite = plans[3]
+        DietPlan.objects.filter(pk__in=cls.old_ids + [cls.favorite.pk]).update(
+            created_at=retention_cutoff() - timedelta(days=1), is_favorite=False,
+        )
+        DietPlan.objects.filter(pk=cls.favorite.pk).update(is_favorite=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_archive(self):
+        token = get_tokens([user_token_key(self.user.pk)])
+        with mock.patch('diet.archive.touch', wraps=touch) as touched, \
+                mock.patch('diet.signals.touch') as signal_touched, \
+                self.captureOnCommitCallbacks(execute=True):
+            stats = archive_plans(retention_cutoff(), batch_size=2)
+        signal_touched.assert_not_called()
+        self.assertEqual((stats.plans, stats.items, stats.batches), (3, 12, 2))
+        # One touch of the owner's token per batch, none per plan or item.
+        self.assertEqual(touched.call_args_list, [mock.call(user_token_key(self.user.pk))] * 2)
+        self.assertNotEqual(get_tokens([user_token_key(self.user.pk)]), token)
+
+        self.assertFalse(DietPlan.objects.filter(pk__in=self.old_ids).exists())
+        self.assertFalse(DietPlanItem.objects.filter(diet_plan_id__in=self.old_ids).exists())
+        self.assertTrue(DietPlan.objects.filter(pk=self.favorite.pk).exists())
+        archived = ArchivedDietPlan.objects.get(original_id=self.old_ids[0])
+        payload = load_payload(archived)
+        self.assertEqual((payload['id'], payload['user_id'], len(payload['items'])), (self.old_ids[0], self.user.pk, 4))
+
+    def test_dry_run(self):
+        stats = archive_plans(retention_cutoff(), dry_run=True)
+        self.assertEqual((stats.plans, stats.items), (3, 12))
+        self.assertEqual(DietPlan.objects.filter(pk__in=self.old_ids).count(), 3)
+        self.assertFalse(ArchivedDietPlan.objects.exists())
+
+    def test_command_reports_database_size(self):
+        out = io.StringIO()
+        call_command('archive_diet_plans', stdout=out)
+        self.assertIn('Archived 3 plans (12 items) in 1 batches', out.getvalue())
+        self.assertRegex(out.getvalue(), r'Database file: [\d.]+ KiB \([\d.]+ KiB free\) before, '
+                                         r'[\d.]+ KiB \([\d.]+ KiB free\) after\.')
+
+
+class IngredientImporterTests(TestCase):
+    """Rows are normalized, validated and upserted on the ingredient name."""
+
+    CSV = (
+        'Food,Food Group,Energy_kcal,Protein,Carbohydrate,Total Fat,Fiber,Vegan,Allergens\n'
+        'Lentils,Legumes,116,9,20,"0,4",8,yes,\n'
+        'Cheddar,milk,402,25,1.3,33,,no,Dairy|dairy\n'
+        'Broken,grains,abc,1,1,1,0,no,\n'
+        ',grains,100,1,1,1,0,no,\n'
+    )
+
+    def run_import(self, text, **options):
+        return IngredientImporter(**options).run(iter_rows(io.StringIO(text)))
+
+    def test_csv_import(self):
+        stats = self.run_import(self.CSV)
+        self.assertEqual((stats.created, stats.updated, stats.skipped), (2, 0, 2))
+        self.assertEqual([line for line, _ in stats.errors], [4, 5])
+
+        lentils = Ingredient.objects.get(name='Lentils')
+        self.assertEqual(lentils.category, 'protein')
+        self.assertEqual(lentils.fat_per_100g, Decimal('0.40'))
+        self.assertTrue(lentils.is_vegan and lentils.is_vegetarian)
+        cheddar = Ingredient.objects.get(name='Cheddar')
+        self.assertEqual(cheddar.category, 'dairy')
+        self.assertEqual(cheddar.fiber_per_100g, Decimal('0.00'))
+        self.assertEqual(cheddar.common_allergens, ['dairy'])
+
+    def test_reimport_only_writes_changes(self):
+        self.run_import(self.CSV)
+        stats = self.run_import(self.CSV.replace('Cheddar,milk,402', 'Cheddar,milk,410'), batch_size=1)
+        self.assertEqual((stats.created, stats.updated, stats.unchanged), (0, 1, 1))
+        self.assertEqual(Ingredient.objects.get(name='Cheddar').calories_per_100g, Decimal('410.00'))
+
+        stats = self.run_import(self.CSV.replace('Cheddar,milk,410', 'Cheddar,milk,420'), update_existing=False)
+        self.assertEqual((stats.updated, stats.unchanged), (0, 2))
+        self.assertEqual(Ingredient.objects.get(name='Cheddar').calories_per_100g, Decimal('410.00'))
+
+    def test_dry_run_writes_nothing(self):
+        stats = self.run_import(self.CSV, dry_run=True)
+        self.assertEqual(stats.created, 2)
+        self.assertFalse(Ingredient.objects.filter(name__in=['Lentils', 'Cheddar']).exists())
+
+    def test_gzipped_json_lines_command(self):
+        rows = [
+            {'name': 'Tempeh', 'category': 'protein', 'calories': 192, 'protein': 20, 'carbs': 8, 'fat': 11},
+            {'name': 'Tempeh', 'category': 'protein', 'calories': 195, 'protein': 20, 'carbs': 8, 'fat': 11},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'foods.jsonl.gz'
+            with gzip.open(path, 'wt', encoding='utf-8') as f:
+                f.write('\n'.join(json.dumps(row) for row in rows) + '\n{not json\n')
+            out, err = io.StringIO(), io.StringIO()
+            call_command('import_ingredients', str(path), stdout=out, stderr=err)
+        self.assertIn('1 created', out.getvalue())
+        self.assertIn('line 3: invalid JSON', err.getvalue())
+        # The later duplicate wins.
+        self.assertEqual(Ingredient.objects.get(name='Tempeh').calories_per_100g, Decimal('195.00'))
+
+
+class DietAdminQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Admin pages of the diet models, including a plan with 20 inline items."""
+
+    @classmethod
+    def setUpTestData(cls):
+        build_fixture()
+        cls.admin = get_user_model().objects.create_superuser(email='admin@example.com', password='admin-pass-123')
+
+    def test_admin_pages(self):
+        self.client.force_login(self.admin)
+        self.assertAdminBudgets('diet', changelist_budget=5, change_budget=10)
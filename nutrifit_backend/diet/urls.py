@@ -2,7 +2,11 @@ from django.urls import path
 from .views import (
     IngredientListView, IngredientDetailView,
     DietPlanListView, DietPlanDetailView,
-    generate_diet_plan, generate_from_natural_language
+    ArchivedDietPlanListView, ArchivedDietPlanDetailView,
+    diet_plan_summary, diet_plan_range_summary, export_diet_plans, shopping_list,
+    diet_plan_item_swaps,
+    FoodLogListCreateView, FoodLogDetailView, food_log_day, food_log_adherence,
+    generate_diet_plan, generate_from_natural_language, regenerate_meal
 )
 
 urlpatterns = [
@@ -10,6 +14,18 @@ urlpatterns = [
     path('ingredients/<int:pk>/', IngredientDetailView.as_view(), name='ingredient-detail'),
     path('diet-plans/', DietPlanListView.as_view(), name='diet-plan-list'),
     path('diet-plans/<int:pk>/', DietPlanDetailView.as_view(), name='diet-plan-detail'),
+    path('diet-plans/<int:pk>/summary/', diet_plan_summary, name='diet-plan-summary'),
+    path('diet-plans/summary/', diet_plan_range_summary, name='diet-plan-range-summary'),
+    path('diet-plans/export/<str:export_format>/', export_diet_plans, name='diet-plan-export'),
+    path('diet-plans/shopping-list/', shopping_list, name='shopping-list'),
+    path('diet-plan-items/<int:pk>/swaps/', diet_plan_item_swaps, name='diet-plan-item-swaps'),
+    path('diet-plans/archived/', ArchivedDietPlanListView.as_view(), name='archived-diet-plan-list'),
+    path('diet-plans/archived/<int:pk>/', ArchivedDietPlanDetailView.as_view(), name='archived-diet-plan-detail'),
+    path('food-log/', FoodLogListCreateView.as_view(), name='food-log-list'),
+    path('food-log/<int:pk>/', FoodLogDetailView.as_view(), name='food-log-detail'),
+    path('food-log/day/', food_log_day, name='food-log-day'),
+    path('food-log/adherence/', food_log_adherence, name='food-log-adherence'),
     path('diet-plans/generate/', generate_diet_plan, name='generate-diet-plan'),
     path('diet-plans/generate-from-nl/', generate_from_natural_language, name='generate-from-nl'),
+    path('diet-plans/<int:pk>/regenerate-meal/', regenerate_meal, name='regenerate-meal'),
 ]
@@ -2,17 +2,33 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Ingredient, DietPlan, DietPlanItem
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import Ingredient, DietPlan, DietPlanItem, ArchivedDietPlan, FoodLogEntry
 from .management.serializers import (
     IngredientSerializer, DietPlanSerializer,
-    DietPlanListSerializer, DietPlanItemSerializer
+    DietPlanListSerializer, DietPlanItemSerializer,
+    ArchivedDietPlanSerializer, ArchivedDietPlanDetailSerializer,
+    FoodLogEntrySerializer
 )
-from ai_services.diet_generator import DietPlanGenerator
-from ai_services.nl_parser import NaturalLanguageParser
+from .summaries import plan_summaries
+from .exports import EXPORT_FORMATS, stream_export
+from .shopping import get_shopping_list
+from .swap_index import get_swap_index
+from .food_log import MAX_BULK_ENTRIES, adherence, day_progress, delete_entry, log_entries
+from nutrifit.serializers import SparseQuerysetMixin, optimize_queryset
+from profiles.models import UserPreferences
+from ai_services.async_views import async_api_view
+from ai_services.gemini_service import AIBusyError
+from ai_services.idempotency import idempotent
 
 
-class IngredientListView(generics.ListAPIView):
+class IngredientListView(SparseQuerysetMixin, generics.ListAPIView):
     """List and search ingredients."""
     
     serializer_class = IngredientSerializer
@@ -32,7 +48,7 @@ class IngredientListView(generics.ListAPIView):
         return queryset
 
 
-class IngredientDetailView(generics.RetrieveAPIView):
+class IngredientDetailView(SparseQuerysetMixin, generics.RetrieveAPIView):
     """Get ingredient details."""
     
     serializer_class = IngredientSerializer
@@ -40,7 +56,7 @@ class IngredientDetailView(generics.RetrieveAPIView):
     queryset = Ingredient.objects.all()
 
 
-class DietPlanListView(generics.ListAPIView):
+class DietPlanListView(SparseQuerysetMixin, generics.ListAPIView):
     """List user's diet plans."""
     
     serializer_class = DietPlanListSerializer
@@ -50,7 +66,7 @@ class DietPlanListView(generics.ListAPIView):
         return DietPlan.objects.filter(user=self.request.user)
 
 
-class DietPlanDetailView(generics.RetrieveUpdateDestroyAPIView):
+class DietPlanDetailView(SparseQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Get, update or delete a diet plan."""
     
     serializer_class = DietPlanSerializer
@@ -58,10 +74,240 @@ class DietPlanDetailView(generics.RetrieveUpdateDestroyAPIView):
     
     def get_queryset(self):
         return DietPlan.objects.filter(user=self.request.user)
+    
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        # UpdateModelMixin drops the saved instance's prefetched items, which
+        # would be re-read one ingredient at a time; respond from a fresh copy.
+        queryset = optimize_queryset(self.get_queryset(), self.get_serializer())
+        serializer.instance = queryset.get(pk=serializer.instance.pk)
+
+
+class ArchivedDietPlanListView(SparseQuerysetMixin, generics.ListAPIView):
+    """List user's archived diet plans."""
+    
+    serializer_class = ArchivedDietPlanSerializer
+    permission_classes = (IsAuthenticated,)
+    
+    def get_queryset(self):
+        return ArchivedDietPlan.objects.filter(user=self.request.user).defer('payload')
+
+
+class ArchivedDietPlanDetailView(generics.RetrieveAPIView):
+    """Get an archived diet plan with its items."""
+    
+    serializer_class = ArchivedDietPlanDetailSerializer
+    permission_classes = (IsAuthenticated,)
+    
+    def get_queryset(self):
+        return ArchivedDietPlan.objects.filter(user=self.request.user)
+
+
+class FoodLogListCreateView(SparseQuerysetMixin, generics.ListCreateAPIView):
+    """List logged foods (optionally for ?date=) or log one entry or a list of entries."""
+    
+    serializer_class = FoodLogEntrySerializer
+    permission_classes = (IsAuthenticated,)
+    
+    def get_queryset(self):
+        entries = FoodLogEntry.objects.filter(user=self.request.user).select_related('ingredient')
+        try:
+            day = parse_date(self.request.query_params.get('date') or '')
+        except ValueError:
+            raise ValidationError({'error': 'date must be in YYYY-MM-DD format'})
+        if day:
+            entries = entries.filter(consumed_at__date=day)
+        return entries
+    
+    def create(self, request, *args, **kwargs):
+        many = isinstance(request.data, list)
+        if many and len(request.data) > MAX_BULK_ENTRIES:
+            return Response({
+                'error': f'At most {MAX_BULK_ENTRIES} entries can be logged at once'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = self.get_serializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        entries = serializer.validated_data if many else [serializer.validated_data]
+        try:
+            created, skipped = log_entries(request.user, entries)
+        except Ingredient.DoesNotExist as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
+            return Response({
+                'error': 'A concurrent request logged the same client_id; retry to get the stored entry'
+            }, status=status.HTTP_409_CONFLICT)
+        
+        data = self.get_serializer(created, many=True).data
+        if many:
+            return Response({'created': data, 'skipped': skipped}, status=status.HTTP_201_CREATED)
+        if not created:
+            # Resubmission of an already logged client_id.
+            existing = self.get_queryset().get(client_id=entries[0]['client_id'])
+            return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+        return Response(data[0], status=status.HTTP_201_CREATED)
+
+
+class FoodLogDetailView(SparseQuerysetMixin, generics.RetrieveDestroyAPIView):
+    """Get or delete a food log entry."""
+    
+    serializer_class = FoodLogEntrySerializer
+    permission_classes = (IsAuthenticated,)
+    
+    def get_queryset(self):
+        return FoodLogEntry.objects.filter(user=self.request.user).select_related('ingredient')
+    
+    def perform_destroy(self, instance):
+        delete_entry(instance)
+
+
+def _parse_date_range(request):
+    """Parse optional ?start=/?end= (YYYY-MM-DD) into ``(start_date, end_date, error_response)``."""
+    
+    start = request.query_params.get('start')
+    end = request.query_params.get('end')
+    try:
+        start_date = parse_date(start) if start else None
+        end_date = parse_date(end) if end else None
+    except ValueError:
+        start_date = end_date = None
+    if (start and start_date is None) or (end and end_date is None):
+        return None, None, Response({
+            'error': 'start and end must be dates in YYYY-MM-DD format'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return start_date, end_date, None
+
+
+def _filter_by_date_range(request, plans):
+    """
+    Apply optional ?start=/?end= (YYYY-MM-DD) filters to a plan queryset.
+
+    Returns ``(plans, start_date, end_date, error_response)``.
+    """
+    
+    start_date, end_date, error = _parse_date_range(request)
+    if error:
+        return plans, None, None, error
+    if start_date:
+        plans = plans.filter(created_at__date__gte=start_date)
+    if end_date:
+        plans = plans.filter(created_at__date__lte=end_date)
+    return plans, start_date, end_date, None
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def diet_plan_summary(request, pk):
+    """Calories and macros per meal for one plan, with deviation from its targets."""
+    
+    summaries = plan_summaries(DietPlan.objects.filter(user=request.user, pk=pk))
+    if not summaries:
+        return Response({'error': 'Diet plan not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(summaries[0])
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def diet_plan_range_summary(request):
+    """Per-plan nutrition summaries for plans created in a date range."""
+    
+    plans, start_date, end_date, error = _filter_by_date_range(request, DietPlan.objects.filter(user=request.user))
+    if error:
+        return error
+    
+    return Response({
+        'start': start_date,
+        'end': end_date,
+        'plans': plan_summaries(plans),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def shopping_list(request):
+    """Consolidated shopping list for selected plans or a date range of plans."""
+    
+    plans = DietPlan.objects.filter(user=request.user)
+    plan_ids = request.query_params.get('plans')
+    if plan_ids:
+        try:
+            plans = plans.filter(id__in=[int(pk) for pk in plan_ids.split(',') if pk.strip()])
+        except ValueError:
+            return Response({
+                'error': 'plans must be a comma-separated list of plan ids'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    plans, _, _, error = _filter_by_date_range(request, plans)
+    if error:
+        return error
+    
+    round_units = request.query_params.get('round') in ('1', 'true')
+    return Response(get_shopping_list(request.user, plans, round_units=round_units))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_diet_plans(request, export_format):
+    """Stream all of the user's diet plans as CSV, JSON-lines or iCalendar."""
+    
+    if export_format not in EXPORT_FORMATS:
+        return Response({
+            'error': f"Unsupported export format. Use one of: {', '.join(EXPORT_FORMATS)}"
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    plans = DietPlan.objects.filter(user=request.user)
+    if request.query_params.get('favorites') in ('1', 'true'):
+        plans = plans.filter(is_favorite=True)
+    
+    response = StreamingHttpResponse(
+        stream_export(plans, export_format),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    filename = f"nutrifit-diet-plans-{timezone.now():%Y%m%d}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def diet_plan_item_swaps(request, pk):
+    """Suggest calorie-matched ingredient swaps for one plan item."""
+    
+    item = get_object_or_404(
+        DietPlanItem.objects.select_related('ingredient'),
+        pk=pk, diet_plan__user=request.user,
+    )
+    try:
+        limit = min(max(int(request.query_params.get('limit', 5)), 1), 20)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    preferences = UserPreferences.objects.filter(user=request.user).first()
+    # Rebuilds the index if the item's ingredient is newer than it.
+    swaps = get_swap_index(item.ingredient_id).suggest(
+        item.ingredient_id,
+        item.quantity_grams,
+        limit=limit,
+        dietary_type=preferences.dietary_type if preferences else 'none',
+        allergies=preferences.allergies if preferences else (),
+        disliked_foods=preferences.disliked_foods if preferences else (),
+    )
+    
+    return Response({
+        'item': {
+            'id': item.id,
+            'ingredient_id': item.ingredient_id,
+            'ingredient': item.ingredient.name,
+            'meal_type': item.meal_type,
+            'quantity_grams': item.quantity_grams,
+            'calories': round(item.calories, 2),
+        },
+        'swaps': swaps,
+    })
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def generate_diet_plan(request):
     """Generate AI-powered diet plan."""
     
@@ -95,31 +341,97 @@ def generate_diet_plan(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def generate_from_natural_language(request):
+@async_api_view(['POST'])
+@idempotent
+async def generate_from_natural_language(request):
     """Generate diet plan from natural language input."""
     
+    # Imported here so that loading the URLconf does not pull in the AI stack.
+    from ai_services.diet_generator import DietPlanGenerator
+    from ai_services.nl_parser import NaturalLanguageParser
+    
     try:
         nl_input = request.data.get('input', '')
         
         if not nl_input:
-            return Response({
+            return JsonResponse({
                 'error': 'Input text is required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Parse natural language
-        parser = NaturalLanguageParser()
-        parsed_data = parser.parse(nl_input, request.user)
+        parser = NaturalLanguageParser(request.user)
+        parsed_data = await parser.parse_async(nl_input, request.user)
         
         # Generate diet plan
         generator = DietPlanGenerator(request.user)
-        plan = generator.generate_plan(parsed_data)
+        plan = await generator.generate_plan_async(parsed_data)
+        
+        data = await sync_to_async(lambda: DietPlanSerializer(plan).data)()
+        return JsonResponse(data, status=status.HTTP_201_CREATED)
+    
+    except AIBusyError:
+        raise
+    except Exception as e:
+        return JsonResponse({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def regenerate_meal(request, pk):
+    """Regenerate a single meal of an existing diet plan."""
+    
+    diet_plan = get_object_or_404(DietPlan, pk=pk, user=request.user)
+    meal_type = request.data.get('meal_type', '')
+    if meal_type not in dict(DietPlanItem.MEAL_TYPE_CHOICES):
+        return Response({
+            'error': f"meal_type must be one of: {', '.join(dict(DietPlanItem.MEAL_TYPE_CHOICES))}"
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    from ai_services.diet_generator import DietPlanGenerator
+    
+    try:
+        generator = DietPlanGenerator(request.user)
+        plan = generator.regenerate_meal(diet_plan, meal_type, request.data.get('instructions', ''))
         
         serializer = DietPlanSerializer(plan)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.data, status=status.HTTP_200_OK)
     
+    except AIBusyError as e:
+        return Response(
+            {'error': str(e), 'retry_after': e.retry_after}, status=e.status_code,
+            headers={'Retry-After': str(e.retry_after)},
+        )
     except Exception as e:
         return Response({
             'error': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def food_log_day(request):
+    """Logged totals for ?date= (default: today) against the daily target."""
+    
+    date_param = request.query_params.get('date')
+    try:
+        day = parse_date(date_param) if date_param else timezone.localdate()
+    except ValueError:
+        day = None
+    if day is None:
+        return Response({'error': 'date must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(day_progress(request.user, day))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def food_log_adherence(request):
+    """Daily calorie adherence to the target over the last ?days= days (default: 30)."""
+    
+    try:
+        days = min(max(int(request.query_params.get('days', 30)), 1), 366)
+    except ValueError:
+        return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(adherence(request.user, days))
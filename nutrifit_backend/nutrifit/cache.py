@@ -0,0 +1,76 @@
+"""
+Cache invalidation tokens shared by the NutriFit apps.
+
+Derived results (shopping lists, dashboard payloads, ...) are cached under
+keys built from the tokens of everything they depend on. Changing a source
+object replaces its token, which makes every dependent key unreachable
+without having to know or delete those keys.
+
+Tokens are random rather than counters so that a token evicted from the
+cache can never come back with an old value and resurrect stale entries.
+
+With the default per-process cache a write only touches the tokens of the
+process that handled it, so ``entry_timeout`` caps how long other
+processes can keep serving entries built before it, and tokens themselves
+expire after ``UNSHARED_CACHE_TIMEOUT`` for state kept outside the cache
+that is keyed on a token.
+"""
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _new_token():
+    return uuid.uuid4().hex[:16]
+
+
+def _token_timeout():
+    # Shared tokens live until evicted.
+    return None if settings.CACHE_SHARED else settings.UNSHARED_CACHE_TIMEOUT
+
+
+def entry_timeout(seconds):
+    """Cache timeout for a derived value: ``seconds``, capped unless the cache is shared."""
+    if settings.CACHE_SHARED:
+        return seconds
+    return min(seconds, settings.UNSHARED_CACHE_TIMEOUT)
+
+
+def user_token_key(user_id):
+    """Invalidation token name for data belonging to one user."""
+    return f'user:{user_id}'
+
+
+def get_tokens(keys):
+    """Return ``{key: token}`` for ``keys``, creating tokens that are missing."""
+    keys = [f'token:{key}' for key in keys]
+    tokens = cache.get_many(keys)
+    missing = {key: _new_token() for key in keys if key not in tokens}
+    if missing:
+        cache.set_many(missing, timeout=_token_timeout())
+        tokens.update(missing)
+    return {key[len('token:'):]: token for key, token in tokens.items()}
+
+
+def touch(*keys):
+    """Replace the tokens of ``keys``, invalidating everything built on them."""
+    cache.set_many({f'token:{key}': _new_token() for key in keys}, timeout=_token_timeout())
+
+
+def versioned_key(prefix, dependencies, *parts):
+    """
+    Build a cache key for a value derived from ``dependencies``.
+
+    The key changes whenever any dependency is touched or the extra
+    ``parts`` (e.g. query options) differ.
+    """
+    tokens = get_tokens(dependencies)
+    digest = hashlib.sha1()
+    for key in sorted(tokens):
+        digest.update(f'{key}={tokens[key]};'.encode())
+    for part in parts:
+        digest.update(f'{part};'.encode())
+    return f'{prefix}:{digest.hexdigest()}'
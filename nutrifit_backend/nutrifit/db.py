@@ -0,0 +1,35 @@
+"""
+Optional in-process serialization of write transactions.
+
+SQLite allows one writer at a time. With ``SQLITE_SERIALIZE_WRITES`` on,
+``serialized_write`` makes threads of this process queue on a lock before
+opening their write transaction instead of all contending for the database
+lock (and backing off) at once.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, transaction
+
+
+_write_lock = threading.Lock()
+
+
+@contextmanager
+def serialized_write(using='default'):
+    """
+    ``transaction.atomic`` that waits for the process-wide write lock first.
+
+    Usable as a context manager or decorator. Inside an existing transaction
+    it only adds a savepoint: waiting for the lock while holding the
+    database's write lock could deadlock with the lock's owner.
+    """
+    connection = connections[using]
+    if settings.SQLITE_SERIALIZE_WRITES and connection.vendor == 'sqlite' and not connection.in_atomic_block:
+        with _write_lock, transaction.atomic(using=using):
+            yield
+    else:
+        with transaction.atomic(using=using):
+            yield
@@ -0,0 +1,91 @@
+"""
+SQLite backend tuned for running NutriFit in production.
+
+Compared to Django's backend it
+
+- applies the ``pragmas`` from ``OPTIONS`` (WAL journal, relaxed fsync,
+  larger page cache, ...) to every new connection,
+- starts transactions with ``BEGIN IMMEDIATE`` so a transaction that reads
+  before writing cannot fail half-way with "database is locked" when
+  another connection is writing, and
+- retries statements that still hit ``SQLITE_BUSY`` with bounded,
+  jittered exponential backoff (``busy_retries``/``busy_backoff``).
+
+Enabled with ``SQLITE_PRODUCTION=1`` (see settings).
+"""
+
+import random
+import sqlite3
+import time
+
+from django.db.backends.sqlite3 import base
+
+
+BACKEND_OPTIONS = ('pragmas', 'busy_retries', 'busy_backoff', 'transaction_mode')
+
+
+# Messages of SQLITE_BUSY and SQLITE_LOCKED, for Pythons before 3.11 whose
+# exceptions carry no error code.
+BUSY_MESSAGES = ('database is locked', 'database table is locked')
+BUSY_CODES = (getattr(sqlite3, 'SQLITE_BUSY', 5), getattr(sqlite3, 'SQLITE_LOCKED', 6))
+
+
+def _is_busy(error):
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        # Extended codes (e.g. SQLITE_BUSY_SNAPSHOT) carry the primary code in the low byte.
+        return code & 0xff in BUSY_CODES
+    return str(error).startswith(BUSY_MESSAGES)
+
+
+class RetryingCursorWrapper(base.SQLiteCursorWrapper):
+    """Cursor retrying statements that fail because the database is busy."""
+
+    retries = 0
+    backoff = 0.0
+
+    def _retry(self, method, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return method(*args)
+            except sqlite3.OperationalError as e:
+                if attempt == self.retries or not _is_busy(e):
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                time.sleep(delay / 2 + random.uniform(0, delay / 2))
+
+    def execute(self, query, params=None):
+        return self._retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        # param_list may be a generator; materialize it so a retry sees every row.
+        return self._retry(super().executemany, query, list(param_list))
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = options.get('pragmas', {})
+        self.busy_retries = options.get('busy_retries', 5)
+        self.busy_backoff = options.get('busy_backoff', 0.05)
+        self.transaction_mode = options.get('transaction_mode', 'IMMEDIATE')
+        params = super().get_connection_params()
+        for name in BACKEND_OPTIONS:
+            params.pop(name, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursorWrapper)
+        cursor.retries = self.busy_retries
+        cursor.backoff = self.busy_backoff
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}'.strip())
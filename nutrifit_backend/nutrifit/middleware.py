@@ -0,0 +1,274 @@
+"""
+Project-wide middleware.
+"""
+
+import gzip
+import json
+import logging
+import random
+import re
+import secrets
+import struct
+import zlib
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import routers, timing
+
+
+try:
+    import brotli  # optional dependency
+except Exception:
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|.*\+json|x-ndjson|javascript|xml|.*\+xml))', re.IGNORECASE
+)
+
+
+def _accepted_encodings(header):
+    """Parse Accept-Encoding into ``{coding: q}``; q=0 entries are kept as refusals."""
+    encodings = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        encodings[coding] = quality
+    return encodings
+
+
+def _gzip_header(max_random_bytes):
+    """
+    gzip member header with a random-length file name.
+
+    Like Django's ``GZipMiddleware``, this varies the compressed length so
+    that it leaks less about the content (BREACH).
+    """
+    flags = gzip.FNAME if max_random_bytes else 0
+    header = struct.pack('<BBBBLBB', 0x1f, 0x8b, zlib.DEFLATED, flags, 0, 0, 255)
+    if max_random_bytes:
+        header += b'a' * secrets.randbelow(max_random_bytes) + b'\x00'
+    return header
+
+
+def _gzip_compress(data, level, max_random_bytes):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = compressor.compress(data) + compressor.flush()
+    trailer = struct.pack('<LL', zlib.crc32(data), len(data) & 0xffffffff)
+    return _gzip_header(max_random_bytes) + body + trailer
+
+
+def _gzip_stream(chunks, level, max_random_bytes):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    crc = size = 0
+    yield _gzip_header(max_random_bytes)
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush() + struct.pack('<LL', crc, size & 0xffffffff)
+
+
+def _brotli_stream(chunks, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with brotli or gzip, whichever the client prefers.
+
+    Brotli is only offered when the ``brotli`` package is installed.
+    Responses smaller than ``COMPRESSION_MIN_SIZE`` bytes, already encoded
+    responses, non-textual content types and paths under
+    ``COMPRESSION_EXCLUDE_PATHS`` (the token endpoints, whose bodies carry
+    JWTs) are sent as-is. gzip output gets up to ``COMPRESSION_RANDOM_BYTES``
+    of padding; brotli has no comparable field, which is why the token
+    endpoints are excluded altogether.
+    """
+
+    def process_response(self, request, response):
+        if request.path.startswith(tuple(settings.COMPRESSION_EXCLUDE_PATHS)):
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        if not COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self._choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if encoding == 'br':
+                response.streaming_content = _brotli_stream(response.streaming_content, settings.BROTLI_QUALITY)
+            else:
+                response.streaming_content = _gzip_stream(
+                    response.streaming_content, settings.GZIP_LEVEL, settings.COMPRESSION_RANDOM_BYTES,
+                )
+            del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                compressed = brotli.compress(response.content, quality=settings.BROTLI_QUALITY)
+            else:
+                compressed = _gzip_compress(response.content, settings.GZIP_LEVEL, settings.COMPRESSION_RANDOM_BYTES)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The body changed, so a strong ETag no longer matches byte-for-byte.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def _choose_encoding(header):
+        accepted = _accepted_encodings(header)
+        wildcard = accepted.get('*', 0)
+        candidates = []
+        # An explicit q=0 refuses a coding even if "*" would accept it.
+        br_quality = accepted.get('br', wildcard)
+        if brotli is not None and br_quality > 0:
+            candidates.append((br_quality, 1, 'br'))
+        gzip_quality = accepted.get('gzip', accepted.get('x-gzip', wildcard))
+        if gzip_quality > 0:
+            candidates.append((gzip_quality, 0, 'gzip'))
+        if not candidates:
+            return None
+        return max(candidates)[2]
+
+
+slow_request_logger = logging.getLogger('nutrifit.slow_requests')
+
+
+class ServerTimingMiddleware(MiddlewareMixin):
+    """
+    Report total, SQL and LLM time per request in a ``Server-Timing`` header.
+
+    Requests slower than ``SLOW_REQUEST_MS`` are logged to
+    ``nutrifit.slow_requests`` (one JSON object per line) with their
+    slowest queries, for a ``SLOW_REQUEST_SAMPLE_RATE`` share of them.
+    Installed first so the total covers the other middleware.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        for connection in connections.all(initialized_only=True):
+            timing.install_sql_timer(None, connection)
+
+    def process_request(self, request):
+        keep = settings.SLOW_REQUEST_TOP_QUERIES if settings.SLOW_REQUEST_SAMPLE_RATE > 0 else 0
+        request._timings = timing.start(keep)
+
+    def process_response(self, request, response):
+        timings = getattr(request, '_timings', None)
+        if timings is None:
+            return response
+        timing.finish()
+        total_ms = timings.elapsed * 1000
+        sql_ms = timings.sql_time * 1000
+        llm_ms = timings.llm_time * 1000
+
+        if settings.SERVER_TIMING_HEADER:
+            metrics = [
+                f'total;dur={total_ms:.1f}',
+                f'db;dur={sql_ms:.1f};desc="{timings.sql_count} queries"',
+            ]
+            if timings.llm_count:
+                metrics.append(f'llm;dur={llm_ms:.1f};desc="{timings.llm_count} calls"')
+            response.headers['Server-Timing'] = ', '.join(metrics)
+            origin = request.headers.get('Origin')
+            if origin and origin in settings.CORS_ALLOWED_ORIGINS:
+                # Lets the frontend read the header from another origin.
+                response.headers['Timing-Allow-Origin'] = origin
+
+        if total_ms >= settings.SLOW_REQUEST_MS and random.random() < settings.SLOW_REQUEST_SAMPLE_RATE:
+            slow_request_logger.warning(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 1),
+                'sql_count': timings.sql_count,
+                'sql_ms': round(sql_ms, 1),
+                'llm_count': timings.llm_count,
+                'llm_ms': round(llm_ms, 1),
+                'top_queries': timings.top_queries(),
+            }))
+        return response
+
+
+def _jwt_user_id(request):
+    """User id from a valid bearer token, without touching the database."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    try:
+        raw_token = authentication.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return authentication.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM)
+    except AuthenticationFailed:
+        # The view's authentication rejects the request properly.
+        return None
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """
+    Read-your-writes for ``nutrifit.routers.ReplicaRouter``.
+
+    Unsafe requests and requests from users who wrote within the last
+    ``REPLICA_STICKY_SECONDS`` read from the primary. A request that wrote
+    pins its user for the next window and returns the pin in a
+    ``Replica-Pin`` header for the client to send back. Does nothing
+    without replicas.
+    """
+
+    def process_request(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return
+        user_id = _jwt_user_id(request)
+        pinned = request.method not in SAFE_METHODS or (
+            user_id is not None and routers.is_user_pinned(user_id, request.headers.get(routers.PIN_HEADER))
+        )
+        request._replica_user_id = user_id
+        request._replica_state = routers.begin_request(pinned)
+
+    def process_response(self, request, response):
+        state = getattr(request, '_replica_state', None)
+        if state is None:
+            return response
+        routers.end_request()
+        if state.wrote and request._replica_user_id is not None:
+            token = routers.pin_user(request._replica_user_id)
+            if token:
+                response.headers[routers.PIN_HEADER] = token
+        return response
@@ -0,0 +1,57 @@
+"""
+Fast JSON renderer and parser for the REST API.
+
+Both use ``orjson`` when it is installed and fall back to DRF's standard
+``json``-based implementations otherwise, so enabling them is always safe.
+Compact output is the same as DRF's; types orjson has no native support
+for are encoded by DRF's encoder, and data orjson cannot encode at all,
+such as integers beyond 64 bits, is rendered by DRF instead. Indented
+output always uses two spaces.
+"""
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+
+try:
+    import orjson  # optional dependency
+except Exception:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` that serializes with orjson when available."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            options |= orjson.OPT_INDENT_2
+        try:
+            # Types orjson has no native support for (Decimal, bytes, lazy
+            # strings, querysets...) are encoded by DRF's own encoder.
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like DRF does, so the output is also valid JavaScript.
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    """``JSONParser`` that parses with orjson when available."""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,126 @@
+"""
+Read-replica database routing.
+
+Reads of models in ``REPLICA_APPS`` go to a random alias from
+``DATABASE_REPLICAS``; every write goes to ``default``. Replicas lag behind
+the primary, so reads fall back to ``default`` when
+
+- the current request is unsafe (POST, PUT, ...) or has already written,
+- a transaction is open on ``default``, or
+- the authenticated user wrote within the last ``REPLICA_STICKY_SECONDS``
+  (read-your-writes across requests; see ``ReplicaPinMiddleware``).
+
+A write pins its user with a signed, expiring ``Replica-Pin`` response
+header that the client sends back, so any worker can honour the pin; with
+a shared cache (``CACHE_SHARED``) the pin is also stored there for clients
+that do not echo the header.
+
+Outside a request (management commands, shells) the first write pins the
+rest of the thread to ``default``.
+"""
+
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections
+
+
+class RoutingState:
+    """Per-request routing flags."""
+
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar('replica_routing_state', default=None)
+
+
+def begin_request(pinned=False):
+    """Install fresh routing state for the current request."""
+    state = RoutingState(pinned)
+    _state.set(state)
+    return state
+
+
+def end_request():
+    # Not ``ContextVar.reset``: under ASGI, MiddlewareMixin runs
+    # process_request and process_response in different contexts.
+    _state.set(None)
+
+
+PIN_HEADER = 'Replica-Pin'
+_PIN_SALT = 'nutrifit.routers.replica-pin'
+
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_user(user_id):
+    """
+    Send ``user_id``'s reads to the primary for ``REPLICA_STICKY_SECONDS``.
+
+    Returns the ``Replica-Pin`` token for the response, or ``None`` when
+    stickiness is off. The per-process cache is not used: a pin there would
+    only be seen by the worker that handled the write.
+    """
+    if settings.REPLICA_STICKY_SECONDS <= 0:
+        return None
+    if settings.CACHE_SHARED:
+        cache.set(_pin_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+    return signing.dumps(str(user_id), salt=_PIN_SALT)
+
+
+def is_user_pinned(user_id, token=None):
+    """Whether ``user_id`` wrote recently, from a ``Replica-Pin`` ``token`` or the shared cache."""
+    if settings.REPLICA_STICKY_SECONDS <= 0:
+        return False
+    if token:
+        try:
+            if signing.loads(token, salt=_PIN_SALT, max_age=settings.REPLICA_STICKY_SECONDS) == str(user_id):
+                return True
+        except signing.BadSignature:
+            # Expired, forged or for another user: fall back to the cache.
+            pass
+    return settings.CACHE_SHARED and bool(cache.get(_pin_key(user_id)))
+
+
+class ReplicaRouter:
+    """Route reads of ``REPLICA_APPS`` to replicas and all writes to ``default``."""
+
+    def _read_from_primary(self):
+        state = _state.get()
+        return (state is not None and state.pinned) or connections['default'].in_atomic_block
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in settings.REPLICA_APPS or not settings.DATABASE_REPLICAS:
+            return None
+        if self._read_from_primary():
+            return 'default'
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            state = RoutingState()
+            _state.set(state)
+        state.pinned = state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema from the primary.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,175 @@
+"""
+Sparse fieldsets and expansions for NutriFit API serializers.
+
+Read requests may pass
+
+- ``?fields=id,plan_name,items.meal_type`` to return only the listed fields
+  (dotted paths select fields of nested serializers; naming a nested field
+  without a sub-path returns all of its fields), and
+- ``?expand=items,items.ingredient`` to choose which relations are rendered
+  as nested objects. When ``expand`` is given, every expandable relation not
+  listed collapses to its primary key(s). Without it the full nested
+  representation is kept, so existing clients see no change.
+
+``optimize_queryset`` then restricts a queryset to the columns, joins and
+prefetches the pruned serializer actually needs.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _split(value):
+    return {part.strip() for part in (value or '').split(',') if part.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin honouring ``?fields=`` and ``?expand=`` on read requests.
+
+    ``Meta.sparse_dependencies`` maps computed fields (properties, method
+    fields) to the model lookups they read, e.g.
+    ``{'calories': ('quantity_grams', 'ingredient__calories_per_100g')}``.
+    """
+
+    sparse_path = ''
+
+    def _sparse_options(self):
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return None, None
+        params = request.query_params
+        fields = _split(params.get('fields')) if 'fields' in params else None
+        expand = _split(params.get('expand')) if 'expand' in params else None
+        return fields, expand
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, expand = self._sparse_options()
+        path = self.sparse_path
+
+        if requested is not None:
+            scoped = {name[len(path):] for name in requested if name.startswith(path)}
+            # Only restrict this level if the client named something inside it.
+            if scoped or not path:
+                allowed = {name.split('.', 1)[0] for name in scoped}
+                for name in list(fields):
+                    if name not in allowed:
+                        fields.pop(name)
+
+        for name, field in list(fields.items()):
+            child = field.child if isinstance(field, serializers.ListSerializer) else field
+            if not isinstance(child, serializers.BaseSerializer):
+                continue
+            if expand is not None and f'{path}{name}' not in expand:
+                fields[name] = self._collapse(field)
+            elif isinstance(child, SparseFieldsetMixin):
+                child.sparse_path = f'{path}{name}.'
+        return fields
+
+    @staticmethod
+    def _collapse(field):
+        """Replace a nested serializer with its primary key(s)."""
+        kwargs = {'read_only': True, 'many': isinstance(field, serializers.ListSerializer)}
+        if field.source:
+            kwargs['source'] = field.source
+        return serializers.PrimaryKeyRelatedField(**kwargs)
+
+
+def _lookup(source):
+    return source.replace('.', '__')
+
+
+def _plan(serializer, model):
+    """Collect ``(only, select_related, prefetches)`` for a serializer."""
+    only = {model._meta.pk.name}
+    select = set()
+    prefetches = []
+    load_all = False
+    dependencies = getattr(getattr(serializer, 'Meta', None), 'sparse_dependencies', {})
+
+    def add_lookup(lookup):
+        parts = lookup.split('__')
+        for depth in range(1, len(parts)):
+            select.add('__'.join(parts[:depth]))
+        only.add(lookup)
+
+    for name, field in serializer.fields.items():
+        source = field.source
+        if name in dependencies:
+            for lookup in dependencies[name]:
+                add_lookup(lookup)
+            continue
+        if source == '*':
+            load_all = True
+            continue
+
+        if isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField)):
+            child = field.child if isinstance(field, serializers.ListSerializer) else field.child_relation
+            try:
+                relation = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                load_all = True
+                continue
+            related_model = relation.related_model
+            if isinstance(child, serializers.ModelSerializer):
+                queryset = optimize_queryset(related_model._default_manager.all(), child)
+            else:
+                queryset = related_model._default_manager.only(related_model._meta.pk.name)
+            if relation.one_to_many and queryset.query.deferred_loading[1] is False:
+                # Keep the back-reference column used to attach prefetched rows.
+                queryset = queryset.only(*queryset.query.deferred_loading[0], relation.field.name)
+            prefetches.append(Prefetch(source, queryset=queryset))
+        elif isinstance(field, serializers.ModelSerializer):
+            sub_only, sub_select, sub_prefetches, sub_all = _plan(field, field.Meta.model)
+            select.add(_lookup(source))
+            select.update(f'{_lookup(source)}__{path}' for path in sub_select)
+            only.add(_lookup(source))
+            if sub_all:
+                load_all = True
+            else:
+                only.update(f'{_lookup(source)}__{name}' for name in sub_only)
+            prefetches.extend(
+                Prefetch(f'{_lookup(source)}__{prefetch.prefetch_through}', queryset=prefetch.queryset)
+                for prefetch in sub_prefetches
+            )
+        else:
+            lookup = _lookup(source)
+            try:
+                model._meta.get_field(lookup.split('__', 1)[0])
+            except FieldDoesNotExist:
+                # A property or method we know nothing about: load everything.
+                load_all = True
+                continue
+            add_lookup(lookup)
+
+    return only, select, prefetches, load_all
+
+
+def optimize_queryset(queryset, serializer):
+    """
+    Restrict ``queryset`` to what ``serializer`` (already pruned) renders.
+
+    Adds ``only()`` for the needed columns, ``select_related`` for nested
+    single objects and ``Prefetch`` objects for nested lists.
+    """
+    only, select, prefetches, load_all = _plan(serializer, queryset.model)
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    if not load_all:
+        queryset = queryset.only(*sorted(only))
+    return queryset
+
+
+class SparseQuerysetMixin:
+    """View mixin optimizing the view's queryset for the requested fieldset."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        return optimize_queryset(queryset, self.get_serializer())
@@ -5,6 +5,7 @@ Django settings for nutrifit project.
 import os
 from pathlib import Path
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -44,10 +45,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'nutrifit.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'nutrifit.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'nutrifit.middleware.ReplicaPinMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -101,6 +105,93 @@ else:
         }
     }
 
+# Opt-in SQLite profile for small production deployments: WAL journal and
+# tuned pragmas, persistent connections, BEGIN IMMEDIATE transactions and
+# retries with backoff on "database is locked".
+SQLITE_PRODUCTION = os.getenv('SQLITE_PRODUCTION', 'False').lower() in ('1', 'true', 'yes')
+# Serialize plan/log writes through an in-process lock (see nutrifit.db).
+SQLITE_SERIALIZE_WRITES = os.getenv('SQLITE_SERIALIZE_WRITES', 'False').lower() in ('1', 'true', 'yes')
+
+SQLITE_PRODUCTION_DATABASE = {
+    'ENGINE': 'nutrifit.db_backends.sqlite3',
+    'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', '5')),
+        'busy_retries': 5,
+        'busy_backoff': 0.05,
+        'transaction_mode': 'IMMEDIATE',
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'temp_store': 'MEMORY',
+            'cache_size': -20000,  # KiB
+            'mmap_size': 134217728,
+            'wal_autocheckpoint': 1000,
+        },
+    },
+}
+
+if SQLITE_PRODUCTION and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].update(SQLITE_PRODUCTION_DATABASE)
+
+# Read replicas (see nutrifit.routers): reads of these apps go to a replica
+# unless the user wrote within the last REPLICA_STICKY_SECONDS. Keep it above
+# the replication lag (the sync_sqlite_replica --interval locally).
+# DB_REPLICA_HOSTS=host1,host2 adds MySQL replicas of the default database;
+# SQLITE_REPLICA_PATH adds a local SQLite stand-in kept current with
+# `python manage.py sync_sqlite_replica`.
+REPLICA_APPS = ('diet', 'profiles')
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+
+if DB_ENGINE in ('mysql', 'mysqlclient'):
+    for index, host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+        DATABASES[f'replica{index}'] = {
+            **DATABASES['default'],
+            'HOST': host.strip(),
+            'TEST': {'MIRROR': 'default'},
+        }
+elif os.getenv('SQLITE_REPLICA_PATH'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('SQLITE_REPLICA_PATH'),
+        'CONN_MAX_AGE': DATABASES['default'].get('CONN_MAX_AGE', 0),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['nutrifit.routers.ReplicaRouter'] if DATABASE_REPLICAS else []
+
+# Cache
+# Per-process memory cache by default; set REDIS_URL to share the cache
+# (and its invalidation tokens) between worker processes. The Redis backend
+# needs the `redis` package (see requirements.txt).
+REDIS_URL = os.getenv('REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'nutrifit',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '50000')),
+            },
+        }
+    }
+
+# Without a shared cache, invalidations only reach the process that made the
+# write; cached results derived from user data and the in-process swap index
+# then expire after this many seconds.
+CACHE_SHARED = bool(REDIS_URL)
+UNSHARED_CACHE_TIMEOUT = int(os.getenv('UNSHARED_CACHE_TIMEOUT', '30'))
+
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -144,7 +235,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'nutrifit.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'nutrifit.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -153,6 +253,15 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# Response compression (brotli is used when the `brotli` package is installed)
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+# Bodies carrying JWTs are never compressed (BREACH); gzip output of the
+# rest is padded with up to COMPRESSION_RANDOM_BYTES, as Django's GZipMiddleware does.
+COMPRESSION_EXCLUDE_PATHS = ['/api/auth/']
+COMPRESSION_RANDOM_BYTES = 100
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
@@ -160,8 +269,18 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.NutriFitTokenRefreshSerializer',
 }
 
+# Seconds an authenticated user is served from the per-process cache instead
+# of being re-read on every request (0 disables the cache).
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', '60'))
+
+# When positive, refresh-token blacklist checks go through an in-process
+# Bloom filter re-synced every this many seconds; a token blacklisted by
+# another process may be accepted for up to that long (0 disables it).
+TOKEN_BLACKLIST_BLOOM_SYNC_SECONDS = int(os.getenv('TOKEN_BLACKLIST_BLOOM_SYNC_SECONDS', '0'))
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = os.getenv(
     'CORS_ALLOWED_ORIGINS',
@@ -170,5 +289,68 @@ CORS_ALLOWED_ORIGINS = os.getenv(
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'replica-pin')
+CORS_EXPOSE_HEADERS = ('Idempotent-Replayed', 'Replica-Pin', 'Retry-After')
+
+# Prints the queries per endpoint measured by the query-budget tests
+# (nutrifit.testing); QUERY_BUDGET_REPORT=path also writes them as JSON.
+TEST_RUNNER = 'nutrifit.testing.QueryBudgetRunner'
+
+# Server-Timing header with total/SQL/LLM time per request, and sampling of
+# slow requests (with their slowest queries) to the nutrifit.slow_requests
+# logger, written to SLOW_REQUEST_LOG if set and stderr otherwise.
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', 'True').lower() in ('1', 'true', 'yes')
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', '1000'))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv('SLOW_REQUEST_SAMPLE_RATE', '1.0'))
+SLOW_REQUEST_TOP_QUERIES = 5
+SLOW_REQUEST_LOG = os.getenv('SLOW_REQUEST_LOG', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_requests': (
+            {'class': 'logging.FileHandler', 'filename': SLOW_REQUEST_LOG}
+            if SLOW_REQUEST_LOG else {'class': 'logging.StreamHandler'}
+        ),
+    },
+    'loggers': {
+        'nutrifit.slow_requests': {'handlers': ['slow_requests'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+# Diet plans older than this (favorites excluded) are moved to the archive
+# by `manage.py archive_diet_plans`.
+DIET_PLAN_RETENTION_DAYS = int(os.getenv('DIET_PLAN_RETENTION_DAYS', '180'))
+
 # Google Gemini AI
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+
+# In-flight LLM calls per process for the async AI views, how long a request
+# may wait for a free slot before getting a 503, and the thread pool size used
+# when the client library has no native async API.
+AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', '200'))
+AI_QUEUE_TIMEOUT = float(os.getenv('AI_QUEUE_TIMEOUT', '10'))
+AI_EXECUTOR_WORKERS = int(os.getenv('AI_EXECUTOR_WORKERS', '32'))
+# 'gemini', or 'fake' for the offline stand-in in ai_services.fake_llm
+# (load tests, local development without an API key).
+AI_BACKEND = os.getenv('AI_BACKEND', 'gemini').lower()
+AI_FAKE_LATENCY = float(os.getenv('AI_FAKE_LATENCY', '0.5'))
+# How long the response to a generation request with an Idempotency-Key is
+# replayed for repeats (ai_services.idempotency).
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+# A key still in progress after this many seconds is assumed abandoned (its
+# worker crashed) and is handed to the next request that sends it.
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '300'))
+# Sliding-window LLM budgets (ai_services.budgets): calls and estimated
+# tokens per user and for the whole deployment within the window. Calls over
+# a budget get a 429 with Retry-After; 0 disables a limit. The sliding-window
+# counters need the shared cache (REDIS_URL); without it the budgets are
+# counted per calendar day in the LLMUsage and LLMGlobalUsage tables, which
+# adds a short write transaction to every LLM call, and
+# LLM_BUDGET_WINDOW_SECONDS is ignored.
+LLM_BUDGET_WINDOW_SECONDS = int(os.getenv('LLM_BUDGET_WINDOW_SECONDS', '86400'))
+LLM_USER_REQUEST_BUDGET = int(os.getenv('LLM_USER_REQUEST_BUDGET', '60'))
+LLM_USER_TOKEN_BUDGET = int(os.getenv('LLM_USER_TOKEN_BUDGET', '300000'))
+LLM_GLOBAL_REQUEST_BUDGET = int(os.getenv('LLM_GLOBAL_REQUEST_BUDGET', '0'))
+LLM_GLOBAL_TOKEN_BUDGET = int(os.getenv('LLM_GLOBAL_TOKEN_BUDGET', '0'))
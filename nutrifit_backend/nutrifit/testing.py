@@ -0,0 +1,219 @@
+"""
+Query-count budgets for the API test suites.
+
+Each app's ``tests.py`` declares ``budgets`` (URL name -> maximum number of
+SQL queries, or ``{method: maximum}``) and exercises every URL of its ``urls.py`` against fixtures
+large enough that a per-row query (an N+1) would blow the budget, e.g. a
+user with 50 plans of 20 items each. Requests run with cold caches, so the
+budget is the worst case.
+
+``QueryBudgetRunner`` prints the measured queries per endpoint after the
+run and writes them as JSON to ``QUERY_BUDGET_REPORT`` if that is set.
+"""
+
+import json
+import os
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.authentication import user_cache
+from accounts.tokens import NutriFitRefreshToken
+
+
+PASSWORD = 'Budget-pass-123'
+
+# (url name, method, path, queries, budget) of every measured request.
+report = []
+
+
+def url_names(urlpatterns):
+    """All URL names in ``urlpatterns``, following includes."""
+    names = set()
+    for pattern in urlpatterns:
+        if isinstance(pattern, URLResolver):
+            names |= url_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def build_fixture(email='budget@example.com', plans=50, items_per_plan=20, ingredients=100,
+                  food_log_entries=100, weight_entries=60, archived_plans=3):
+    """
+    A user with a profile, preferences, conditions, goals, plans, food log,
+    weight history and archived plans. Returns a dict of the created objects.
+    """
+    from diet.archive import archive_plans, retention_cutoff
+    from diet.food_log import log_entries
+    from diet.models import DietPlan, DietPlanItem, Ingredient
+    from profiles.models import DietGoal, MedicalCondition, UserPreferences, UserProfile
+    from profiles.weights import record_weight
+
+    user = get_user_model().objects.create_user(email=email, password=PASSWORD)
+    UserProfile.objects.create(user=user, age=34, weight=80, height=178, sex='male', activity_level='moderate')
+    UserPreferences.objects.create(user=user, dietary_type='none', allergies=['peanuts'], disliked_foods=['liver'])
+    MedicalCondition.objects.bulk_create([
+        MedicalCondition(user=user, condition_name=name) for name in ('hypertension', 'diabetes', 'asthma')
+    ])
+    goals = DietGoal.objects.bulk_create([
+        DietGoal(user=user, goal_type=goal_type, calorie_target=2000, is_active=goal_type == 'lose_weight')
+        for goal_type in ('maintain', 'muscle_gain', 'lose_weight')
+    ])
+
+    categories = [code for code, _ in Ingredient.CATEGORY_CHOICES]
+    prefix = email.split('@')[0]
+    catalog = Ingredient.objects.bulk_create([
+        Ingredient(
+            name=f'{prefix} ingredient {index:03d}', category=categories[index % len(categories)],
+            calories_per_100g=40 + index * 7 % 500, protein_per_100g=index % 35,
+            carbs_per_100g=index * 3 % 80, fat_per_100g=index % 25, fiber_per_100g=index % 9,
+            is_vegan=index % 3 == 0, common_allergens=['peanuts'] if index % 10 == 0 else [],
+        )
+        for index in range(ingredients)
+    ])
+
+    meal_types = ('breakfast', 'lunch', 'dinner', 'snack')
+    plan_objects = DietPlan.objects.bulk_create([
+        DietPlan(
+            user=user, goal=goals[-1], plan_name=f'Plan {index}', ai_description='Fixture plan.',
+            total_calories=2000, total_protein=150, total_carbs=200, total_fat=60, is_favorite=index % 10 == 0,
+        )
+        for index in range(plans + archived_plans)
+    ])
+    DietPlanItem.objects.bulk_create([
+        DietPlanItem(
+            diet_plan=plan, ingredient=catalog[(plan_index + position) % len(catalog)],
+            quantity_grams=Decimal('120'), meal_type=meal_types[position % 4],
+            ai_description='Fixture item.', order_index=position,
+        )
+        for plan_index, plan in enumerate(plan_objects)
+        for position in range(items_per_plan)
+    ])
+    if archived_plans:
+        old = [plan.pk for plan in plan_objects[plans:]]
+        DietPlan.objects.filter(pk__in=old).update(
+            created_at=retention_cutoff() - timedelta(days=1), is_favorite=False,
+        )
+        archive_plans(retention_cutoff())
+
+    now = timezone.now()
+    log, _ = log_entries(user, [
+        {
+            'ingredient_id': catalog[index % len(catalog)].pk, 'quantity_grams': Decimal('150'),
+            'meal_type': meal_types[index % 4], 'consumed_at': now - timedelta(hours=index * 7),
+        }
+        for index in range(food_log_entries)
+    ])
+    for index in range(weight_entries):
+        record_weight(user, Decimal('85') - Decimal(index) / 10, recorded_at=now - timedelta(days=weight_entries - index))
+
+    return {
+        'user': user,
+        'goals': goals,
+        'ingredients': catalog,
+        'plans': plan_objects[:plans],
+        'food_log': log,
+    }
+
+
+class QueryBudgetMixin:
+    """
+    ``assertQueryBudget`` for API test cases.
+
+    Subclasses set ``budgets``; ``self.client`` is authenticated as
+    ``self.user`` when ``authenticate`` is called.
+    """
+
+    budgets = {}
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        user_cache.clear()
+        self.client = APIClient()
+
+    def authenticate(self, user):
+        token = NutriFitRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def assertQueryBudget(self, name, method='get', path=None, budget=None, status=None, args=None, **kwargs):
+        """Request ``path`` (default: ``reverse(name, args=args)``) within the query budget."""
+        if path is None:
+            path = reverse(name, args=args)
+        if budget is None:
+            budget = self.budgets[name]
+            if isinstance(budget, dict):
+                budget = budget[method.upper()]
+        # Later requests must not profit from what earlier ones cached.
+        cache.clear()
+        user_cache.clear()
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            response = getattr(self.client, method)(path, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        report.append((name, method.upper(), path, len(queries), budget))
+
+        if status is not None and response.status_code != status:
+            body = getattr(response, 'data', None) or response.content[:500]
+            self.fail(f'{method.upper()} {path} returned {response.status_code}, expected {status}: {body}')
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{method.upper()} {path} ran {len(queries)} queries (budget {budget}):\n'
+            + '\n'.join(f'{index}. {query["sql"]}' for index, query in enumerate(queries.captured_queries, 1)),
+        )
+        return response
+
+    def assertEveryURLHasBudget(self, urlpatterns):
+        missing = url_names(urlpatterns) - set(self.budgets)
+        self.assertFalse(missing, f'URLs without a query budget: {sorted(missing)}')
+
+    def assertAdminBudgets(self, app_label, changelist_budget, change_budget):
+        """Changelist and change page of every model of ``app_label`` registered in the admin."""
+        for model in admin.site._registry:
+            if model._meta.app_label != app_label:
+                continue
+            opts = model._meta
+            self.assertQueryBudget(
+                f'admin:{opts.app_label}_{opts.model_name}_changelist', budget=changelist_budget, status=200,
+            )
+            obj = model._default_manager.order_by('pk').first()
+            if obj is not None:
+                self.assertQueryBudget(
+                    f'admin:{opts.app_label}_{opts.model_name}_change', args=[obj.pk],
+                    budget=change_budget, status=200,
+                )
+
+
+class QueryBudgetRunner(DiscoverRunner):
+    """``DiscoverRunner`` that reports the queries per endpoint after the run."""
+
+    def run_suite(self, suite, **kwargs):
+        result = super().run_suite(suite, **kwargs)
+        if report and self.verbosity > 0:
+            self._print_report()
+        path = os.getenv('QUERY_BUDGET_REPORT')
+        if path and report:
+            with open(path, 'w') as output:
+                json.dump([
+                    {'name': name, 'method': method, 'path': path, 'queries': queries, 'budget': budget}
+                    for name, method, path, queries, budget in report
+                ], output, indent=2)
+        return result
+
+    @staticmethod
+    def _print_report():
+        width = max(len(name) for name, *_ in report) + 2
+        print(f'\nQueries per endpoint ({len(report)} requests):')
+        print(f'{"endpoint":<{width}}{"method":<8}{"queries":>8}{"budget":>8}')
+        for name, method, _, queries, budget in sorted(report):
+            print(f'{name:<{width}}{method:<8}{queries:>8}{budget:>8}')
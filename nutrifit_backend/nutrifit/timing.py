@@ -0,0 +1,115 @@
+"""
+Per-request timing of SQL queries and LLM calls.
+
+``ServerTimingMiddleware`` installs a ``RequestTimings`` in a context
+variable for the duration of a request. A permanent execute wrapper on every
+database connection and ``llm_timer`` in ``GeminiService`` add to it. Being
+context-local, the timings follow the request into ``sync_to_async`` threads
+and async views. Outside a request both hooks only read the context
+variable.
+"""
+
+import heapq
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+
+
+MAX_SQL_LENGTH = 500
+
+
+class RequestTimings:
+    """Counters for one request; ``keep_queries`` > 0 also tracks the slowest queries."""
+
+    __slots__ = ('started', 'sql_count', 'sql_time', 'llm_count', 'llm_time', 'keep_queries', 'slowest', '_sequence')
+
+    def __init__(self, keep_queries=0):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.llm_count = 0
+        self.llm_time = 0.0
+        self.keep_queries = keep_queries
+        self.slowest = []  # min-heap of (duration, sequence, sql)
+        self._sequence = 0
+
+    def add_query(self, sql, duration):
+        self.sql_count += 1
+        self.sql_time += duration
+        if self.keep_queries:
+            self._sequence += 1
+            entry = (duration, self._sequence, sql)
+            if len(self.slowest) < self.keep_queries:
+                heapq.heappush(self.slowest, entry)
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def top_queries(self):
+        """Slowest queries first, as ``(milliseconds, sql)``."""
+        return [
+            (round(duration * 1000, 2), sql[:MAX_SQL_LENGTH])
+            for duration, _, sql in sorted(self.slowest, reverse=True)
+        ]
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+_current = ContextVar('request_timings', default=None)
+
+
+def start(keep_queries=0):
+    """Begin timing the current request."""
+    timings = RequestTimings(keep_queries)
+    _current.set(timings)
+    return timings
+
+
+def finish():
+    # Not ``ContextVar.reset``: under ASGI, MiddlewareMixin runs
+    # process_request and process_response in different contexts.
+    _current.set(None)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def llm_timer():
+    """Attribute the enclosed LLM call to the current request."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.llm_count += 1
+        timings.llm_time += time.perf_counter() - started
+
+
+def sql_timer(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` hook recording query count and time."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(sql, time.perf_counter() - started)
+
+
+def install_sql_timer(sender, connection, **kwargs):
+    # Outermost, so that ``connection.execute_wrapper()`` blocks, which pop
+    # the last wrapper on exit, never remove it.
+    if sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, sql_timer)
+
+
+connection_created.connect(install_sql_timer, dispatch_uid='nutrifit.timing.install_sql_timer')
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, MedicalCondition, UserPreferences, DietGoal
+from .models import UserProfile, MedicalCondition, UserPreferences, DietGoal, WeightEntry, WeightRollup
 
 
 @admin.register(UserProfile)
@@ -29,3 +29,18 @@ class DietGoalAdmin(admin.ModelAdmin):
     list_display = ('user', 'goal_type', 'calorie_target', 'is_active', 'created_at')
     list_filter = ('goal_type', 'is_active')
     search_fields = ('user__email',)
+
+
+@admin.register(WeightEntry)
+class WeightEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recorded_at', 'weight', 'body_fat', 'waist')
+    search_fields = ('user__email',)
+    list_select_related = ('user',)
+
+
+@admin.register(WeightRollup)
+class WeightRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'period', 'period_start', 'count', 'min_weight', 'max_weight', 'last_weight')
+    list_filter = ('period',)
+    search_fields = ('user__email',)
+    list_select_related = ('user',)
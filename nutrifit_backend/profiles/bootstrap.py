@@ -0,0 +1,83 @@
+"""
+Single-request dashboard bootstrap payload.
+
+Everything the dashboard needs on load is built with a fixed number of
+queries (user with profile and preferences, conditions, goals, recent
+plans and the latest plan's summary) and cached per user. The entry is
+invalidated through the user's ``nutrifit.cache`` token, which profile,
+preference, condition, goal and plan writes touch, and through the token
+of the latest plan, which item changes touch.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from accounts.serializers import UserSerializer
+from diet.management.serializers import DietPlanListSerializer
+from diet.models import DietPlan
+from diet.shopping import plan_token_key
+from diet.summaries import plan_summaries
+from nutrifit.cache import entry_timeout, get_tokens, user_token_key, versioned_key
+from .models import UserPreferences
+from .targets import active_goal_type, profile_targets
+from .serializers import (
+    UserProfileSerializer, MedicalConditionSerializer,
+    UserPreferencesSerializer, DietGoalSerializer
+)
+
+
+RECENT_PLAN_COUNT = 20  # the first page of the plan list
+CACHE_TIMEOUT = 60 * 60
+
+
+def build_bootstrap(user_id):
+    """
+    Build the payload for ``user_id``.
+
+    Returns ``(data, (plan_key, plan_token))`` where the pair identifies the
+    latest plan's token as read before its summary was computed.
+    """
+    user = get_user_model().objects.select_related('profile', 'preferences').get(pk=user_id)
+    # Missing reverse one-to-ones raise an AttributeError subclass.
+    profile = getattr(user, 'profile', None)
+    # Unsaved defaults instead of the get_or_create write the preferences view does.
+    preferences = getattr(user, 'preferences', None) or UserPreferences(user=user)
+
+    plans = list(
+        DietPlan.objects.filter(user_id=user_id)
+        .only(*DietPlanListSerializer.Meta.fields)
+        .order_by('-created_at')[:RECENT_PLAN_COUNT]
+    )
+    latest = (None, None)
+    summaries = []
+    if plans:
+        plan_key = plan_token_key(plans[0].pk)
+        latest = (plan_key, get_tokens([plan_key])[plan_key])
+        summaries = plan_summaries(DietPlan.objects.filter(pk=plans[0].pk))
+
+    goals = list(user.diet_goals.all())
+    data = {
+        'user': UserSerializer(user).data,
+        'profile': UserProfileSerializer(profile).data if profile else None,
+        'preferences': UserPreferencesSerializer(preferences).data,
+        'medical_conditions': MedicalConditionSerializer(user.medical_conditions.all(), many=True).data,
+        'diet_goals': DietGoalSerializer(goals, many=True).data,
+        'targets': profile_targets(profile, active_goal_type(goals)) if profile else None,
+        'recent_plans': DietPlanListSerializer(plans, many=True).data,
+        'latest_plan_summary': summaries[0] if summaries else None,
+    }
+    return data, latest
+
+
+def get_bootstrap(user):
+    """Cached ``build_bootstrap`` for ``user``."""
+    key = versioned_key(f'bootstrap:{user.pk}', [user_token_key(user.pk)])
+    entry = cache.get(key)
+    if entry is not None:
+        plan_key, plan_token = entry['plan']
+        if plan_key is None or get_tokens([plan_key])[plan_key] == plan_token:
+            return entry['data']
+
+    data, latest = build_bootstrap(user.pk)
+    cache.set(key, {'data': data, 'plan': latest}, entry_timeout(CACHE_TIMEOUT))
+    return data
@@ -0,0 +1,26 @@
+"""
+Management command to recompute weight rollups from the raw entries.
+"""
+
+from django.core.management.base import BaseCommand
+from profiles.models import WeightEntry
+from profiles.weights import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute day/week/month weight rollups (e.g. after entries were edited in the admin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the user with this email')
+
+    def handle(self, *args, **options):
+        entries = WeightEntry.objects.all()
+        if options['user']:
+            entries = entries.filter(user__email=options['user'])
+        user_ids = entries.order_by().values_list('user_id', flat=True).distinct()
+
+        users = rollups = 0
+        for user_id in user_ids.iterator():
+            rollups += rebuild_rollups(user_id)
+            users += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rollups} rollups for {users} users'))
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('profiles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeightRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0, help_text='Sum of weights, for the average')),
+                ('min_weight', models.FloatField()),
+                ('max_weight', models.FloatField()),
+                ('last_weight', models.FloatField(help_text='Latest weight recorded in the period')),
+                ('last_recorded_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weight_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'weight_rollups',
+            },
+        ),
+        migrations.CreateModel(
+            name='WeightEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recorded_at', models.DateTimeField()),
+                ('weight', models.DecimalField(decimal_places=2, help_text='Weight in kg', max_digits=5)),
+                ('body_fat', models.DecimalField(blank=True, decimal_places=1, help_text='Body fat in %', max_digits=4, null=True)),
+                ('waist', models.DecimalField(blank=True, decimal_places=1, help_text='Waist in cm', max_digits=5, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weight_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'weight_entries',
+                'ordering': ['-recorded_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='weightrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'period', 'period_start'), name='weight_rollups_user_period_start'),
+        ),
+        migrations.AddIndex(
+            model_name='weightentry',
+            index=models.Index(fields=['user', 'recorded_at'], name='weight_entries_user_recorded'),
+        ),
+    ]
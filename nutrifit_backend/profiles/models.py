@@ -143,3 +143,64 @@ class DietGoal(models.Model):
     
     def __str__(self):
         return f"{self.get_goal_type_display()} - {self.user.email}"
+
+
+class WeightEntry(models.Model):
+    """Append-only body-weight (and optional measurement) log."""
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='weight_entries'
+    )
+    recorded_at = models.DateTimeField()
+    weight = models.DecimalField(max_digits=5, decimal_places=2, help_text='Weight in kg')
+    body_fat = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True, help_text='Body fat in %')
+    waist = models.DecimalField(max_digits=5, decimal_places=1, null=True, blank=True, help_text='Waist in cm')
+    
+    class Meta:
+        db_table = 'weight_entries'
+        ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['user', 'recorded_at'], name='weight_entries_user_recorded'),
+        ]
+    
+    def __str__(self):
+        return f"{self.weight} kg at {self.recorded_at:%Y-%m-%d} - {self.user.email}"
+
+
+class WeightRollup(models.Model):
+    """Per-day/week/month weight statistics, updated on every new entry."""
+    
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='weight_rollups'
+    )
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0, help_text='Sum of weights, for the average')
+    min_weight = models.FloatField()
+    max_weight = models.FloatField()
+    last_weight = models.FloatField(help_text='Latest weight recorded in the period')
+    last_recorded_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'weight_rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period', 'period_start'], name='weight_rollups_user_period_start'),
+        ]
+    
+    def __str__(self):
+        return f"{self.period} of {self.period_start} - {self.user.email}"
+    
+    @property
+    def average(self):
+        return self.total / self.count if self.count else None
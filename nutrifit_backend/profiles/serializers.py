@@ -1,8 +1,9 @@
 from rest_framework import serializers
-from .models import UserProfile, MedicalCondition, UserPreferences, DietGoal
+from nutrifit.serializers import SparseFieldsetMixin
+from .models import UserProfile, MedicalCondition, UserPreferences, DietGoal, WeightEntry
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for UserProfile model."""
     
     email = serializers.EmailField(source='user.email', read_only=True)
@@ -13,9 +14,10 @@ class UserProfileSerializer(serializers.ModelSerializer):
         fields = ('user', 'email', 'age', 'weight', 'height', 'sex', 'activity_level', 
                   'bmi', 'created_at', 'updated_at')
         read_only_fields = ('user', 'created_at', 'updated_at')
+        sparse_dependencies = {'bmi': ('weight', 'height')}
 
 
-class MedicalConditionSerializer(serializers.ModelSerializer):
+class MedicalConditionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for MedicalCondition model."""
     
     class Meta:
@@ -24,7 +26,7 @@ class MedicalConditionSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'user', 'created_at')
 
 
-class UserPreferencesSerializer(serializers.ModelSerializer):
+class UserPreferencesSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for UserPreferences model."""
     
     class Meta:
@@ -34,7 +36,7 @@ class UserPreferencesSerializer(serializers.ModelSerializer):
         read_only_fields = ('user', 'updated_at')
 
 
-class DietGoalSerializer(serializers.ModelSerializer):
+class DietGoalSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for DietGoal model."""
     
     goal_type_display = serializers.CharField(source='get_goal_type_display', read_only=True)
@@ -44,3 +46,15 @@ class DietGoalSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'goal_type', 'goal_type_display', 'target_weight', 
                   'target_date', 'calorie_target', 'is_active', 'created_at')
         read_only_fields = ('id', 'user', 'created_at')
+        sparse_dependencies = {'goal_type_display': ('goal_type',)}
+
+
+class WeightEntrySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Serializer for WeightEntry model."""
+    
+    recorded_at = serializers.DateTimeField(required=False)
+    
+    class Meta:
+        model = WeightEntry
+        fields = ('id', 'recorded_at', 'weight', 'body_fat', 'waist')
+        read_only_fields = ('id',)
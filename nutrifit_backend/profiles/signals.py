@@ -0,0 +1,33 @@
+"""
+Signal handlers invalidating cached per-user data.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from nutrifit.cache import touch, user_token_key
+from .models import UserProfile, MedicalCondition, UserPreferences, DietGoal
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    """Invalidate cached data that includes the user's own fields, once committed."""
+    key = user_token_key(instance.pk)
+    transaction.on_commit(lambda: touch(key))
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=UserPreferences)
+@receiver(post_delete, sender=UserPreferences)
+@receiver(post_save, sender=MedicalCondition)
+@receiver(post_delete, sender=MedicalCondition)
+@receiver(post_save, sender=DietGoal)
+@receiver(post_delete, sender=DietGoal)
+def user_data_changed(sender, instance, **kwargs):
+    """Invalidate cached data built from the owner's profile records, once committed."""
+    key = user_token_key(instance.user_id)
+    transaction.on_commit(lambda: touch(key))
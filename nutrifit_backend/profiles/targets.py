@@ -0,0 +1,168 @@
+"""
+Metabolic targets (BMR, TDEE, calories and macros) for user profiles.
+
+Uses the Harris-Benedict equation with an activity multiplier and a
+goal-dependent calorie adjustment and macro split. ``get_targets`` caches
+the result per user until the profile or a goal changes; ``batch_targets``
+and ``all_user_targets`` compute targets for many users at once with NumPy.
+"""
+
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from nutrifit.cache import entry_timeout, user_token_key, versioned_key
+from .models import DietGoal, UserProfile
+
+
+try:
+    import numpy as np  # optional dependency
+except Exception:
+    np = None
+
+
+ACTIVITY_MULTIPLIERS = {
+    'sedentary': 1.2,
+    'light': 1.375,
+    'moderate': 1.55,
+    'active': 1.725,
+    'very_active': 1.9,
+}
+DEFAULT_ACTIVITY_MULTIPLIER = 1.55
+
+# goal_type -> (calorie adjustment, protein, carbs and fat share of calories)
+GOAL_ADJUSTMENTS = {
+    'lose_weight': (-500, 0.30, 0.35, 0.35),
+    'gain_weight': (300, 0.30, 0.45, 0.25),
+    'muscle_gain': (300, 0.30, 0.45, 0.25),
+}
+DEFAULT_GOAL_ADJUSTMENT = (0, 0.25, 0.45, 0.30)  # maintain or health_management
+
+# Harris-Benedict coefficients: constant, weight (kg), height (cm), age (years)
+MALE_BMR = (88.362, 13.397, 4.799, 5.677)
+FEMALE_BMR = (447.593, 9.247, 3.098, 4.330)
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def calculate_targets(age, weight, height, sex, activity_level, goal_type):
+    """Calorie and macro targets for one person."""
+    constant, per_kg, per_cm, per_year = MALE_BMR if sex == 'male' else FEMALE_BMR
+    bmr = constant + (per_kg * weight) + (per_cm * height) - (per_year * age)
+    tdee = bmr * ACTIVITY_MULTIPLIERS.get(activity_level, DEFAULT_ACTIVITY_MULTIPLIER)
+
+    adjustment, protein_ratio, carbs_ratio, fat_ratio = GOAL_ADJUSTMENTS.get(goal_type, DEFAULT_GOAL_ADJUSTMENT)
+    calories = tdee + adjustment
+
+    return {
+        'bmr': round(bmr, 1),
+        'tdee': round(tdee, 1),
+        'calories': int(calories),
+        'protein': int((calories * protein_ratio) / 4),  # 4 cal per gram
+        'carbs': int((calories * carbs_ratio) / 4),
+        'fat': int((calories * fat_ratio) / 9),  # 9 cal per gram
+    }
+
+
+def active_goal_type(goals):
+    """``goal_type`` of the newest active goal in ``goals``, if any."""
+    active = [goal for goal in goals if goal.is_active]
+    if not active:
+        return None
+    return max(active, key=lambda goal: goal.created_at).goal_type
+
+
+def profile_targets(profile, goal_type=None):
+    """Targets for a ``UserProfile`` and goal type."""
+    targets = calculate_targets(
+        profile.age, float(profile.weight), float(profile.height),
+        profile.sex, profile.activity_level, goal_type,
+    )
+    targets['goal_type'] = goal_type
+    return targets
+
+
+def get_targets(user):
+    """
+    Cached targets for ``user`` from their profile and active goal.
+
+    Returns ``None`` when the user has no profile yet. Profile and goal
+    writes touch the user's cache token, so the entry never goes stale.
+    """
+    key = versioned_key(f'targets:{user.pk}', [user_token_key(user.pk)])
+    targets = cache.get(key)
+    if targets is None:
+        profile = UserProfile.objects.filter(user_id=user.pk).first()
+        if profile is None:
+            return None
+        goal = DietGoal.objects.filter(user_id=user.pk, is_active=True).only('goal_type').first()
+        targets = profile_targets(profile, goal.goal_type if goal else None)
+        cache.set(key, targets, entry_timeout(CACHE_TIMEOUT))
+    return targets
+
+
+def batch_targets(age, weight, height, sex, activity_level, goal_type):
+    """
+    Vectorized ``calculate_targets``.
+
+    Every argument is a sequence with one entry per person; returns a dict
+    of NumPy arrays with the same keys as ``calculate_targets``.
+    """
+    if np is None:
+        raise Exception('numpy is not installed. Run `pip install numpy` to compute targets in batch.')
+    age = np.asarray(age, dtype=np.float64)
+    weight = np.asarray(weight, dtype=np.float64)
+    height = np.asarray(height, dtype=np.float64)
+    is_male = np.asarray(sex, dtype=object) == 'male'
+
+    male, female = np.asarray(MALE_BMR), np.asarray(FEMALE_BMR)
+    coefficients = np.where(is_male[:, None], male, female)
+    bmr = coefficients[:, 0] + coefficients[:, 1] * weight + coefficients[:, 2] * height - coefficients[:, 3] * age
+
+    multipliers = np.fromiter(
+        (ACTIVITY_MULTIPLIERS.get(level, DEFAULT_ACTIVITY_MULTIPLIER) for level in activity_level),
+        dtype=np.float64, count=len(age),
+    )
+    tdee = bmr * multipliers
+
+    adjustments = np.array(
+        [GOAL_ADJUSTMENTS.get(goal, DEFAULT_GOAL_ADJUSTMENT) for goal in goal_type], dtype=np.float64,
+    ).reshape(len(age), 4)
+    calories = tdee + adjustments[:, 0]
+
+    return {
+        'bmr': np.round(bmr, 1),
+        'tdee': np.round(tdee, 1),
+        'calories': np.trunc(calories).astype(np.int64),
+        'protein': np.trunc(calories * adjustments[:, 1] / 4).astype(np.int64),
+        'carbs': np.trunc(calories * adjustments[:, 2] / 4).astype(np.int64),
+        'fat': np.trunc(calories * adjustments[:, 3] / 9).astype(np.int64),
+    }
+
+
+def all_user_targets(profiles=None):
+    """
+    Targets for every profile in ``profiles`` (default: all) in one query.
+
+    Returns the ``batch_targets`` arrays plus ``user_id`` and ``goal_type``.
+    """
+    if profiles is None:
+        profiles = UserProfile.objects.all()
+    active_goal = (
+        DietGoal.objects.filter(user_id=OuterRef('user_id'), is_active=True)
+        .order_by('-created_at').values('goal_type')[:1]
+    )
+    rows = list(
+        profiles.annotate(goal_type=Subquery(active_goal))
+        .order_by('user_id')
+        .values_list('user_id', 'age', 'weight', 'height', 'sex', 'activity_level', 'goal_type')
+    )
+    if np is None:
+        raise Exception('numpy is not installed. Run `pip install numpy` to compute targets in batch.')
+    columns = list(zip(*rows)) if rows else [()] * 7
+    user_ids, age, weight, height, sex, activity_level, goal_type = columns
+
+    targets = batch_targets(age, [float(value) for value in weight], [float(value) for value in height],
+                            sex, activity_level, goal_type)
+    targets['user_id'] = np.asarray(user_ids, dtype=np.int64)
+    targets['goal_type'] = np.asarray(goal_type, dtype=object)
+    return targets
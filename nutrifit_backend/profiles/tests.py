@@ -1,3 +1,364 @@
-from django.test import TestCase
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from diet.models import DietPlan, DietPlanItem, Ingredient
+from nutrifit import routers
+from nutrifit.testing import QueryBudgetMixin, build_fixture
+from profiles import urls
+from profiles.bootstrap import get_bootstrap
+from profiles.models import (
+    DietGoal, MedicalCondition, UserPreferences, UserProfile, WeightEntry, WeightRollup,
+)
+from profiles.targets import all_user_targets, batch_targets, calculate_targets
+from profiles.weights import rebuild_rollups, record_weight
+
+
+class ProfilesQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every profiles endpoint within a fixed number of queries, for a user with 60 weight entries."""
+
+    budgets = {
+        'profile-detail': {'GET': 3, 'PATCH': 4},
+        'profile-bootstrap': 6,
+        'profile-targets': 3,
+        'profile-create': 2,
+        'medical-condition-list': {'GET': 3, 'POST': 2},
+        'medical-condition-detail': {'GET': 2, 'PATCH': 3, 'DELETE': 3},
+        'preferences': {'GET': 2, 'PUT': 3},
+        'diet-goal-list': {'GET': 3, 'POST': 2},
+        'diet-goal-detail': {'GET': 2, 'PATCH': 3, 'DELETE': 4},
+        # Entry, three rollups (update, or savepoint + insert) and the profile weight.
+        'weight-entry-list': {'GET': 3, 'POST': 15},
+        'weight-history': 3,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture()
+        cls.user = cls.fixture['user']
+        cls.goal = cls.fixture['goals'][0]
+        cls.condition = cls.user.medical_conditions.first()
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.user)
+
+    def test_every_url_has_a_budget(self):
+        self.assertEveryURLHasBudget(urls.urlpatterns)
+
+    def test_profile(self):
+        self.assertQueryBudget('profile-detail', status=200)
+        self.assertQueryBudget('profile-detail', 'patch', data={'weight': '79.5'}, format='json', status=200)
+        self.assertQueryBudget('profile-bootstrap', status=200)
+        self.assertQueryBudget('profile-targets', status=200)
+
+    def test_profile_create(self):
+        self.authenticate(get_user_model().objects.create_user(email='new@example.com', password='New-pass-123'))
+        profile = {'age': 28, 'weight': '62', 'height': '168', 'sex': 'female', 'activity_level': 'light'}
+        self.assertQueryBudget('profile-create', 'post', data=profile, format='json', status=201)
+
+    def test_medical_conditions(self):
+        self.assertQueryBudget('medical-condition-list', status=200)
+        self.assertQueryBudget(
+            'medical-condition-list', 'post', data={'condition_name': 'celiac'}, format='json', status=201,
+        )
+        self.assertQueryBudget('medical-condition-detail', args=[self.condition.pk], status=200)
+        self.assertQueryBudget(
+            'medical-condition-detail', 'patch', args=[self.condition.pk], data={'severity': 'mild'},
+            format='json', status=200,
+        )
+        self.assertQueryBudget('medical-condition-detail', 'delete', args=[self.condition.pk], status=204)
+
+    def test_preferences(self):
+        self.assertQueryBudget('preferences', status=200)
+        preferences = {'dietary_type': 'vegetarian', 'allergies': ['peanuts'], 'disliked_foods': []}
+        self.assertQueryBudget('preferences', 'put', data=preferences, format='json', status=200)
+
+    def test_diet_goals(self):
+        self.assertQueryBudget('diet-goal-list', status=200)
+        goal = {'goal_type': 'maintain', 'calorie_target': 2200}
+        self.assertQueryBudget('diet-goal-list', 'post', data=goal, format='json', status=201)
+        self.assertQueryBudget('diet-goal-detail', args=[self.goal.pk], status=200)
+        self.assertQueryBudget(
+            'diet-goal-detail', 'patch', args=[self.goal.pk], data={'calorie_target': 2100}, format='json', status=200,
+        )
+        self.assertQueryBudget('diet-goal-detail', 'delete', args=[self.goal.pk], status=204)
+
+    def test_weight(self):
+        self.assertQueryBudget('weight-entry-list', status=200)
+        self.assertQueryBudget('weight-entry-list', 'post', data={'weight': '78.4'}, format='json', status=201)
+        self.assertQueryBudget('weight-history', status=200)
+        self.assertQueryBudget('weight-history', path='/api/weight-entries/history/?points=10', status=200)
+
+
+class BootstrapTests(TestCase):
+    """The dashboard payload carries the right values and follows profile and plan changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='bootstrap@example.com', password='boot-pass-123')
+        UserProfile.objects.create(user=cls.user, age=30, weight=70, height=175, sex='male', activity_level='moderate')
+        UserPreferences.objects.create(user=cls.user, dietary_type='vegetarian', allergies=['peanuts'])
+        MedicalCondition.objects.create(user=cls.user, condition_name='hypertension', severity='mild')
+        DietGoal.objects.create(user=cls.user, goal_type='lose_weight', calorie_target=2100)
+        cls.rice = Ingredient.objects.create(
+            name='Bootstrap rice', category='grains', calories_per_100g=130, protein_per_100g='2.7',
+            carbs_per_100g=28, fat_per_100g='0.3',
+        )
+        cls.older, cls.latest = [
+            DietPlan.objects.create(
+                user=cls.user, plan_name=name, ai_description='', total_calories=2000, total_protein=150,
+                total_carbs=200, total_fat=60,
+            )
+            for name in ('Older plan', 'Latest plan')
+        ]
+        DietPlan.objects.filter(pk=cls.older.pk).update(created_at=timezone.now() - timedelta(days=1))
+        DietPlanItem.objects.create(diet_plan=cls.latest, ingredient=cls.rice, quantity_grams=200, meal_type='lunch')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self):
+        response = self.client.get(reverse('profile-bootstrap'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_payload(self):
+        data = self.get()
+        self.assertEqual(data['user']['email'], 'bootstrap@example.com')
+        self.assertEqual((data['profile']['weight'], data['profile']['bmi']), ('70.00', '22.86'))
+        self.assertEqual((data['preferences']['dietary_type'], data['preferences']['allergies']),
+                         ('vegetarian', ['peanuts']))
+        self.assertEqual([condition['condition_name'] for condition in data['medical_conditions']], ['hypertension'])
+        self.assertEqual([goal['goal_type'] for goal in data['diet_goals']], ['lose_weight'])
+        self.assertEqual(data['targets'], {
+            'bmr': 1695.7, 'tdee': 2628.3, 'calories': 2128, 'protein': 159, 'carbs': 186, 'fat': 82,
+            'goal_type': 'lose_weight',
+        })
+        self.assertEqual([plan['plan_name'] for plan in data['recent_plans']], ['Latest plan', 'Older plan'])
+        self.assertEqual(data['latest_plan_summary']['id'], self.latest.pk)
+        self.assertEqual(data['latest_plan_summary']['totals'],
+                         {'calories': 260.0, 'protein': 5.4, 'carbs': 56.0, 'fat': 0.6})
+
+    def test_new_user(self):
+        user = get_user_model().objects.create_user(email='bootstrap-new@example.com', password='boot-pass-123')
+        self.client.force_authenticate(user)
+        data = self.get()
+        self.assertEqual((data['profile'], data['targets'], data['latest_plan_summary']), (None, None, None))
+        self.assertEqual((data['recent_plans'], data['diet_goals']), ([], []))
+        self.assertEqual(data['preferences']['dietary_type'], 'none')
+        # The defaults are shown without being saved.
+        self.assertFalse(UserPreferences.objects.filter(user=user).exists())
+
+    def test_cached_until_changed(self):
+        self.get()
+        with self.assertNumQueries(0):
+            get_bootstrap(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DietPlanItem.objects.create(diet_plan=self.latest, ingredient=self.rice, quantity_grams=100,
+                                        meal_type='dinner')
+        self.assertEqual(self.get()['latest_plan_summary']['totals']['calories'], 390.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = UserProfile.objects.get(user=self.user)
+            profile.weight = 80
+            profile.save()
+        data = self.get()
+        self.assertEqual((data['profile']['weight'], data['targets']['bmr']), ('80.00', 1829.6))
+
+
+class TargetsTests(TestCase):
+    """Harris-Benedict targets, their vectorized version and the cached endpoint."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='targets@example.com', password='targets-pass-123')
+        UserProfile.objects.create(user=cls.user, age=25, weight=60, height=165, sex='female', activity_level='light')
+        DietGoal.objects.create(user=cls.user, goal_type='lose_weight', calorie_target=1800, is_active=False)
+        DietGoal.objects.create(user=cls.user, goal_type='gain_weight', calorie_target=2200)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_calculate_targets(self):
+        self.assertEqual(calculate_targets(30, 70, 175, 'male', 'moderate', 'lose_weight'), {
+            'bmr': 1695.7, 'tdee': 2628.3, 'calories': 2128, 'protein': 159, 'carbs': 186, 'fat': 82,
+        })
+        self.assertEqual(calculate_targets(25, 60, 165, 'female', 'light', 'gain_weight'), {
+            'bmr': 1405.3, 'tdee': 1932.3, 'calories': 2232, 'protein': 167, 'carbs': 251, 'fat': 62,
+        })
+        # Unknown activity levels count as moderate; no goal means maintenance.
+        self.assertEqual(calculate_targets(40, 90, 180, 'male', None, None)['calories'], 2992)
+
+    def test_batch_matches_scalar(self):
+        people = [
+            (30, 70.0, 175.0, 'male', 'moderate', 'lose_weight'),
+            (25, 60.0, 165.0, 'female', 'light', 'gain_weight'),
+            (40, 90.0, 180.0, 'male', 'unknown', None),
+            (65, 55.5, 158.2, 'female', 'very_active', 'muscle_gain'),
+        ]
+        batch = batch_targets(*zip(*people))
+        for index, person in enumerate(people):
+            self.assertEqual({key: batch[key][index].item() for key in batch}, calculate_targets(*person))
+
+    def test_all_user_targets(self):
+        other = get_user_model().objects.create_user(email='targets-other@example.com', password='targets-pass-123')
+        UserProfile.objects.create(user=other, age=30, weight=70, height=175, sex='male', activity_level='moderate')
+        targets = all_user_targets()
+        self.assertEqual(targets['user_id'].tolist(), [self.user.pk, other.pk])
+        # The inactive goal is ignored.
+        self.assertEqual(targets['goal_type'].tolist(), ['gain_weight', None])
+        self.assertEqual(targets['calories'].tolist(), [2232, 2628])
+
+    def test_endpoint(self):
+        response = self.client.get(reverse('profile-targets'))
+        self.assertEqual(response.json(), {
+            'bmr': 1405.3, 'tdee': 1932.3, 'calories': 2232, 'protein': 167, 'carbs': 251, 'fat': 62,
+            'goal_type': 'gain_weight',
+        })
+        with self.captureOnCommitCallbacks(execute=True):
+            DietGoal.objects.filter(user=self.user).update(is_active=False)
+            DietGoal.objects.create(user=self.user, goal_type='maintain', calorie_target=2000)
+        response = self.client.get(reverse('profile-targets'))
+        self.assertEqual((response.json()['goal_type'], response.json()['calories']), ('maintain', 1932))
+
+    def test_no_profile(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(email='targets-new@example.com', password='targets-pass-123'),
+        )
+        self.assertEqual(self.client.get(reverse('profile-targets')).status_code, 404)
+
+
+class WeightHistoryTests(TestCase):
+    """Weight series from the rollups, their rebuild and the query validation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='weights@example.com', password='weights-pass-123')
+        for day, hour, weight in ((4, 8, '80.0'), (4, 20, '79.0'), (6, 8, '78.5'), (12, 8, '78.0')):
+            record_weight(cls.user, Decimal(weight), timezone.make_aware(datetime(2024, 3, day, hour)))
+        record_weight(cls.user, Decimal('77.0'), timezone.make_aware(datetime(2024, 4, 2, 8)))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def history(self, **params):
+        response = self.client.get(reverse('weight-history'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def rollups(self):
+        return list(
+            WeightRollup.objects.filter(user=self.user).order_by('period', 'period_start')
+            .values_list('period', 'period_start', 'count', 'total', 'min_weight', 'max_weight', 'last_weight')
+        )
+
+    def test_daily(self):
+        data = self.history(start='2024-03-01', end='2024-03-31')
+        self.assertEqual(data['granularity'], 'day')
+        self.assertEqual(data['points'], [
+            {'start': '2024-03-04', 'count': 2, 'average': 79.5, 'min': 79.0, 'max': 80.0, 'last': 79.0},
+            {'start': '2024-03-06', 'count': 1, 'average': 78.5, 'min': 78.5, 'max': 78.5, 'last': 78.5},
+            {'start': '2024-03-12', 'count': 1, 'average': 78.0, 'min': 78.0, 'max': 78.0, 'last': 78.0},
+        ])
+
+    def test_coarser_granularities(self):
+        data = self.history(start='2024-03-01', end='2024-04-30', points=10)
+        self.assertEqual(data['granularity'], 'week')
+        self.assertEqual([(point['start'], point['average'], point['min'], point['max'], point['last'])
+                          for point in data['points']], [
+            ('2024-03-04', 79.17, 78.5, 80.0, 78.5),
+            ('2024-03-11', 78.0, 78.0, 78.0, 78.0),
+            ('2024-04-01', 77.0, 77.0, 77.0, 77.0),
+        ])
+        data = self.history(start='2024-03-01', end='2024-04-30', points=1)
+        self.assertEqual(data['granularity'], '2 months')
+        self.assertEqual(data['points'], [
+            {'start': '2024-03-01', 'count': 5, 'average': 78.5, 'min': 77.0, 'max': 80.0, 'last': 77.0},
+        ])
+
+    def test_rebuild(self):
+        incremental = self.rollups()
+        self.assertEqual(rebuild_rollups(self.user.pk), len(incremental))
+        self.assertEqual(self.rollups(), incremental)
+
+        # Entries are append-only; deletions are folded in by a rebuild.
+        WeightEntry.objects.filter(user=self.user, weight=Decimal('80.0')).delete()
+        rebuild_rollups(self.user.pk)
+        data = self.history(start='2024-03-01', end='2024-04-30', points=10)
+        self.assertEqual(data['points'][0], {
+            'start': '2024-03-04', 'count': 2, 'average': 78.75, 'min': 78.5, 'max': 79.0, 'last': 78.5,
+        })
+        month = self.history(start='2024-03-01', end='2024-03-31', points=1)['points']
+        self.assertEqual((month[0]['count'], month[0]['max']), (3, 79.0))
+
+    def test_invalid_parameters(self):
+        for params, error in (
+            ({'start': 'abc'}, 'start must be a date in YYYY-MM-DD format'),
+            ({'end': 'abc'}, 'end must be a date in YYYY-MM-DD format'),
+            ({'end': '2024-02-30'}, 'end must be a date in YYYY-MM-DD format'),
+            ({'start': '2024-04-01', 'end': '2024-03-01'}, 'start must not be after end'),
+            ({'points': 'abc'}, 'points must be an integer between 1 and 1000'),
+            ({'points': '0'}, 'points must be an integer between 1 and 1000'),
+            ({'points': '1001'}, 'points must be an integer between 1 and 1000'),
+        ):
+            response = self.client.get(reverse('weight-history'), params)
+            self.assertEqual((response.status_code, response.json()), (400, {'error': error}), params)
+
+
+@override_settings(REPLICA_STICKY_SECONDS=5, CACHE_SHARED=False)
+class ReplicaPinTests(SimpleTestCase):
+    """Read-your-writes pins travel with the client unless the cache is shared."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pin_token(self):
+        token = routers.pin_user(1)
+        self.assertTrue(routers.is_user_pinned(1, token))
+        self.assertFalse(routers.is_user_pinned(2, token))
+        self.assertFalse(routers.is_user_pinned(1, token + 'x'))
+        # Without a shared cache, nothing is stored in this process.
+        self.assertFalse(routers.is_user_pinned(1))
+
+    def test_pin_expires(self):
+        token = routers.pin_user(1)
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 6):
+            self.assertFalse(routers.is_user_pinned(1, token))
+
+    @override_settings(CACHE_SHARED=True)
+    def test_shared_cache_pin(self):
+        routers.pin_user(1)
+        self.assertTrue(routers.is_user_pinned(1))
+
+    @override_settings(REPLICA_STICKY_SECONDS=0)
+    def test_stickiness_off(self):
+        self.assertIsNone(routers.pin_user(1))
+
+
+class ProfilesAdminQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Admin pages of the profiles models."""
+
+    @classmethod
+    def setUpTestData(cls):
+        build_fixture()
+        build_fixture(email='second@example.com')
+        cls.admin = get_user_model().objects.create_superuser(email='admin@example.com', password='admin-pass-123')
+
+    def test_admin_pages(self):
+        self.client.force_login(self.admin)
+        self.assertAdminBudgets('profiles', changelist_budget=6, change_budget=8)
@@ -3,15 +3,21 @@ from .views import (
     UserProfileView, UserProfileCreateView,
     MedicalConditionListCreateView, MedicalConditionDetailView,
     UserPreferencesView,
-    DietGoalListCreateView, DietGoalDetailView
+    DietGoalListCreateView, DietGoalDetailView,
+    bootstrap, my_targets,
+    WeightEntryListCreateView, weight_history
 )
 
 urlpatterns = [
     path('profiles/me/', UserProfileView.as_view(), name='profile-detail'),
+    path('profiles/me/bootstrap/', bootstrap, name='profile-bootstrap'),
+    path('profiles/me/targets/', my_targets, name='profile-targets'),
     path('profiles/', UserProfileCreateView.as_view(), name='profile-create'),
     path('medical-conditions/', MedicalConditionListCreateView.as_view(), name='medical-condition-list'),
     path('medical-conditions/<int:pk>/', MedicalConditionDetailView.as_view(), name='medical-condition-detail'),
     path('preferences/', UserPreferencesView.as_view(), name='preferences'),
     path('diet-goals/', DietGoalListCreateView.as_view(), name='diet-goal-list'),
+    path('weight-entries/', WeightEntryListCreateView.as_view(), name='weight-entry-list'),
+    path('weight-entries/history/', weight_history, name='weight-history'),
     path('diet-goals/<int:pk>/', DietGoalDetailView.as_view(), name='diet-goal-detail'),
 ]
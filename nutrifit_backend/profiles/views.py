@@ -1,11 +1,19 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import UserProfile, MedicalCondition, UserPreferences, DietGoal
+from rest_framework.decorators import api_view, permission_classes
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+from nutrifit.serializers import SparseQuerysetMixin
+from .bootstrap import get_bootstrap
+from .targets import get_targets
+from .models import UserProfile, MedicalCondition, UserPreferences, DietGoal, WeightEntry
 from .serializers import (
     UserProfileSerializer, MedicalConditionSerializer,
-    UserPreferencesSerializer, DietGoalSerializer
+    UserPreferencesSerializer, DietGoalSerializer, WeightEntrySerializer
 )
+from .weights import DEFAULT_POINTS, MAX_POINTS, record_weight, weight_series
 
 
 class UserProfileView(generics.RetrieveUpdateAPIView):
@@ -31,7 +39,7 @@ class UserProfileCreateView(generics.CreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class MedicalConditionListCreateView(generics.ListCreateAPIView):
+class MedicalConditionListCreateView(SparseQuerysetMixin, generics.ListCreateAPIView):
     """List or create medical conditions."""
     
     serializer_class = MedicalConditionSerializer
@@ -44,7 +52,7 @@ class MedicalConditionListCreateView(generics.ListCreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class MedicalConditionDetailView(generics.RetrieveUpdateDestroyAPIView):
+class MedicalConditionDetailView(SparseQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a medical condition."""
     
     serializer_class = MedicalConditionSerializer
@@ -67,7 +75,7 @@ class UserPreferencesView(generics.RetrieveUpdateAPIView):
         return preferences
 
 
-class DietGoalListCreateView(generics.ListCreateAPIView):
+class DietGoalListCreateView(SparseQuerysetMixin, generics.ListCreateAPIView):
     """List or create diet goals."""
     
     serializer_class = DietGoalSerializer
@@ -80,7 +88,7 @@ class DietGoalListCreateView(generics.ListCreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class DietGoalDetailView(generics.RetrieveUpdateDestroyAPIView):
+class DietGoalDetailView(SparseQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a diet goal."""
     
     serializer_class = DietGoalSerializer
@@ -88,3 +96,69 @@ class DietGoalDetailView(generics.RetrieveUpdateDestroyAPIView):
     
     def get_queryset(self):
         return DietGoal.objects.filter(user=self.request.user)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def bootstrap(request):
+    """Everything the dashboard needs on load, in one read-only request."""
+    
+    return Response(get_bootstrap(request.user))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def my_targets(request):
+    """BMR, TDEE and daily calorie/macro targets from the profile and active goal."""
+    
+    targets = get_targets(request.user)
+    if targets is None:
+        return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(targets)
+
+
+class WeightEntryListCreateView(SparseQuerysetMixin, generics.ListCreateAPIView):
+    """List or record weight entries (entries are append-only)."""
+    
+    serializer_class = WeightEntrySerializer
+    permission_classes = (IsAuthenticated,)
+    
+    def get_queryset(self):
+        return WeightEntry.objects.filter(user=self.request.user)
+    
+    def perform_create(self, serializer):
+        serializer.instance = record_weight(self.request.user, **serializer.validated_data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def weight_history(request):
+    """Downsampled weight series for ?start=&end= (YYYY-MM-DD, default: last year)."""
+    
+    params = request.query_params
+    dates = {}
+    for name in ('start', 'end'):
+        value = params.get(name)
+        try:
+            dates[name] = parse_date(value) if value else None
+        except ValueError:
+            dates[name] = None
+        if value and dates[name] is None:
+            return Response({
+                'error': f'{name} must be a date in YYYY-MM-DD format'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    end = dates['end'] or timezone.localdate()
+    start = dates['start'] or end - timedelta(days=365)
+    if start > end:
+        return Response({'error': 'start must not be after end'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        points = int(params.get('points', DEFAULT_POINTS))
+    except ValueError:
+        points = None
+    if points is None or not 1 <= points <= MAX_POINTS:
+        return Response({
+            'error': f'points must be an integer between 1 and {MAX_POINTS}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(weight_series(request.user, start, end, points))
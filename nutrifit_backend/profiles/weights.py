@@ -0,0 +1,163 @@
+"""
+Body-weight history with incrementally maintained rollups.
+
+Every new ``WeightEntry`` updates the matching day, week and month
+``WeightRollup`` rows in the same transaction, so reading a chart never
+aggregates raw entries. ``weight_series`` picks the finest granularity
+that fits the requested number of points, which bounds the rows read
+regardless of how long the history is.
+"""
+
+from datetime import timedelta
+from itertools import groupby
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from nutrifit.cache import touch, user_token_key
+from nutrifit.db import serialized_write
+from .models import DietGoal, UserProfile, WeightEntry, WeightRollup
+
+
+PERIODS = ('day', 'week', 'month')
+DEFAULT_POINTS = 120
+MAX_POINTS = 1000
+
+
+def period_start(day, period):
+    """First day of the day/week (Monday)/month containing ``day``."""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _period_count(start, end, period):
+    if period == 'day':
+        return (end - start).days + 1
+    if period == 'week':
+        return (period_start(end, 'week') - period_start(start, 'week')).days // 7 + 1
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def _add_to_rollup(user_id, period, start, weight, recorded_at):
+    rollups = WeightRollup.objects.filter(user_id=user_id, period=period, period_start=start)
+    updated = rollups.update(
+        count=F('count') + 1,
+        total=F('total') + weight,
+        min_weight=Least('min_weight', Value(weight)),
+        max_weight=Greatest('max_weight', Value(weight)),
+        last_weight=Case(When(last_recorded_at__lte=recorded_at, then=Value(weight)), default=F('last_weight')),
+        last_recorded_at=Greatest('last_recorded_at', Value(recorded_at)),
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            WeightRollup.objects.create(
+                user_id=user_id, period=period, period_start=start, count=1, total=weight,
+                min_weight=weight, max_weight=weight, last_weight=weight, last_recorded_at=recorded_at,
+            )
+    except IntegrityError:
+        # Another request created the row first; fold this entry into it.
+        _add_to_rollup(user_id, period, start, weight, recorded_at)
+
+
+def record_weight(user, weight, recorded_at=None, body_fat=None, waist=None):
+    """
+    Append a weight entry and fold it into the user's rollups.
+
+    If the entry is the newest one, the profile weight is updated too so
+    targets follow the latest measurement.
+    """
+    recorded_at = recorded_at or timezone.now()
+    day = timezone.localdate(recorded_at)
+    with serialized_write():
+        entry = WeightEntry.objects.create(
+            user=user, recorded_at=recorded_at, weight=weight, body_fat=body_fat, waist=waist,
+        )
+        for period in PERIODS:
+            _add_to_rollup(user.pk, period, period_start(day, period), float(weight), recorded_at)
+        is_newest = not WeightEntry.objects.filter(user=user, recorded_at__gt=recorded_at).exists()
+        if is_newest and UserProfile.objects.filter(user=user).update(weight=weight, updated_at=timezone.now()):
+            transaction.on_commit(lambda: touch(user_token_key(user.pk)))
+    return entry
+
+
+def rebuild_rollups(user_id):
+    """Recompute all rollups of a user from the raw entries."""
+    rollups = {}
+    entries = WeightEntry.objects.filter(user_id=user_id).order_by('recorded_at').values_list('recorded_at', 'weight')
+    for recorded_at, weight in entries.iterator():
+        weight = float(weight)
+        day = timezone.localdate(recorded_at)
+        for period in PERIODS:
+            key = (period, period_start(day, period))
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollups[key] = WeightRollup(
+                    user_id=user_id, period=period, period_start=key[1], count=1, total=weight,
+                    min_weight=weight, max_weight=weight, last_weight=weight, last_recorded_at=recorded_at,
+                )
+                continue
+            rollup.count += 1
+            rollup.total += weight
+            rollup.min_weight = min(rollup.min_weight, weight)
+            rollup.max_weight = max(rollup.max_weight, weight)
+            rollup.last_weight = weight
+            rollup.last_recorded_at = recorded_at
+    with transaction.atomic():
+        WeightRollup.objects.filter(user_id=user_id).delete()
+        WeightRollup.objects.bulk_create(rollups.values(), batch_size=1000)
+    return len(rollups)
+
+
+def _merge(rollups):
+    """Combine consecutive rollups into one point."""
+    count = sum(rollup.count for rollup in rollups)
+    return {
+        'start': rollups[0].period_start,
+        'count': count,
+        'average': round(sum(rollup.total for rollup in rollups) / count, 2),
+        'min': min(rollup.min_weight for rollup in rollups),
+        'max': max(rollup.max_weight for rollup in rollups),
+        'last': rollups[-1].last_weight,
+    }
+
+
+def weight_series(user, start, end, points=DEFAULT_POINTS):
+    """
+    Weight history between the dates ``start`` and ``end`` (inclusive).
+
+    Uses the finest of day/week/month whose bucket count fits ``points``;
+    longer ranges of months are merged into evenly sized groups. At most
+    ``points`` buckets are returned.
+    """
+    points = max(1, min(points, MAX_POINTS))
+    period = next(
+        (candidate for candidate in PERIODS if _period_count(start, end, candidate) <= points),
+        'month',
+    )
+    rollups = list(
+        WeightRollup.objects.filter(
+            user=user, period=period,
+            period_start__gte=period_start(start, period), period_start__lte=end,
+        ).order_by('period_start')
+    )
+
+    first = period_start(start, period)
+    group = max(1, -(-_period_count(start, end, period) // points))
+    buckets = groupby(rollups, key=lambda rollup: (_period_count(first, rollup.period_start, period) - 1) // group)
+    series = [_merge(list(bucket)) for _, bucket in buckets]
+
+    goal = DietGoal.objects.filter(user=user, is_active=True).exclude(target_weight=None).only('target_weight').first()
+    return {
+        'start': start,
+        'end': end,
+        'granularity': period if group == 1 else f'{group} {period}s',
+        'target_weight': goal.target_weight if goal else None,
+        'points': series,
+    }
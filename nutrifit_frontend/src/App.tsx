@@ -1,32 +1,12 @@
-import { useState, useEffect } from 'react';
 import { AuthProvider, useAuth } from './contexts/AuthContext';
 import { Auth } from './components/Auth';
 import { Onboarding } from './components/Onboarding';
 import { Dashboard } from './components/Dashboard';
-import { profileAPI } from './lib/api';
 
 function AppContent() {
-  const { user, loading } = useAuth();
-  const [hasProfile, setHasProfile] = useState<boolean | null>(null);
+  const { user, loading, bootstrap, refreshBootstrap } = useAuth();
 
-  useEffect(() => {
-    if (user) {
-      checkProfile();
-    } else {
-      setHasProfile(null);
-    }
-  }, [user]);
-
-  const checkProfile = async () => {
-    try {
-      await profileAPI.getProfile();
-      setHasProfile(true);
-    } catch (error) {
-      setHasProfile(false);
-    }
-  };
-
-  if (loading || (user && hasProfile === null)) {
+  if (loading || (user && !bootstrap)) {
     return (
       <div className="min-h-screen bg-gradient-to-br from-emerald-50 via-teal-50 to-cyan-50 flex items-center justify-center">
         <div className="text-center">
@@ -41,8 +21,8 @@ function AppContent() {
     return <Auth />;
   }
 
-  if (!hasProfile) {
-    return <Onboarding onComplete={() => setHasProfile(true)} />;
+  if (!bootstrap?.profile) {
+    return <Onboarding onComplete={refreshBootstrap} />;
   }
 
   return <Dashboard />;
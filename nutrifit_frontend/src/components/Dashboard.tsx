@@ -1,38 +1,23 @@
-import { useState, useEffect } from 'react';
+import { useState } from 'react';
 import { useAuth } from '../contexts/AuthContext';
-import { profileAPI, dietPlansAPI } from '../lib/api';
 import { LogOut, PlusCircle, BookOpen, MessageSquare } from 'lucide-react';
 import { DietPlanGenerator } from './DietPlanGenerator';
 import { DietPlanView } from './DietPlanView';
 import { NaturalLanguageInput } from './NaturalLanguageInput';
 
 export function Dashboard() {
-  const { user, signOut } = useAuth();
-  const [profile, setProfile] = useState(null);
-  const [dietPlans, setDietPlans] = useState([]);
+  const { bootstrap, refreshBootstrap, signOut } = useAuth();
   const [selectedPlan, setSelectedPlan] = useState(null);
   const [view, setView] = useState('home'); // 'home' | 'generate' | 'view' | 'nl-input'
-  const [loading, setLoading] = useState(true);
-
-  useEffect(() => {
-    loadData();
-  }, [user]);
+  // Profile and plans come from the bootstrap loaded at sign-in.
+  const profile = bootstrap?.profile ?? null;
+  const dietPlans = bootstrap?.recent_plans ?? [];
 
   const loadData = async () => {
     try {
-      const profileData = await profileAPI.getProfile();
-      setProfile(profileData || null);
-
-      const plansData = await dietPlansAPI.list();
-      const plansList = Array.isArray(plansData)
-        ? plansData
-        : plansData?.results || [];
-
-      setDietPlans(plansList);
+      await refreshBootstrap();
     } catch (error) {
       console.error('Error loading data:', error);
-    } finally {
-      setLoading(false);
     }
   };
 
@@ -42,17 +27,6 @@ export function Dashboard() {
     setView('view');
   };
 
-  if (loading) {
-    return (
-      <div className="min-h-screen bg-gradient-to-br from-emerald-50 via-teal-50 to-cyan-50 flex items-center justify-center">
-        <div className="text-center">
-          <div className="inline-block animate-spin rounded-full h-12 w-12 border-b-2 border-emerald-600"></div>
-          <p className="mt-4 text-gray-600">Loading...</p>
-        </div>
-      </div>
-    );
-  }
-
   if (view === 'generate') {
     return (
       <DietPlanGenerator
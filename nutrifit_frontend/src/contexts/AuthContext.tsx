@@ -1,5 +1,6 @@
 import { createContext, useContext, useEffect, useState, ReactNode } from 'react';
 import { authAPI, profileAPI } from '../lib/api';
+import type { Bootstrap } from '../types';
 
 interface User {
   id: number;
@@ -11,6 +12,9 @@ interface User {
 interface AuthContextType {
   user: User | null;
   loading: boolean;
+  // Everything the dashboard needs, loaded with a single request.
+  bootstrap: Bootstrap | null;
+  refreshBootstrap: () => Promise<Bootstrap>;
   signUp: (email: string, password: string) => Promise<void>;
   signIn: (email: string, password: string) => Promise<void>;
   signOut: () => Promise<void>;
@@ -20,6 +24,7 @@ const AuthContext = createContext<AuthContextType | undefined>(undefined);
 
 export function AuthProvider({ children }: { children: ReactNode }) {
   const [user, setUser] = useState<User | null>(null);
+  const [bootstrap, setBootstrap] = useState<Bootstrap | null>(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -27,22 +32,26 @@ export function AuthProvider({ children }: { children: ReactNode }) {
     checkAuth();
   }, []);
 
+  const refreshBootstrap = async () => {
+    const data: Bootstrap = await profileAPI.bootstrap();
+    setBootstrap(data);
+    return data;
+  };
+
   const checkAuth = async () => {
     try {
       const token = localStorage.getItem('access_token');
       if (token) {
-        // Try to get current user profile
-        const profile = await profileAPI.getProfile();
-        setUser({
-          id: profile.user,
-          email: profile.email,
-        });
+        // Load the user, profile and recent plans in one request
+        const data = await refreshBootstrap();
+        setUser(data.user);
       }
     } catch (error) {
       // Token invalid or expired, clear it
       localStorage.removeItem('access_token');
       localStorage.removeItem('refresh_token');
       setUser(null);
+      setBootstrap(null);
     } finally {
       setLoading(false);
     }
@@ -55,7 +64,8 @@ export function AuthProvider({ children }: { children: ReactNode }) {
     localStorage.setItem('access_token', response.tokens.access);
     localStorage.setItem('refresh_token', response.tokens.refresh);
 
-    // Set user
+    // Load the dashboard data, then set user
+    await refreshBootstrap();
     setUser(response.user);
   };
 
@@ -66,7 +76,8 @@ export function AuthProvider({ children }: { children: ReactNode }) {
     localStorage.setItem('access_token', response.tokens.access);
     localStorage.setItem('refresh_token', response.tokens.refresh);
 
-    // Set user
+    // Load the dashboard data, then set user
+    await refreshBootstrap();
     setUser(response.user);
   };
 
@@ -77,10 +88,11 @@ export function AuthProvider({ children }: { children: ReactNode }) {
 
     // Clear user
     setUser(null);
+    setBootstrap(null);
   };
 
   return (
-    <AuthContext.Provider value={{ user, loading, signUp, signIn, signOut }}>
+    <AuthContext.Provider value={{ user, loading, bootstrap, refreshBootstrap, signUp, signIn, signOut }}>
       {children}
     </AuthContext.Provider>
   );
@@ -15,6 +15,10 @@ const api = axios.create({
   },
 });
 
+// Read-your-writes token returned by writes when the backend uses read
+// replicas; sending it back keeps our reads on the primary for a few seconds.
+let replicaPin = null;
+
 // Request interceptor to add auth token
 api.interceptors.request.use(
   (config) => {
@@ -22,6 +26,9 @@ api.interceptors.request.use(
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+    if (replicaPin) {
+      config.headers['Replica-Pin'] = replicaPin;
+    }
     return config;
   },
   (error) => Promise.reject(error)
@@ -29,7 +36,13 @@ api.interceptors.request.use(
 
 // Response interceptor to handle token refresh
 api.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    const pin = response.headers['replica-pin'];
+    if (pin) {
+      replicaPin = pin;
+    }
+    return response;
+  },
   async (error) => {
     const originalRequest = error.config;
 
@@ -79,6 +92,7 @@ export const profileAPI = {
   getProfile: async () => (await api.get('/profiles/me/')).data,
   createProfile: async (data) => (await api.post('/profiles/', data)).data,
   updateProfile: async (data) => (await api.patch('/profiles/me/', data)).data,
+  bootstrap: async () => (await api.get('/profiles/me/bootstrap/')).data,
 };
 
 // Medical Conditions APIs
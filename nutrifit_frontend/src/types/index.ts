@@ -80,3 +80,14 @@ export interface UserPreferences {
   preferred_cuisines: string[];
   updated_at: string;
 }
+
+export interface Bootstrap {
+  user: { id: number; email: string; first_name?: string; last_name?: string };
+  profile: UserProfile | null;
+  preferences: UserPreferences;
+  medical_conditions: MedicalCondition[];
+  diet_goals: DietGoal[];
+  targets: Record<string, number> | null;
+  recent_plans: DietPlan[];
+  latest_plan_summary: Record<string, any> | null;
+}